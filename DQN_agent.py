@@ -1,11 +1,19 @@
 
 import random
+import time
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from collections import deque
 from PushBattle import Game, PLAYER1, PLAYER2, EMPTY, BOARD_SIZE, NUM_PIECES
+from replay_buffer import ReplayBuffer
+
+NUM_CELLS = BOARD_SIZE * BOARD_SIZE         # 64 board cells
+NUM_MOVE_ACTIONS = NUM_CELLS * NUM_CELLS    # 4096 source/destination pairs
+
+# Action layouts
+DENSE = 'dense'         # Linear(4096, 4096) head, placements share indices with moves from (0, 0)
+FACTORED = 'factored'   # Per-cell place/source/destination heads, placements get their own indices
 
 class DQN(nn.Module):
     def __init__(self):
@@ -25,34 +33,71 @@ class DQN(nn.Module):
         x = x.view(-1, 64 * 64)
         return self.fc(x)
 
+class FactoredDQN(nn.Module):
+    """
+    Fully convolutional Q-network with a per-cell output for each action part.
+
+    A 1x1 convolution produces three 64-way heads: placement, source and destination.
+    Movement (r0, c0, r1, c1) is scored as source[r0, c0] + destination[r1, c1] and
+    placement (r, c) as placement[r, c]. The forward pass returns the expanded action
+    space of NUM_MOVE_ACTIONS + NUM_CELLS values so it can be used exactly like DQN.
+    """
+    def __init__(self):
+        super(FactoredDQN, self).__init__()
+        self.conv = nn.Sequential(
+            nn.Conv2d(3, 64, kernel_size=3, padding=1),
+            nn.ReLU(),
+            nn.Conv2d(64, 64, kernel_size=3, padding=1),
+            nn.ReLU()
+        )
+
+        # Placement, source and destination heads (one channel each)
+        self.heads = nn.Conv2d(64, 3, kernel_size=1)
+
+    def forward(self, x):
+        x = self.heads(self.conv(x)).view(-1, 3, NUM_CELLS)
+        place, src, dst = x[:, 0], x[:, 1], x[:, 2]
+        moves = (src.unsqueeze(2) + dst.unsqueeze(1)).view(-1, NUM_MOVE_ACTIONS)
+        return torch.cat([moves, place], dim=1)
+
+def build_network(layout=DENSE):
+    """Creates the Q-network for the given action layout"""
+    if layout == DENSE:
+        return DQN()
+    if layout == FACTORED:
+        return FactoredDQN()
+    raise ValueError(f"Unknown action layout: {layout}")
+
 class DQNAgent:
-    def __init__(self, player=PLAYER1):
+    def __init__(self, player=PLAYER1, layout=DENSE, memory_size=10000, prioritized=False, device=None):
         self.player = player
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.layout = layout
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = torch.device(device)
         
-        self.policy_net = DQN().to(self.device)
-        self.target_net = DQN().to(self.device)
+        self.policy_net = build_network(layout).to(self.device)
+        self.target_net = build_network(layout).to(self.device)
         self.target_net.load_state_dict(self.policy_net.state_dict())
         
         self.optimizer = optim.Adam(self.policy_net.parameters(), lr=0.001)
-        self.memory = deque(maxlen=10000)
+        self.memory = ReplayBuffer(memory_size, prioritized=prioritized)
         self.batch_size = 32
         self.gamma = 0.99
         self.epsilon = 0.1
+        self.last_sample_time = 0.0     # replay sampling latency of the last train_step (seconds)
 
     def board_to_tensor(self, game):
-        state = np.zeros((3, BOARD_SIZE, BOARD_SIZE), dtype=np.float32)
-        
-        for i in range(BOARD_SIZE):
-            for j in range(BOARD_SIZE):
-                if game.board[i][j] == self.player:
-                    state[0][i][j] = 1
-                elif game.board[i][j] == -self.player:
-                    state[1][i][j] = 1
-                elif game.board[i][j] == EMPTY:
-                    state[2][i][j] = 1
-                    
-        return torch.FloatTensor(state).unsqueeze(0).to(self.device)
+        return self.boards_to_tensor(self.relative_board(game.board)[None])
+
+    def relative_board(self, board):
+        """Returns the board as int8 from this agent's point of view (1 own, -1 opponent)"""
+        return (np.asarray(board) * self.player).astype(np.int8)
+
+    def boards_to_tensor(self, boards):
+        """Encodes a batch of relative int8 boards into (N, 3, 8, 8) own/opponent/empty planes"""
+        boards = torch.as_tensor(boards, device=self.device)
+        return torch.stack([boards == 1, boards == -1, boards == EMPTY], dim=1).float()
 
     def get_possible_moves(self, game):
         moves = []
@@ -76,13 +121,17 @@ class DQNAgent:
     def move_to_index(self, move):
         if len(move) == 2:
             r, c = move
-            return r * BOARD_SIZE + c
+            # the factored layout keeps placements after the movement indices
+            offset = NUM_MOVE_ACTIONS if self.layout == FACTORED else 0
+            return offset + r * BOARD_SIZE + c
         else:
             r0, c0, r1, c1 = move
             return r0 * (BOARD_SIZE**3) + c0 * (BOARD_SIZE**2) + r1 * BOARD_SIZE + c1
 
     def index_to_move(self, index, is_placement):
         if is_placement:
+            if self.layout == FACTORED:
+                index -= NUM_MOVE_ACTIONS
             r = index // BOARD_SIZE
             c = index % BOARD_SIZE
             return (r, c)
@@ -93,6 +142,44 @@ class DQNAgent:
             c1 = index % BOARD_SIZE
             return (r0, c0, r1, c1)
 
+    def num_actions(self):
+        return NUM_MOVE_ACTIONS + (NUM_CELLS if self.layout == FACTORED else 0)
+
+    def valid_action_mask(self, boards, placing):
+        """
+        Builds a (N, num_actions) bool mask of legal actions for relative int8 boards.
+        placing - bool array, True where the side to move still places pieces
+        """
+        boards = torch.as_tensor(boards, device=self.device).view(-1, NUM_CELLS)
+        placing = torch.as_tensor(placing, device=self.device)
+        own = boards == 1
+        empty = boards == EMPTY
+
+        moves = (own.unsqueeze(2) & empty.unsqueeze(1)).view(-1, NUM_MOVE_ACTIONS)
+        moves &= ~placing.unsqueeze(1)
+        placements = empty & placing.unsqueeze(1)
+        if self.layout == FACTORED:
+            return torch.cat([moves, placements], dim=1)
+        # dense placements share the first 64 indices with moves from (0, 0)
+        moves[:, :NUM_CELLS] |= placements
+        return moves
+
+    def select_actions(self, boards, placing, epsilon=None):
+        """
+        Epsilon-greedy action indices for a batch of relative boards in one forward pass.
+        Returns a NumPy array of indices into the agent's action layout.
+        """
+        epsilon = self.epsilon if epsilon is None else epsilon
+        mask = self.valid_action_mask(boards, placing)
+        with torch.no_grad():
+            q_values = self.policy_net(self.boards_to_tensor(boards))
+
+        # explore by ranking valid actions with random scores instead of Q-values
+        explore = torch.rand(len(q_values), device=self.device) < epsilon
+        scores = torch.where(explore.unsqueeze(1), torch.rand_like(q_values), q_values)
+        scores = scores.masked_fill(~mask, float('-inf'))
+        return scores.argmax(dim=1).cpu().numpy()
+
     def get_best_move(self, game):
         valid_moves = self.get_possible_moves(game)
         if not valid_moves:
@@ -105,32 +192,37 @@ class DQNAgent:
         with torch.no_grad():
             q_values = self.policy_net(state).squeeze()
             
-        # Create a mask for valid moves
-        valid_q_values = []
-        for move in valid_moves:
-            idx = self.move_to_index(move)
-            valid_q_values.append((move, q_values[idx].item()))
-            
+        # Gather the Q-values of the valid moves in one indexing call
+        indices = torch.tensor([self.move_to_index(move) for move in valid_moves], device=q_values.device)
+        best = q_values[indices].argmax().item()
+
         # Select move with highest Q-value
-        best_move = max(valid_q_values, key=lambda x: x[1])[0]
-        return best_move
+        return valid_moves[best]
 
     def store_experience(self, state, move, reward, next_state, done):
+        """Stores a transition; state and next_state are raw game boards"""
         move_idx = self.move_to_index(move)
-        self.memory.append((state, move_idx, reward, next_state, done))
+        self.memory.push(self.relative_board(state), move_idx, reward, self.relative_board(next_state), done)
+
+    def _require_trainable(self):
+        if self.optimizer is None:
+            raise RuntimeError("agent was loaded with load_inference() and cannot be trained or saved")
 
     def train_step(self):
+        self._require_trainable()
         if len(self.memory) < self.batch_size:
             return
             
-        batch = random.sample(self.memory, self.batch_size)
-        states, actions, rewards, next_states, dones = zip(*batch)
+        sample_start = time.perf_counter()
+        indices, states, actions, rewards, next_states, dones, weights = self.memory.sample(self.batch_size)
+        self.last_sample_time = time.perf_counter() - sample_start
         
-        state_batch = torch.cat(states)
-        action_batch = torch.tensor(actions, dtype=torch.long).to(self.device)
-        reward_batch = torch.tensor(rewards, dtype=torch.float32).to(self.device)
-        next_state_batch = torch.cat(next_states)
-        done_batch = torch.tensor(dones, dtype=torch.bool).to(self.device)
+        state_batch = self.boards_to_tensor(states)
+        action_batch = torch.as_tensor(actions, dtype=torch.long, device=self.device)
+        reward_batch = torch.as_tensor(rewards, device=self.device)
+        next_state_batch = self.boards_to_tensor(next_states)
+        done_batch = torch.as_tensor(dones, device=self.device)
+        weight_batch = torch.as_tensor(weights, device=self.device)
         
         # Get current Q values
         current_q = self.policy_net(state_batch).gather(1, action_batch.unsqueeze(1))
@@ -142,11 +234,14 @@ class DQNAgent:
             next_q[~done_batch] = next_q_values[~done_batch].max(1)[0]
             target_q = reward_batch + self.gamma * next_q
             
-        # Compute loss and update
-        loss = nn.MSELoss()(current_q.squeeze(), target_q)
+        # Compute importance-weighted loss and update (weights are all 1 without prioritization)
+        td_error = current_q.squeeze(1) - target_q
+        loss = (weight_batch * td_error.pow(2)).mean()
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
+
+        self.memory.update_priorities(indices, td_error.detach().cpu().numpy())
         
         return loss.item()
 
@@ -154,14 +249,35 @@ class DQNAgent:
         self.target_net.load_state_dict(self.policy_net.state_dict())
 
     def save(self, filename='dqn_model.pth'):
+        self._require_trainable()
         torch.save({
             'policy_net_state_dict': self.policy_net.state_dict(),
             'target_net_state_dict': self.target_net.state_dict(),
             'optimizer_state_dict': self.optimizer.state_dict(),
+            'layout': self.layout,
         }, filename)
 
     def load(self, filename='dqn_model.pth'):
-        checkpoint = torch.load(filename)
+        checkpoint = torch.load(filename, map_location=self.device)
+        # checkpoints written before layouts existed are dense
+        layout = checkpoint.get('layout', DENSE)
+        # after load_inference() the networks are one TorchScript module with no optimizer: rebuild them
+        if layout != self.layout or self.optimizer is None:
+            self.layout = layout
+            self.policy_net = build_network(layout).to(self.device)
+            self.target_net = build_network(layout).to(self.device)
+            self.optimizer = optim.Adam(self.policy_net.parameters(), lr=0.001)
         self.policy_net.load_state_dict(checkpoint['policy_net_state_dict'])
         self.target_net.load_state_dict(checkpoint['target_net_state_dict'])
         self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+
+    def load_inference(self, filename='dqn_model_int8.pt'):
+        """Loads a TorchScript artifact written by export_DQN_agent for CPU-only play"""
+        extra_files = {'layout': ''}
+        self.device = torch.device("cpu")
+        self.policy_net = torch.jit.load(filename, map_location=self.device, _extra_files=extra_files)
+        self.layout = extra_files['layout'].decode()
+        # inference artifacts carry no target network or optimizer state; training is disabled
+        self.target_net = self.policy_net
+        self.optimizer = None
+        self.epsilon = 0.0
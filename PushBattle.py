@@ -1,3 +1,4 @@
+import hashlib
 import numpy as np
 
 # GLOBAL VARIABLES
@@ -64,6 +65,20 @@ class Game:
         game.p2_pieces = data["p2_pieces"]
         return game
 
+    # Short fingerprint of the full game state, used to check that two copies of a game agree
+    def state_hash(self):
+        state = np.asarray(self.board, dtype=np.int8).tobytes() + bytes([
+            self.current_player & 0xff, self.turn_count & 0xff, self.p1_pieces, self.p2_pieces])
+        return hashlib.blake2b(state, digest_size=8).hexdigest()
+
+    # Plays a placement [r, c] or movement [r0, c0, r1, c1] for the current player and passes the turn
+    def play_move(self, move):
+        if len(move) == 2:
+            self.place_checker(move[0], move[1])
+        else:
+            self.move_checker(move[0], move[1], move[2], move[3])
+        self.current_player = PLAYER2 if self.current_player == PLAYER1 else PLAYER1
+
     # Displays the board
     def display_board(self):
         tile_symbols = {
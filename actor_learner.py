@@ -0,0 +1,138 @@
+import time
+import multiprocessing as mp
+import numpy as np
+import torch
+from DQN_agent import DQNAgent, build_network, DENSE
+from PushBattle import PLAYER1
+from replay_buffer import SharedReplayBuffer
+from train_DQN_agent import SelfPlayEnvs
+
+'''
+Actor-learner training on a single multi-core machine.
+
+N actor processes play lockstep self-play games (see SelfPlayEnvs) with a CPU copy of the
+policy network and stream transitions into a SharedReplayBuffer. One learner process trains
+on that buffer continuously and publishes its weights into a shared-memory network that the
+actors reload every few steps; both copies hold the version counter's lock, so an actor never
+loads a half-published set of weights. Shared counters report actor and learner throughput.
+'''
+
+def actor_epsilon(actor_id, num_actors, base=0.4, alpha=7.0):
+    """Per-actor exploration rate, spread from `base` down to base**(1 + alpha) (Ape-X schedule)"""
+    if num_actors == 1:
+        return base
+    return base ** (1 + alpha * actor_id / (num_actors - 1))
+
+def run_actor(actor_id, num_actors, layout, shared_net, version, buffer, env_steps, episodes,
+              stop, num_envs=8, sync_every=50, seed=0):
+    """Actor process: plays self-play games and pushes every closed transition to the shared buffer"""
+    torch.set_num_threads(1)
+    np.random.seed(seed + actor_id)
+    torch.manual_seed(seed + actor_id)
+
+    agent = DQNAgent(PLAYER1, layout=layout, memory_size=1, device="cpu")
+    agent.epsilon = actor_epsilon(actor_id, num_actors)
+    envs = SelfPlayEnvs(num_envs)
+    local_version = -1
+    steps = 0
+
+    while not stop.is_set():
+        # refresh the policy when the learner has published new weights
+        if steps % sync_every == 0 and version.value != local_version:
+            # the version lock keeps publish() from rewriting the weights halfway through the copy
+            with version.get_lock():
+                local_version = version.value
+                agent.policy_net.load_state_dict(shared_net.state_dict())
+
+        finished = envs.finished
+        states, actions, rewards, next_states, dones = envs.step(agent)
+        steps += 1
+        if states:
+            buffer.push_batch(np.stack(states), actions, rewards, np.stack(next_states), dones)
+
+        with env_steps.get_lock():
+            env_steps.value += envs.num_envs
+        if envs.finished > finished:
+            with episodes.get_lock():
+                episodes.value += envs.finished - finished
+
+def publish(agent, shared_net, version):
+    """Copies the learner's policy weights into the shared CPU network; actors read under the same lock"""
+    with version.get_lock(), torch.no_grad():
+        for target, source in zip(shared_net.state_dict().values(), agent.policy_net.state_dict().values()):
+            target.copy_(source)
+        version.value += 1
+
+def train_actor_learner(episodes=1000, num_actors=4, layout=DENSE, buffer_size=100000, num_envs=8,
+                        publish_every=100, target_update=500, report_every=10.0, agent=None):
+    """
+    Runs `num_actors` actor processes and trains in this process until `episodes` games finished.
+    publish_every - gradient steps between weight publications to the actors
+    report_every - seconds between throughput reports
+    """
+    ctx = mp.get_context("spawn")
+    agent = agent or DQNAgent(PLAYER1, layout=layout)
+    buffer = SharedReplayBuffer(buffer_size, ctx)
+    # the caller's buffer (its transitions and prioritization) comes back once training stops
+    own_memory = agent.memory
+    agent.memory = buffer
+
+    shared_net = build_network(layout)
+    shared_net.share_memory()
+    version = ctx.Value('l', 0)
+    env_steps = ctx.Value('l', 0)
+    finished = ctx.Value('l', 0)
+    stop = ctx.Event()
+    publish(agent, shared_net, version)
+
+    actors = [
+        ctx.Process(target=run_actor, daemon=True,
+                    args=(i, num_actors, layout, shared_net, version, buffer, env_steps, finished, stop),
+                    kwargs={'num_envs': num_envs})
+        for i in range(num_actors)
+    ]
+    for actor in actors:
+        actor.start()
+
+    updates = 0
+    start_time = time.time()
+    last_report = start_time
+    last_steps = 0
+    last_updates = 0
+
+    try:
+        while finished.value < episodes:
+            if agent.train_step() is None:
+                # not enough data yet
+                time.sleep(0.01)
+                continue
+
+            updates += 1
+            if updates % target_update == 0:
+                agent.update_target_network()
+            if updates % publish_every == 0:
+                publish(agent, shared_net, version)
+
+            now = time.time()
+            if now - last_report >= report_every:
+                steps = env_steps.value
+                print(f"Episodes {finished.value}, Buffer: {len(buffer)}")
+                print(f"Actor env steps/s: {(steps - last_steps) / (now - last_report):.0f}")
+                print(f"Learner updates/s: {(updates - last_updates) / (now - last_report):.1f}")
+                print(f"Replay ratio: {updates * agent.batch_size / max(steps, 1):.2f} samples per env step")
+                print("-" * 40)
+                last_report, last_steps, last_updates = now, steps, updates
+    finally:
+        stop.set()
+        for actor in actors:
+            actor.join(timeout=5)
+        # the shared block goes away with the actors; give the agent its own buffer back
+        agent.memory = own_memory
+        buffer.unlink()
+
+    elapsed = time.time() - start_time
+    print(f"Finished {finished.value} episodes in {elapsed:.1f}s with {updates} updates")
+    return agent
+
+if __name__ == "__main__":
+    train_actor_learner(1000)
@@ -0,0 +1,434 @@
+import importlib
+from abc import ABC, abstractmethod
+import json
+import os
+import selectors
+import subprocess
+import sys
+import time
+import uuid
+from PushBattle import Game, PLAYER1, PLAYER2, EMPTY, array_to_chess_notation
+from judge_engine import (TIMEOUT, RANDOM_MOVES, MOVE_ATTEMPTS, RANDOM_FALLBACK, FORFEIT, HTTP_ROUTES, TRANSPORT_AUTO,
+                          TRANSPORT_HTTP, TRANSPORT_ERRORS, apply_move, make_session, resolve_turn)
+from protocol import SUPPORTED_PROTOCOLS, DeltaTracker, accepted_protocol, wire_move
+from stream_transport import StreamClient, resolve_address
+from judge_telemetry import OK, FAILED, ILLEGAL
+
+'''
+Pluggable agent adapters so one referee can play local agents, agent subprocesses and
+player servers under the same rules.
+
+Every adapter answers request_move(game, attempt_number, random_attempts) with a move, or
+None when the attempt failed (no reply, an error reply without a move or a reply later than
+`timeout`). A reply that does carry a move field but no move (null, or an agent returning
+None) comes back as NO_MOVE, which apply_move() forfeits, as Judge and AsyncJudge do.
+referee_game() then applies the judge's rules through judge_engine.resolve_turn, like Judge
+and AsyncJudge: two attempts per move, RANDOM_MOVES random fallbacks and a forfeit on a
+malformed or illegal move.
+
+Agent specs accepted by make_adapter():
+    "smart_agent:SmartAgent"                      - InProcessAdapter, the class is imported
+    "pipe:python agent_adapters.py random_agent:RandomAgent"
+                                                  - SubprocessAdapter over stdin/stdout
+    "http://127.0.0.1:5008"                       - HttpAdapter, a player server
+
+The pipe protocol is the stream transport's: one JSON object per line with a "type" of
+"start", "move" or "end" and an "id" that the reply echoes, so late replies to attempts the
+referee already gave up on are discarded.
+'''
+
+PIPE_PREFIX = "pipe:"
+STARTUP_TIMEOUT = 30 # seconds an agent process gets to boot and answer its first start
+NO_MOVE = () # an answer without a move; not a valid move format, so it forfeits
+
+def reply_move(reply):
+    """The move of a decoded reply: None (failed attempt) without a "move" field, NO_MOVE for a null move"""
+    if not isinstance(reply, dict) or "move" not in reply:
+        return None
+    return NO_MOVE if reply["move"] is None else reply["move"]
+
+def load_agent_class(spec):
+    """Imports "module:Class" and returns the class"""
+    module_name, class_name = spec.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+class AgentAdapter(ABC):
+    """
+    Base adapter; subclasses implement request_move() and set last_latency (None when no reply
+    arrived) and last_compute_time (the agent's own report, if any) for telemetry.
+    """
+    def __init__(self, player, timeout=TIMEOUT):
+        self.player = player
+        self.timeout = timeout
+        self.name = f"Player{1 if player == PLAYER1 else 2}"
+        self.last_latency = None
+        self.last_compute_time = None
+
+    def start(self, game, first_turn):
+        return True
+
+    @abstractmethod
+    def request_move(self, game, attempt_number, random_attempts):
+        """The agent's move for the position, or None when this attempt failed"""
+
+    def observe(self, move):
+        """Called with every move played on the referee's game, by either player"""
+        pass
+
+    def end(self, game, winner):
+        pass
+
+    def close(self):
+        pass
+
+class InProcessAdapter(AgentAdapter):
+    """
+    Calls get_best_move() directly on a copy of the game.
+    A Python call cannot be interrupted, so a move slower than `timeout` is played out and
+    then rejected as a failed attempt.
+    """
+    def __init__(self, agent, player=None, timeout=TIMEOUT):
+        super().__init__(getattr(agent, 'player', PLAYER1) if player is None else player, timeout)
+        self.agent = agent
+
+    def start(self, game, first_turn):
+        if hasattr(self.agent, 'start'):
+            self.agent.start(game, first_turn)
+        return True
+
+    def request_move(self, game, attempt_number, random_attempts):
+        self.agent.attempt_number = attempt_number
+        self.last_latency = self.last_compute_time = None
+        start_time = time.perf_counter()
+        try:
+            move = self.agent.get_best_move(Game.from_dict(game.to_dict()))
+        except Exception:
+            return None
+        self.last_latency = self.last_compute_time = time.perf_counter() - start_time
+        if self.last_latency > self.timeout:
+            return None
+        return NO_MOVE if move is None else move
+
+    def end(self, game, winner):
+        if hasattr(self.agent, 'end'):
+            self.agent.end(game, winner)
+
+class SubprocessAdapter(AgentAdapter):
+    """Talks JSON lines to an agent process over its stdin/stdout with a per-request deadline"""
+    def __init__(self, command, player=PLAYER1, timeout=TIMEOUT):
+        super().__init__(player, timeout)
+        self.command = command
+        self.started = False
+        self.process = subprocess.Popen(command, shell=isinstance(command, str), stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE, bufsize=0)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.process.stdout, selectors.EVENT_READ)
+        self.buffer = b""
+        self.next_id = 0
+
+    def _request(self, message_type, data, timeout):
+        """Returns the reply to one message, or None if it did not arrive before the deadline"""
+        self.next_id += 1
+        request_id = self.next_id
+        deadline = time.perf_counter() + timeout
+        try:
+            self.process.stdin.write(json.dumps({"type": message_type, "id": request_id, **data}).encode() + b"\n")
+            while True:
+                while b"\n" not in self.buffer:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0 or not self.selector.select(remaining):
+                        return None
+                    chunk = os.read(self.process.stdout.fileno(), 65536)
+                    if not chunk:
+                        return None
+                    self.buffer += chunk
+                line, self.buffer = self.buffer.split(b"\n", 1)
+                reply = json.loads(line)
+                # replies to attempts that already timed out are skipped
+                if isinstance(reply, dict) and reply.get("id") == request_id:
+                    return reply
+        except (OSError, ValueError):
+            return None
+
+    def start(self, game, first_turn):
+        # the first start also covers process startup and imports
+        reply = self._request("start", {"game": game.to_dict(), "first_turn": first_turn, "max_latency": self.timeout},
+                              self.timeout if self.started else max(self.timeout, STARTUP_TIMEOUT))
+        self.started = True
+        return reply is not None and "error" not in reply
+
+    def request_move(self, game, attempt_number, random_attempts):
+        start_time = time.perf_counter()
+        reply = self._request("move", {
+            "game": game.to_dict(),
+            "turn_count": game.turn_count,
+            "attempt_number": attempt_number,
+            "random_attempts": random_attempts,
+        }, self.timeout)
+        if reply is None:
+            self.last_latency = self.last_compute_time = None
+            return None
+        self.last_latency = time.perf_counter() - start_time
+        self.last_compute_time = reply.get("compute_time")
+        return reply_move(reply)
+
+    def end(self, game, winner):
+        self._request("end", {"game": game.to_dict(), "turn_count": game.turn_count,
+                              "winner": int(winner)}, self.timeout)
+
+    def close(self):
+        self.selector.close()
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+class HttpAdapter(AgentAdapter):
+    """
+    A player server, reached the way Judge reaches it: a keep-alive session, the advertised
+    stream socket when transport is "auto", and the delta protocol when the player accepts it.
+    """
+    def __init__(self, url, player=PLAYER1, timeout=TIMEOUT, transport=TRANSPORT_AUTO):
+        super().__init__(player, timeout)
+        self.url = url
+        self.transport = transport
+        self.session = make_session()
+        self.stream = None
+        self.delta = DeltaTracker()
+        self.game_id = None
+        self._connected = False
+
+    def _request(self, message_type, data=None):
+        """Returns the decoded reply, or None on any transport error or late reply"""
+        start_time = time.perf_counter()
+        try:
+            if self.stream is not None:
+                try:
+                    reply = self.stream.request(message_type, data).json()
+                except TRANSPORT_ERRORS:
+                    self.stream.close()
+                    self.stream = None
+                    raise
+            else:
+                method, path = HTTP_ROUTES[message_type]
+                response = self.session.request(method, f"{self.url}{path}", timeout=self.timeout, json=data)
+                if response.status_code != 200:
+                    return None
+                reply = response.json()
+        except TRANSPORT_ERRORS:
+            return None
+        if time.perf_counter() - start_time > self.timeout:
+            return None
+        return reply
+
+    def _connect(self):
+        """Says hello once and opens the player's stream socket if it advertises one"""
+        self._connected = True
+        reply = self._request("hello")
+        address = reply.get("stream") if isinstance(reply, dict) else None
+        if self.transport != TRANSPORT_HTTP and address:
+            try:
+                self.stream = StreamClient(resolve_address(address, self.url), self.timeout)
+            except TRANSPORT_ERRORS:
+                pass
+
+    def start(self, game, first_turn):
+        if not self._connected:
+            self._connect()
+        self.delta = DeltaTracker()
+        # lets a multi-game agent server (agent_server.py) tell this game apart from others
+        self.game_id = uuid.uuid4().hex
+        reply = self._request("start", {
+            "game_id": self.game_id,
+            "game": game.to_dict(),
+            "board": game.board.tolist(),
+            "first_turn": first_turn,
+            "max_latency": self.timeout,
+            "protocols": SUPPORTED_PROTOCOLS,
+        })
+        self.delta.protocols[self.player] = accepted_protocol(reply)
+        return reply is not None
+
+    def request_move(self, game, attempt_number, random_attempts):
+        move_data = {
+            "game_id": self.game_id,
+            "player": self.player,
+            "game": game.to_dict(),
+            "board": game.board.tolist(),
+            "turn_count": game.turn_count,
+            "attempt_number": attempt_number,
+            "random_attempts": random_attempts,
+        }
+        start_time = time.perf_counter()
+        if self.delta.uses_delta(self.player):
+            reply = self._request("move", {**self.delta.move_request(game), "game_id": self.game_id,
+                                           "player": self.player, "attempt_number": attempt_number,
+                                           "random_attempts": random_attempts})
+            # the agent's copy diverged: resend the full state for the same attempt
+            if isinstance(reply, dict) and reply.get("resync"):
+                reply = self._request("move", move_data)
+        else:
+            reply = self._request("move", move_data)
+        self.delta.mark_seen(self.player)
+
+        if not isinstance(reply, dict):
+            self.last_latency = self.last_compute_time = None
+            return None
+        self.last_latency = time.perf_counter() - start_time
+        self.last_compute_time = reply.get("compute_time")
+        return reply_move(reply)
+
+    def observe(self, move):
+        self.delta.record(move)
+
+    def end(self, game, winner):
+        self._request("end", {"game_id": self.game_id, "player": self.player, "game": game.to_dict(),
+                              "board": game.board.tolist(), "turn_count": game.turn_count, "winner": int(winner)})
+
+    def close(self):
+        self.session.close()
+        if self.stream is not None:
+            self.stream.close()
+
+def make_adapter(spec, player, timeout=TIMEOUT, kwargs=None, checkpoint=None, name=None):
+    """Builds the adapter for an agent spec (see the module docstring) playing as `player`"""
+    if spec.startswith(("http://", "https://")):
+        adapter = HttpAdapter(spec, player, timeout)
+    elif spec.startswith(PIPE_PREFIX):
+        adapter = SubprocessAdapter(spec[len(PIPE_PREFIX):], player, timeout)
+    else:
+        agent = load_agent_class(spec)(player=player, **(kwargs or {}))
+        if checkpoint:
+            agent.load(checkpoint)
+        adapter = InProcessAdapter(agent, player, timeout)
+    adapter.name = name or spec
+    return adapter
+
+def referee_game(p1, p2, max_turns=200, verbose=False, telemetry=None):
+    """
+    Plays one game between two adapters under the judge's rules.
+    Returns a result record with the winner, game string and fallback counts; every attempt,
+    fallback and forfeit is also recorded in `telemetry` (a MoveTelemetry) when given.
+    """
+    game = Game()
+    adapters = {PLAYER1: p1, PLAYER2: p2}
+    random_left = {PLAYER1: RANDOM_MOVES, PLAYER2: RANDOM_MOVES}
+    game_str = ""
+    forfeit = False
+    winner = EMPTY
+    start_time = time.perf_counter()
+
+    for player, adapter in adapters.items():
+        if not adapter.start(game, player == PLAYER1):
+            return {'error': f"failed to start player {player}"}
+
+    def play(move, suffix=""):
+        nonlocal game_str
+        game_str += f"-{array_to_chess_notation(move)}{suffix}"
+        for adapter in adapters.values():
+            adapter.observe(move)
+
+    while game.turn_count < max_turns:
+        game.turn_count += 1
+        player = game.current_player
+        adapter = adapters[player]
+
+        # first and second move attempts; an illegal reply forfeits straight away
+        result = False
+        for attempt in MOVE_ATTEMPTS:
+            move = adapter.request_move(game, attempt, random_left[player])
+            if move is not None:
+                result = apply_move(game, move)
+            if telemetry is not None:
+                outcome = OK if result is True else ILLEGAL if result == "forfeit" else FAILED
+                telemetry.record_attempt(adapter.name, game.turn_count, attempt, adapter.last_latency,
+                                         adapter.last_compute_time, outcome)
+            if move is not None:
+                break
+
+        outcome, random_move = resolve_turn(game, result, random_left)
+        if telemetry is not None and outcome in (RANDOM_FALLBACK, FORFEIT):
+            telemetry.record_event(adapter.name, 'random_fallbacks' if outcome == RANDOM_FALLBACK else 'forfeits')
+
+        if outcome == FORFEIT:
+            game_str += "-q"
+            forfeit = True
+            winner = -player
+            break
+        if outcome == RANDOM_FALLBACK:
+            play(random_move, "r")
+        else:
+            play(move)
+
+        winner = game.check_winner()
+        if winner != EMPTY:
+            break
+
+        # swaps player
+        game.current_player *= -1
+
+    for adapter in adapters.values():
+        adapter.end(game, winner)
+
+    if verbose:
+        print(f"Winner: {winner}, Game String: {game_str}")
+
+    return {
+        'winner': int(winner),
+        'game_str': game_str,
+        'turns': game.turn_count,
+        'forfeit': forfeit,
+        'random_moves_used': {PLAYER1: RANDOM_MOVES - random_left[PLAYER1],
+                              PLAYER2: RANDOM_MOVES - random_left[PLAYER2]},
+        'duration': time.perf_counter() - start_time,
+    }
+
+def serve_pipe(spec):
+    """
+    Agent side of SubprocessAdapter: answers JSON lines on stdin with an instance of the
+    "module:Class" agent, created on every start for the colour the referee assigns.
+    """
+    cls = load_agent_class(spec)
+    agent = None
+    # anything the agent prints goes to stderr so it cannot corrupt the protocol
+    out = sys.stdout
+    sys.stdout = sys.stderr
+
+    for line in sys.stdin:
+        message = json.loads(line)
+        reply = {"id": message.get("id")}
+        try:
+            if message["type"] == "start":
+                agent = cls(player=PLAYER1 if message["first_turn"] else PLAYER2)
+            elif message["type"] == "move":
+                start_time = time.perf_counter()
+                move = agent.get_best_move(Game.from_dict(message["game"]))
+                reply["move"] = wire_move(move)
+                reply["compute_time"] = time.perf_counter() - start_time
+        except Exception as e:
+            reply["error"] = str(e)
+        out.write(json.dumps(reply) + "\n")
+        out.flush()
+
+def main():
+    if len(sys.argv) > 1:
+        serve_pipe(sys.argv[1])
+        return
+
+    # a quick local sweep: an in-process agent against the same agent in a subprocess
+    p1 = make_adapter("random_agent:RandomAgent", PLAYER1)
+    p2 = make_adapter(f"{PIPE_PREFIX}{sys.executable} agent_adapters.py random_agent:RandomAgent", PLAYER2)
+    num_games = 20
+    start_time = time.perf_counter()
+    results = [referee_game(p1, p2) for _ in range(num_games)]
+    elapsed = time.perf_counter() - start_time
+    p2.close()
+
+    p1_wins = sum(result.get('winner') == PLAYER1 for result in results)
+    p2_wins = sum(result.get('winner') == PLAYER2 for result in results)
+    print(f"Played {num_games} games in {elapsed:.1f}s")
+    print(f"P1 wins: {p1_wins}, P2 wins: {p2_wins}, Draws: {num_games - p1_wins - p2_wins}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import cProfile
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from stream_stats import RunningStats
+
+'''
+Opt-in profiling of agent calls, split by agent and game phase.
+
+AgentProfiler.call(agent, phase, fn, *args) runs one agent call under a cProfile profile kept
+for that (agent, phase) and/or measures its tracemalloc peak. Profiles accumulate across
+games and merge across worker processes. export() writes:
+    <agent>-<phase>.prof    pstats files for snakeviz / pstats
+    collapsed.txt           "agent;phase;caller;...;function microseconds" lines for
+                            flamegraph.pl, speedscope or inferno
+    profile_summary.json    calls, time, top functions and peak memory per move
+
+cProfile records caller -> callee edges rather than full stacks, so collapsed stacks are
+rebuilt by splitting each function's own time over its callers in proportion to the time
+spent through each edge (the same attribution flameprof uses).
+'''
+
+MAX_STACK_DEPTH = 48
+MIN_FRACTION = 1e-4   # stack paths carrying less of a function's time than this are dropped
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+def _is_profiler_call(func):
+    return func[0] == '~' and 'Profiler' in func[2]
+
+def collapsed_stacks(stats, prefix=()):
+    """{'frame;frame;...': seconds} from a pstats stats dict"""
+    memo = {}
+
+    def paths(func, depth):
+        if (func, depth) in memo:
+            return memo[(func, depth)]
+        callers = {caller: edge for caller, edge in stats[func][4].items()
+                   if caller in stats and caller != func and not _is_profiler_call(caller)}
+        if not callers or depth >= MAX_STACK_DEPTH:
+            result = [((func,), 1.0)]
+        else:
+            # time that reached func through each caller; call counts when no time was measured
+            weights = {caller: edge[3] for caller, edge in callers.items()}
+            total = sum(weights.values())
+            if total <= 0:
+                weights = {caller: edge[1] for caller, edge in callers.items()}
+                total = sum(weights.values())
+            result = []
+            for caller, weight in weights.items():
+                share = weight / total
+                if share < MIN_FRACTION:
+                    continue
+                for path, fraction in paths(caller, depth + 1):
+                    if share * fraction >= MIN_FRACTION:
+                        result.append((path + (func,), share * fraction))
+        memo[(func, depth)] = result
+        return result
+
+    stacks = defaultdict(float)
+    for func, (_, _, own_time, _, _) in stats.items():
+        if own_time <= 0 or _is_profiler_call(func):
+            continue
+        for path, fraction in paths(func, 0):
+            stacks[";".join(list(prefix) + [_label(frame) for frame in path])] += own_time * fraction
+    return stacks
+
+def _stats_from_dict(data):
+    stats = pstats.Stats()
+    stats.stats = data
+    stats.get_top_level_stats()
+    return stats
+
+class AgentProfiler:
+    def __init__(self, cpu=True, memory=False):
+        self.cpu = cpu
+        self.memory = memory
+        self.profiles = {}                          # (agent, phase) -> cProfile.Profile
+        self.merged = {}                            # (agent, phase) -> pstats.Stats from other processes
+        self.calls = defaultdict(int)
+        self.wall_times = defaultdict(float)
+        self.peaks = defaultdict(RunningStats)      # bytes allocated at the peak of each call
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def call(self, agent, phase, fn, *args):
+        """Runs fn(*args) as one profiled agent call and returns its result"""
+        key = (agent, phase)
+        profile = None
+        if self.cpu:
+            profile = self.profiles.get(key)
+            if profile is None:
+                profile = self.profiles[key] = cProfile.Profile()
+        if self.memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        start_time = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            return fn(*args)
+        finally:
+            if profile is not None:
+                profile.disable()
+            self.wall_times[key] += time.perf_counter() - start_time
+            self.calls[key] += 1
+            if self.memory:
+                self.peaks[key].add(tracemalloc.get_traced_memory()[1] - baseline)
+
+    def stats(self, key):
+        """pstats.Stats for an (agent, phase), including profiles merged from workers"""
+        stats = None
+        if key in self.profiles:
+            stats = pstats.Stats(self.profiles[key])
+        if key in self.merged:
+            stats = self.merged[key] if stats is None else stats.add(self.merged[key])
+        return stats
+
+    def keys(self):
+        return sorted(set(self.calls), key=str)
+
+    def state(self):
+        """Picklable contents, for returning from a worker process"""
+        return {
+            'stats': {key: self.stats(key).stats for key in self.keys() if self.stats(key) is not None},
+            'calls': dict(self.calls),
+            'wall_times': dict(self.wall_times),
+            'peaks': dict(self.peaks),
+        }
+
+    def merge_state(self, state):
+        for key, data in state['stats'].items():
+            other = _stats_from_dict(data)
+            self.merged[key] = other if key not in self.merged else self.merged[key].add(other)
+        for key, n in state['calls'].items():
+            self.calls[key] += n
+        for key, seconds in state['wall_times'].items():
+            self.wall_times[key] += seconds
+        for key, peaks in state['peaks'].items():
+            self.peaks[key].merge(peaks)
+
+    def summary(self, top=10):
+        rows = []
+        for key in self.keys():
+            agent, phase = key
+            row = {'agent': agent, 'phase': phase, 'calls': self.calls[key], 'wall_time': self.wall_times[key],
+                   'ms_per_call': 1000 * self.wall_times[key] / self.calls[key]}
+            stats = self.stats(key)
+            if stats is not None:
+                functions = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:top]
+                row['top_functions'] = [{'function': _label(func), 'calls': nc, 'own_time': tt, 'cumulative': ct}
+                                        for func, (_, nc, tt, ct, _) in functions if not _is_profiler_call(func)]
+            if key in self.peaks and self.peaks[key].count:
+                peaks = self.peaks[key]
+                row['peak_bytes_mean'] = peaks.mean
+                row['peak_bytes_max'] = peaks.max
+            rows.append(row)
+        return rows
+
+    def export(self, directory):
+        """Writes .prof files, collapsed stacks and the summary to `directory`"""
+        os.makedirs(directory, exist_ok=True)
+        stacks = defaultdict(float)
+        for key in self.keys():
+            stats = self.stats(key)
+            if stats is None:
+                continue
+            agent, phase = key
+            stats.dump_stats(os.path.join(directory, f"{agent}-{phase}.prof"))
+            for stack, seconds in collapsed_stacks(stats.stats, (agent, phase)).items():
+                stacks[stack] += seconds
+
+        with open(os.path.join(directory, 'collapsed.txt'), 'w') as f:
+            for stack, seconds in sorted(stacks.items()):
+                microseconds = round(seconds * 1e6)
+                if microseconds > 0:
+                    f.write(f"{stack} {microseconds}\n")
+        with open(os.path.join(directory, 'profile_summary.json'), 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        print(f"Profiles written to {directory}")
+
+    def report(self):
+        for row in self.summary(top=3):
+            memory = f", peak {row['peak_bytes_mean'] / 1024:.1f} KiB/move (max {row['peak_bytes_max'] / 1024:.1f})" \
+                if 'peak_bytes_mean' in row else ""
+            print(f"{row['agent']:>14} {row['phase']:>8}: {row['calls']} calls, {row['ms_per_call']:.2f} ms/call{memory}")
+            for function in row.get('top_functions', []):
+                print(f"{'':>26}{1000 * function['own_time']:9.1f} ms  {function['function']}")
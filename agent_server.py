@@ -0,0 +1,282 @@
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from flask import Flask, request, jsonify
+from werkzeug.serving import WSGIRequestHandler
+from PushBattle import Game, PLAYER1, PLAYER2
+from protocol import PROTOCOL_DELTA, DeltaGame, negotiate, wire_move
+from stream_transport import start_stream_server
+from agent_adapters import load_agent_class
+from agent_warmup import warm_up
+
+'''
+Multi-game player server: one agent host for many concurrent games.
+
+The player templates (player1.py / player2.py) keep one global agent and one game, so a
+server plays one game at a time. This server keeps a DeltaGame per (game_id, player), using the
+"game_id" the judge sends with every request (AsyncJudge and HttpAdapter do; requests without
+one share a single slot, as with the templates) and the player from "first_turn" in /start or
+"player" in later requests (or, failing that, the side to move in the game or its turn count). Moves are computed in a process pool sized to the cores, where every
+worker builds and warms up one agent per side at boot. The moves of a game may land on any
+worker, so the position is sent with every move, and a worker calls the agent's reset() hook
+(as the templates' /start does) whenever its agent moves in a different game than last time:
+agent state never leaks from one game into another, but it is only kept across the moves of a
+game while that game has the worker to itself. A pool broken by a crashed worker is replaced.
+
+Backpressure: at most `max_pending` moves are queued or running. A move that cannot get a slot,
+or whose result is not ready, before its game's deadline (max_latency from /start minus
+DEADLINE_MARGIN) gets an {"error": ...} reply instead of a late move, so the judge can use its
+second attempt or a random fallback in time.
+
+    python agent_server.py smart_agent:SmartAgent --port 5008 --workers 4
+'''
+
+DEADLINE_MARGIN = 0.15   # seconds kept back from max_latency for the reply to reach the judge
+DEFAULT_LATENCY = 4.0    # max_latency when /start does not send one
+GAME_TTL = 600           # seconds after which an idle game without /end is dropped
+
+# agents of this worker process, one per side, built once by _init_worker
+_worker_agents = {}
+# player -> game serial the agent last moved in, to reset it when a move of another game arrives
+_worker_games = {}
+
+def _init_worker(spec, kwargs, checkpoint):
+    for player in (PLAYER1, PLAYER2):
+        agent = load_agent_class(spec)(player=player, **(kwargs or {}))
+        if checkpoint:
+            agent.load(checkpoint)
+        warm_up(agent, verbose=False)
+        _worker_agents[player] = agent
+
+def _worker_ready():
+    time.sleep(0.1)
+    return os.getpid()
+
+def _worker_move(player, serial, game_data):
+    """Worker side: the agent's move for a position, with its compute time"""
+    start_time = time.perf_counter()
+    agent = _worker_agents[player]
+    if _worker_games.get(player) != serial:
+        if hasattr(agent, 'reset'):
+            agent.reset()
+        _worker_games[player] = serial
+    move = agent.get_best_move(Game.from_dict(game_data))
+    return wire_move(move), time.perf_counter() - start_time
+
+class GameSlot:
+    """State of one side of one game"""
+    serials = itertools.count()
+
+    def __init__(self, player, max_latency):
+        self.player = player
+        # unique per /start, unlike game_id, which requests may leave out or reuse
+        self.serial = next(self.serials)
+        self.deadline = max(max_latency - DEADLINE_MARGIN, 0.05)
+        self.delta_game = DeltaGame()
+        self.protocol = None
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()   # one request of a game at a time
+
+class AgentServer:
+    def __init__(self, spec, workers=None, max_pending=None, kwargs=None, checkpoint=None, stream_address=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.pool_args = (spec, kwargs, checkpoint)
+        self.pool = self._new_pool()
+        self.pool_lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.games = {}            # (game_id, player) -> GameSlot
+        self.games_lock = threading.Lock()
+        self.stream_address = stream_address
+        self.counters = {'moves': 0, 'busy': 0, 'deadline': 0, 'resync': 0, 'errors': 0, 'restarts': 0}
+        self.spec = spec
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=self.pool_args)
+
+    def _replace_pool(self, broken):
+        """Swaps a pool broken by a crashed worker for a new one (once, however many requests saw it)"""
+        with self.pool_lock:
+            if self.pool is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = self._new_pool()
+        self._count('restarts')
+        print("A move worker died; restarted the worker pool")
+
+    def boot(self):
+        """Starts every worker (building and warming up its agents) before the first game"""
+        # the pool starts workers on demand; keep it busy until every worker has answered
+        pids = set()
+        for _ in range(10):
+            pids.update(future.result() for future in [self.pool.submit(_worker_ready) for _ in range(self.workers)])
+            if len(pids) >= self.workers:
+                break
+        print(f"{self.workers} workers ready for {self.spec}, at most {self.max_pending} moves in flight")
+
+    def _count(self, name):
+        with self.games_lock:
+            self.counters[name] += 1
+
+    def _slot(self, data):
+        """GameSlot of a request, or None for an unknown game"""
+        game_id = data.get('game_id')
+        player = data.get('player')
+        if player is None and isinstance(data.get('game'), dict):
+            player = data['game']['current_player']
+        if player is None and data.get('turn_count') is not None:
+            # a delta request without "player": PLAYER1 moves on odd turns
+            player = PLAYER1 if data['turn_count'] % 2 == 1 else PLAYER2
+        with self.games_lock:
+            if player is None:
+                # nothing tells the side: fine as long as only one side of the game is here
+                sides = [slot for (gid, _), slot in self.games.items() if gid == game_id]
+                return sides[0] if len(sides) == 1 else None
+            return self.games.get((game_id, player))
+
+    def hello(self, data=None):
+        return {
+            "message": "Successfully Connected",
+            "stream": self.stream_address,
+            "games": len(self.games),
+        }
+
+    def start_game(self, data):
+        player = PLAYER1 if data.get('first_turn') else PLAYER2
+        slot = GameSlot(player, data.get('max_latency') or DEFAULT_LATENCY)
+        slot.delta_game.reset(data.get('game'))
+        slot.protocol = negotiate(data.get('protocols'))
+        now = time.monotonic()
+        with self.games_lock:
+            for key in [key for key, other in self.games.items() if now - other.last_seen > GAME_TTL]:
+                del self.games[key]
+            self.games[(data.get('game_id'), player)] = slot
+        return {
+            "message": "Game started successfully",
+            "protocol": slot.protocol,
+        }
+
+    def make_move(self, data):
+        start_time = time.perf_counter()
+        slot = self._slot(data)
+        if slot is None:
+            self._count('errors')
+            return {"error": "unknown game"}
+        with slot.lock:
+            slot.last_seen = time.monotonic()
+            if data.get('protocol') == PROTOCOL_DELTA:
+                game = slot.delta_game.sync(data)
+                if game is None:
+                    self._count('resync')
+                    return {"resync": True}
+            else:
+                game = slot.delta_game.reset(data.get('game'))
+
+            # backpressure: wait for a free slot, but never past the game's deadline
+            remaining = slot.deadline - (time.perf_counter() - start_time)
+            if remaining <= 0 or not self.slots.acquire(timeout=remaining):
+                self._count('busy')
+                return {"error": "busy"}
+            pool = self.pool
+            try:
+                future = pool.submit(_worker_move, slot.player, slot.serial, game.to_dict())
+            except BrokenProcessPool:
+                self.slots.release()
+                self._replace_pool(pool)
+                self._count('errors')
+                return {"error": "worker pool restarted"}
+            except Exception:
+                self.slots.release()
+                raise
+            # the slot is freed when the worker is done, even if this request gave up on it
+            future.add_done_callback(lambda _: self.slots.release())
+
+            try:
+                move, compute_time = future.result(timeout=max(slot.deadline - (time.perf_counter() - start_time), 0))
+            except FutureTimeout:
+                future.cancel()
+                self._count('deadline')
+                return {"error": "deadline"}
+            except BrokenProcessPool:
+                self._replace_pool(pool)
+                self._count('errors')
+                return {"error": "worker pool restarted"}
+            except Exception as e:
+                self._count('errors')
+                return {"error": str(e)}
+            self._count('moves')
+            return {"move": move, "compute_time": compute_time}
+
+    def end_game(self, data):
+        player = data.get('player')
+        with self.games_lock:
+            for key in [key for key in self.games
+                        if key[0] == data.get('game_id') and (player is None or key[1] == player)]:
+                del self.games[key]
+        return {
+            "message": "Game ended successfully"
+        }
+
+    def status(self):
+        with self.games_lock:
+            return {'games': len(self.games), 'workers': self.workers, 'max_pending': self.max_pending,
+                    **self.counters}
+
+    def handlers(self):
+        return {"hello": self.hello, "start": self.start_game, "move": self.make_move, "end": self.end_game}
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+def create_app(server):
+    app = Flask(__name__)
+
+    @app.route('/', methods=['GET'])
+    def hello_route():
+        return jsonify(server.hello())
+
+    @app.route('/start', methods=['POST'])
+    def start_route():
+        return jsonify(server.start_game(request.get_json()))
+
+    @app.route('/move', methods=['POST'])
+    def move_route():
+        return jsonify(server.make_move(request.get_json()))
+
+    @app.route('/end', methods=['POST'])
+    def end_route():
+        return jsonify(server.end_game(request.get_json()))
+
+    @app.route('/status', methods=['GET'])
+    def status_route():
+        return jsonify(server.status())
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve one agent to many concurrent games")
+    parser.add_argument('agent', help='agent class as "module:Class"')
+    parser.add_argument('--port', type=int, default=5008)
+    parser.add_argument('--workers', type=int, default=None, help="move worker processes (default: CPU cores)")
+    parser.add_argument('--max-pending', type=int, default=None, help="moves queued or running at once (default: 2 per worker)")
+    parser.add_argument('--kwargs', default=None, help="JSON keyword arguments for the agent class")
+    parser.add_argument('--checkpoint', default=None, help="file passed to agent.load()")
+    parser.add_argument('--stream', default=None, help='also serve the stream transport, e.g. "tcp://0.0.0.0:6008"')
+    args = parser.parse_args()
+
+    server = AgentServer(args.agent, args.workers, args.max_pending,
+                         json.loads(args.kwargs) if args.kwargs else None, args.checkpoint, args.stream)
+    server.boot()
+    if args.stream:
+        start_stream_server(args.stream, server.handlers())
+    # HTTP/1.1 keeps each judge connection open between requests
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    create_app(server).run(host='0.0.0.0', port=args.port, threaded=True)
+
+if __name__ == "__main__":
+    main()
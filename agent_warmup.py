@@ -0,0 +1,71 @@
+import gc
+import random
+import time
+import numpy as np
+from PushBattle import Game, PLAYER1, EMPTY
+
+'''
+Warm-up for agents served by the player templates.
+
+A freshly built agent is slow on its first moves: modules import lazily, torch picks kernels
+and allocates its buffers on the first forward pass, and caches start empty. warm_up() pays for
+that at server start by asking the agent for moves on a few positions from seeded random games,
+covering placement, the switch to movement and movement. The positions and all RNG draws are
+isolated from the caller's random/numpy state. Afterwards the boot-time objects (model weights,
+books) are frozen out of the garbage collector's scans, so full collections during a game stay short.
+'''
+
+WARMUP_GAMES = 4
+WARMUP_SEED = 0
+WARMUP_TURNS = (1, 2, 9, 10, 16, 17, 18, 19, 24, 25, 30, 31)   # positions taken after these turns, both sides
+WARMUP_MOVES = 8   # at most this many dummy moves, spread over the phases
+
+def warmup_positions(games=WARMUP_GAMES, seed=WARMUP_SEED):
+    """Positions from seeded random games, with the turn count the judge would send"""
+    from random_agent import RandomAgent
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(games):
+        game = Game()
+        while game.turn_count < max(WARMUP_TURNS):
+            game.turn_count += 1
+            moves = RandomAgent(player=game.current_player).get_possible_moves(game)
+            move = moves[rng.randrange(len(moves))]
+            if len(move) == 2:
+                game.place_checker(*move)
+            else:
+                game.move_checker(*move)
+            if game.check_winner() != EMPTY:
+                break
+            game.current_player *= -1
+            if game.turn_count in WARMUP_TURNS:
+                position = Game.from_dict(game.to_dict())
+                # the judge bumps turn_count before asking for the next move
+                position.turn_count += 1
+                positions.append(position)
+    return positions
+
+def warm_up(agent, games=WARMUP_GAMES, verbose=True):
+    """Asks the agent for moves on warm-up positions of its own side; returns the latencies in seconds"""
+    player = getattr(agent, 'player', PLAYER1)
+    positions = [game for game in warmup_positions(games) if game.current_player == player] or warmup_positions(games)
+    positions.sort(key=lambda game: game.turn_count)
+    positions = positions[::max(1, len(positions) // WARMUP_MOVES)][:WARMUP_MOVES]
+
+    random_state, numpy_state = random.getstate(), np.random.get_state()
+    latencies = []
+    try:
+        for game in positions:
+            start_time = time.perf_counter()
+            agent.get_best_move(game)
+            latencies.append(time.perf_counter() - start_time)
+    finally:
+        random.setstate(random_state)
+        np.random.set_state(numpy_state)
+
+    gc.collect()
+    gc.freeze()
+    if verbose and latencies:
+        print(f"Agent warmed up on {len(latencies)} positions: first move {1000 * latencies[0]:.1f} ms, "
+              f"last {1000 * latencies[-1]:.1f} ms")
+    return latencies
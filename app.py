@@ -2,50 +2,156 @@ import streamlit as st
 import json
 import pandas as pd
 import plotly.express as px
-from benchmark import GameAnalyzer
 import os
-from smart_agent import SmartAgent
-from random_agent import RandomAgent
-from minimax_agent import MinimaxAgent
+from benchmark_jobs import BenchmarkJobs, LATEST_PATH
+from results_db import ResultsDB, DB_PATH
 
 
 NUM_TRIALS = 25
+PROGRESS_REFRESH = 2  # seconds between progress updates of running jobs
+AGENTS = ["smart_agent:SmartAgent", "random_agent:RandomAgent"]
 st.set_page_config(
     page_title="Push Battle Analysis",
     layout="wide"
 )
 
-def load_or_generate_data():
-    """Load existing data or generate new benchmark data"""
-    if os.path.exists('benchmark_results.json'):
-        with open('benchmark_results.json', 'r') as f:
-            return json.load(f)
-    else:
-        analyzer = GameAnalyzer()
-        analyzer.run_benchmark(NUM_TRIALS, SmartAgent, MinimaxAgent)  # Run 1 game
-        stats = analyzer.export_stats()
-        with open('benchmark_results.json', 'w') as f:
-            json.dump(stats, f)
-        return stats
-
-def run_new_benchmark():
-    """Run a new benchmark and return results"""
-    analyzer = GameAnalyzer()
-    analyzer.run_benchmark(NUM_TRIALS, MinimaxAgent, MinimaxAgent)  # Run 1 game
-    stats = analyzer.export_stats()
-    with open('benchmark_results.json', 'w') as f:
-        json.dump(stats, f)
-    return stats
+@st.cache_resource
+def get_jobs():
+    """One job manager per server, so running jobs survive script reruns"""
+    return BenchmarkJobs()
+
+@st.cache_data
+def load_results(path, mtime):
+    """Parsed results file; mtime is part of the cache key so a rewritten file is reloaded"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def load_latest():
+    """The last finished benchmark, or None before the first one"""
+    if not os.path.exists(LATEST_PATH):
+        return None
+    return load_results(LATEST_PATH, os.path.getmtime(LATEST_PATH))
+
+def db_version():
+    """Changes whenever the results database is written (WAL writes may not touch the main file)"""
+    return tuple(os.path.getmtime(path) for path in (DB_PATH, f"{DB_PATH}-wal") if os.path.exists(path))
+
+@st.cache_data
+def query_db(method, version, **filters):
+    """Result of a ResultsDB query method; the SQL runs again only after the database changed"""
+    db = ResultsDB(DB_PATH)
+    try:
+        return getattr(db, method)(**filters)
+    finally:
+        db.close()
+
+def database_view():
+    """Stats aggregated in SQL over runs picked in the sidebar, plus the history of those runs"""
+    version = db_version()
+    runs = query_db('runs', version, limit=500)
+    if not runs:
+        return None
+    labels = {run['id']: f"#{run['id']} {run['agent1']} vs {run['agent2']} "
+                         f"({pd.to_datetime(run['started'], unit='s'):%Y-%m-%d %H:%M}, {run['games']} games)"
+              for run in runs}
+    agents = sorted({run['agent1'] for run in runs} | {run['agent2'] for run in runs})
+    agent = st.sidebar.selectbox("Agent", [None] + agents, format_func=lambda a: a or "All agents")
+    run_ids = st.sidebar.multiselect("Runs", list(labels), format_func=labels.get,
+                                     help="All runs when none are selected")
+    filters = {'agent': agent, 'run_ids': tuple(run_ids) if run_ids else None}
+
+    st.subheader("Run History")
+    df_runs = pd.DataFrame(query_db('runs', version, agent=agent, limit=500))
+    df_runs['started'] = pd.to_datetime(df_runs['started'], unit='s')
+    df_runs['matchup'] = df_runs['agent1'] + ' vs ' + df_runs['agent2']
+    df_runs['score'] = (df_runs['wins'] + 0.5 * df_runs['draws']) / df_runs['games'].where(df_runs['games'] > 0)
+    try:
+        fig = px.line(df_runs.sort_values('started'), x='started', y='score', color='matchup', markers=True,
+                      hover_data=['id', 'games', 'code_version'], title="Player 1 score per run")
+        st.plotly_chart(fig, use_container_width=True)
+    except Exception as e:
+        st.error(f"Error creating history chart: {str(e)}")
+    with st.expander("Runs"):
+        st.dataframe(df_runs)
+
+    with st.expander("Move times by agent and phase"):
+        st.dataframe(pd.DataFrame(query_db('move_stats', version, by_agent=True, **filters)))
+    return query_db('export_stats', version, **filters)
+
+def benchmark_form(jobs):
+    """Sidebar form that submits a benchmark job without waiting for it"""
+    with st.sidebar.form("benchmark"):
+        st.subheader("New Benchmark")
+        agent1 = st.selectbox("Player 1", AGENTS, index=0)
+        agent2 = st.selectbox("Player 2", AGENTS, index=1)
+        num_games = st.number_input("Games", min_value=1, max_value=10000, value=NUM_TRIALS)
+        seed = st.number_input("Seed", min_value=0, value=0)
+        workers = st.number_input("Workers", min_value=1, max_value=os.cpu_count() or 1, value=1)
+        rerun = st.checkbox("Ignore cached results")
+        if st.form_submit_button("Run New Benchmark"):
+            key = jobs.submit(agent1, agent2, int(num_games), seed=int(seed), workers=int(workers), rerun=rerun)
+            st.session_state['job'] = key
+            if jobs.status(key) == 'done':
+                st.sidebar.success("Loaded from the result cache")
+
+def show_progress(jobs):
+    """Progress of this session's job, with its partial results while it runs"""
+    key = st.session_state.get('job')
+    if key is None:
+        return
+    status = jobs.status(key)
+    if status == 'running':
+        done, total, partial = jobs.progress(key)
+        st.progress(done / total if total else 0.0, text=f"Benchmark running: {done}/{total} games")
+        if st.button("Cancel"):
+            jobs.cancel(key)
+        if partial is not None:
+            with st.expander("Partial results", expanded=True):
+                st.dataframe(pd.DataFrame(partial['matchupStats']))
+    elif status == 'failed':
+        st.error("Benchmark failed")
+        st.code(jobs.error(key) or "")
+    elif status == 'done' and st.session_state.get('shown') != key:
+        # one full rerun picks up the finished result
+        st.session_state['shown'] = key
+        st.rerun()
+
+if hasattr(st, 'fragment'):
+    # reruns only the progress panel every few seconds; the rest of the page stays as it is
+    show_progress = st.fragment(run_every=PROGRESS_REFRESH)(show_progress)
+
+def describe(stats):
+    job = stats.get('job', {})
+    name = lambda spec: spec.split(':')[-1]
+    return (f"{name(job.get('agent1', '?'))} vs {name(job.get('agent2', '?'))}, "
+            f"{stats['totalGames']} games, seed {job.get('seed')}")
 
 def main():
     st.title("Push Battle Agent Analysis")
+    jobs = get_jobs()
+    benchmark_form(jobs)
+    show_progress(jobs)
+
+    source = "Benchmark runs"
+    if os.path.exists(DB_PATH):
+        source = st.sidebar.radio("Data", ["Benchmark runs", "Results database"])
 
-    # Add refresh button
-    if st.button("Run New Benchmark"):
-        stats = run_new_benchmark()
-        st.success("New benchmark completed!")
+    if source == "Results database":
+        stats = database_view()
     else:
-        stats = load_or_generate_data()
+        # finished results, newest first; the job of this session is preselected once it is done
+        cached = {key: (path, mtime) for key, path, mtime in jobs.cached()}
+        options = list(cached)
+        key = st.session_state.get('job')
+        if cached:
+            selected = st.sidebar.selectbox("Results", options, index=options.index(key) if key in options else 0,
+                                            format_func=lambda k: describe(load_results(*cached[k])))
+            stats = load_results(*cached[selected])
+        else:
+            stats = load_latest()
+    if stats is None:
+        st.info("No benchmark results yet. Start one from the sidebar.")
+        return
 
     # Display total games
     st.header(f"Total Games Analyzed: {stats['totalGames']}")
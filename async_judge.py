@@ -0,0 +1,195 @@
+import argparse
+import asyncio
+import time
+import aiohttp
+from PushBattle import Game, PLAYER1, PLAYER2, EMPTY, array_to_chess_notation
+from judge_engine import TIMEOUT, RANDOM_MOVES, MOVE_ATTEMPTS, RANDOM_FALLBACK, FORFEIT, apply_move, resolve_turn
+from protocol import SUPPORTED_PROTOCOLS, DeltaTracker, accepted_protocol
+
+'''
+Asyncio judge that drives many games at once.
+
+Each game keeps its own Game object, random-move budgets and game string and follows the
+same rules as judge_engine (its resolve_turn): two attempts per move, up to RANDOM_MOVES
+random fallbacks, and a forfeit on a malformed or illegal move. Requests for all games share one aiohttp
+session, and a semaphore caps how many games are in flight. Every request carries a
+game_id and the player it is addressed to, so agent servers (agent_server.py) can tell
+concurrent games apart, and agents that accept the delta
+protocol (see protocol.py) only receive the moves they have not seen yet.
+
+concurrency > 1 needs game-scoped player servers such as agent_server.py. The single-game
+templates (player1.py / player2.py) keep one global game and agent, so concurrent games
+against them overwrite each other's state and end in spurious forfeits; play them with
+concurrency=1, the default.
+'''
+
+class AsyncJudge:
+    def __init__(self, concurrency=1, timeout=TIMEOUT, max_turns=200, verbose=False):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_turns = max_turns
+        self.verbose = verbose
+
+    async def _post(self, session, url, data):
+        """POSTs JSON and returns the decoded reply, or None on any transport or decode error"""
+        try:
+            async with session.post(url, json=data, timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                if response.status != 200:
+                    return None
+                return await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return None
+
+    async def _request_move(self, session, url, game, game_id, attempt_number, random_attempts, delta):
+        """Asks the player to move; returns True, False (no usable reply) or "forfeit" plus the move"""
+        player = game.current_player
+        move_data = {
+            "game_id": game_id,
+            "player": player,
+            "turn_count": game.turn_count,
+            "attempt_number": attempt_number,
+            "random_attempts": random_attempts,
+        }
+        full_data = {**move_data, "game": game.to_dict(), "board": game.board.tolist()}
+        if delta.uses_delta(player):
+            reply = await self._post(session, f"{url}/move", {**move_data, **delta.move_request(game)})
+            # the agent's copy diverged: resend the full state for the same attempt
+            if isinstance(reply, dict) and reply.get("resync"):
+                reply = await self._post(session, f"{url}/move", full_data)
+        else:
+            reply = await self._post(session, f"{url}/move", full_data)
+        delta.mark_seen(player)
+
+        if not isinstance(reply, dict) or "move" not in reply:
+            return False, None
+        move = reply["move"]
+        result = apply_move(game, move)
+        if result is True:
+            delta.record(move)
+        return result, move
+
+    async def play_game(self, session, p1_url, p2_url, game_id):
+        """Plays one full game and returns its result record"""
+        game = Game()
+        urls = {PLAYER1: p1_url, PLAYER2: p2_url}
+        random_left = {PLAYER1: RANDOM_MOVES, PLAYER2: RANDOM_MOVES}
+        delta = DeltaTracker()
+        game_str = ""
+        forfeit = False
+        winner = EMPTY
+        start_time = time.perf_counter()
+
+        starting_data = {
+            "game_id": game_id,
+            "game": game.to_dict(),
+            "board": game.board.tolist(),
+            "max_latency": self.timeout,
+            "protocols": SUPPORTED_PROTOCOLS,
+        }
+        started = await asyncio.gather(
+            self._post(session, f"{p1_url}/start", {**starting_data, "first_turn": True}),
+            self._post(session, f"{p2_url}/start", {**starting_data, "first_turn": False}),
+        )
+        if any(reply is None for reply in started):
+            return {'game_id': game_id, 'p1_url': p1_url, 'p2_url': p2_url, 'error': "failed to start"}
+        delta.protocols[PLAYER1] = accepted_protocol(started[0])
+        delta.protocols[PLAYER2] = accepted_protocol(started[1])
+
+        while game.turn_count < self.max_turns:
+            game.turn_count += 1
+            player = game.current_player
+            url = urls[player]
+
+            # first and second move attempts
+            for attempt in MOVE_ATTEMPTS:
+                result, move = await self._request_move(session, url, game, game_id, attempt, random_left[player], delta)
+                if result is not False:
+                    break
+
+            outcome, random_move = resolve_turn(game, result, random_left)
+            if outcome == FORFEIT:
+                game_str += "-q"
+                forfeit = True
+                winner = -player
+                break
+            if outcome == RANDOM_FALLBACK:
+                delta.record(random_move)
+                game_str += f"-{array_to_chess_notation(random_move)}r"
+            else:
+                game_str += f"-{array_to_chess_notation(move)}"
+
+            winner = game.check_winner()
+            if winner != EMPTY:
+                break
+
+            # swaps player
+            game.current_player *= -1
+
+        end_data = {
+            "game_id": game_id,
+            "game": game.to_dict(),
+            "board": game.board.tolist(),
+            "turn_count": game.turn_count,
+            "winner": int(winner),
+        }
+        await asyncio.gather(self._post(session, f"{p1_url}/end", {**end_data, "player": PLAYER1}),
+                             self._post(session, f"{p2_url}/end", {**end_data, "player": PLAYER2}))
+
+        if self.verbose:
+            print(f"Game {game_id}: winner {winner}, {game_str}")
+
+        return {
+            'game_id': game_id,
+            'p1_url': p1_url,
+            'p2_url': p2_url,
+            'winner': int(winner),
+            'game_str': game_str,
+            'turns': game.turn_count,
+            'forfeit': forfeit,
+            'random_moves_used': {PLAYER1: RANDOM_MOVES - random_left[PLAYER1],
+                                  PLAYER2: RANDOM_MOVES - random_left[PLAYER2]},
+            'duration': time.perf_counter() - start_time,
+        }
+
+    async def run(self, pairings):
+        """
+        Plays every (p1_url, p2_url) pairing with at most `concurrency` games in flight.
+        Returns the result records in pairing order.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency * 2)
+
+        async with aiohttp.ClientSession(connector=connector) as session:
+            async def bounded(game_id, p1_url, p2_url):
+                async with semaphore:
+                    return await self.play_game(session, p1_url, p2_url, game_id)
+
+            return await asyncio.gather(*(bounded(i, p1_url, p2_url) for i, (p1_url, p2_url) in enumerate(pairings)))
+
+def run_games(pairings, concurrency=1, **kwargs):
+    """Synchronous entry point around AsyncJudge.run"""
+    return asyncio.run(AsyncJudge(concurrency=concurrency, **kwargs).run(pairings))
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many games between two player servers")
+    parser.add_argument('--p1', default="http://127.0.0.1:5008")
+    parser.add_argument('--p2', default="http://127.0.0.1:5009")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help="games in flight; above 1 only with game-scoped servers (agent_server.py)")
+    args = parser.parse_args()
+    num_games = args.games
+    pairings = [(args.p1, args.p2)] * num_games
+
+    start_time = time.perf_counter()
+    results = run_games(pairings, concurrency=args.concurrency)
+    elapsed = time.perf_counter() - start_time
+
+    finished = [result for result in results if 'error' not in result]
+    p1_wins = sum(result['winner'] == PLAYER1 for result in finished)
+    p2_wins = sum(result['winner'] == PLAYER2 for result in finished)
+    print(f"Played {len(finished)}/{num_games} games in {elapsed:.1f}s")
+    print(f"P1 wins: {p1_wins}, P2 wins: {p2_wins}, Draws: {len(finished) - p1_wins - p2_wins}")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,155 @@
 
+import hashlib
 import json
+import os
+import random
 import time
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from typing import Dict, List, Tuple
+import numpy as np
 from PushBattle import Game, PLAYER1, PLAYER2, EMPTY, BOARD_SIZE, NUM_PIECES
+from agent_adapters import load_agent_class
+from random_agent import RandomAgent
+from stream_stats import MoveStatsAggregator
+from sprt import SPRT
+from agent_profiler import AgentProfiler
+from results_db import ResultsDB, RunWriter, agent_spec, code_version
+
+SPRT_BATCH = 8  # games per worker task when an SPRT decides when to stop
+
+def move_phase(turn):
+    """Phase of the move with 0-based index `turn` in a game"""
+    return 'opening' if turn < 8 else 'midgame' if turn < 16 else 'endgame'
+
+def game_seed(seed, game_num):
+    """Per-game RNG seed derived from the benchmark seed, the same in every process"""
+    return int(hashlib.sha256(f"{seed}:{game_num}".encode()).hexdigest()[:16], 16)
+
+def seed_game(seed, game_num):
+    game_seed_value = game_seed(seed, game_num)
+    random.seed(game_seed_value)
+    np.random.seed(game_seed_value % (2 ** 32))
+    try:
+        import torch
+        torch.manual_seed(game_seed_value)
+    except ImportError:
+        pass
+
+def _plain(value):
+    """Converts nested defaultdicts to dicts so stats can cross process boundaries"""
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    return value
+
+def merge_stats(stats, other):
+    """
+    Adds the counts of a worker's stats into `stats` (a GameAnalyzer.stats structure).
+    average_move_time is skipped; it is recomputed from the merged move time aggregator.
+    """
+    def add(target, source):
+        for key, value in source.items():
+            if isinstance(value, dict):
+                add(target[key], value)
+            else:
+                target[key] += value
+
+    add(stats, {key: value for key, value in other.items() if key != 'average_move_time'})
+    return stats
+
+# agents of this worker process, built once by _init_worker
+_worker_state = {}
+
+def _build(agent, player):
+    """An agent instance, or a "module:Class" spec built for the given colour"""
+    if isinstance(agent, str):
+        return load_agent_class(agent)(player=player)
+    return agent
+
+def _seatings(agent1, agent2, alternate):
+    """
+    (PLAYER1 agent, PLAYER2 agent) for the normal and, with alternate, the colour-swapped
+    games, keyed by whether the colours are swapped
+    """
+    seatings = {False: (_build(agent1, PLAYER1), _build(agent2, PLAYER2))}
+    if alternate:
+        seatings[True] = (_build(agent2, PLAYER1), _build(agent1, PLAYER2))
+    return seatings
+
+def _seat(agents):
+    """Points agent instances at the colour they play in this game; spec-built agents already are"""
+    if agents[0] is not agents[1]:
+        for agent, player in zip(agents, (PLAYER1, PLAYER2)):
+            if hasattr(agent, 'player'):
+                agent.player = player
+    return agents
+
+def colours_swapped(game_num, alternate):
+    """With alternate (SPRT runs), agent1 plays PLAYER2 in every odd-numbered game"""
+    return alternate and game_num % 2 == 1
+
+def agent1_result(winner, swapped):
+    """(wins, draws, losses) of agent1 in a game, whichever colour it played"""
+    agent1_player = PLAYER2 if swapped else PLAYER1
+    return int(winner == agent1_player), int(winner == EMPTY), int(winner == -agent1_player)
+
+def _init_worker(agent1, agent2, seed, events_path, profile, results, alternate=False):
+    _worker_state['agents'] = _seatings(agent1, agent2, alternate)
+    _worker_state['alternate'] = alternate
+    _worker_state['seed'] = seed
+    _worker_state['events_path'] = events_path
+    _worker_state['profile'] = profile
+    _worker_state['results'] = results
+
+def _benchmark_worker(shard):
+    """
+    Plays a shard of games quietly and returns the shard's stats, move time aggregator, profile
+    and agent1's [wins, draws, losses]
+    """
+    shard_index, game_nums = shard
+    events_path = _worker_state['events_path']
+    profile = _worker_state['profile']
+    analyzer = GameAnalyzer(verbose=False, events_path=f"{events_path}.{shard_index}" if events_path else None,
+                            profiler=AgentProfiler(*profile) if profile else None)
+    if _worker_state['results'] is not None:
+        # the shard's games and moves go straight to the results database
+        analyzer.results = RunWriter(*_worker_state['results'])
+    alternate = _worker_state['alternate']
+    agent1_record = [0, 0, 0]
+    for game_num in game_nums:
+        if _worker_state['seed'] is not None:
+            seed_game(_worker_state['seed'], game_num)
+        analyzer.current_game = game_num
+        swapped = colours_swapped(game_num, alternate)
+        agents = _worker_state['agents'][swapped]
+        game_record = analyzer.play_game(*(_seat(agents) if alternate else agents))
+        analyzer.analyze_game(game_record)
+        agent1_record = [a + b for a, b in zip(agent1_record, agent1_result(game_record['winner'], swapped))]
+    analyzer.move_times.close()
+    if analyzer.results is not None:
+        analyzer.results.close()
+    return (_plain(analyzer.stats), analyzer.move_times, analyzer.profiler.state() if profile else None,
+            agent1_record)
 
 class GameAnalyzer:
-    def __init__(self):
+    def __init__(self, verbose=True, events_path=None, snapshot_path=None, snapshot_every=5.0, profiler=None,
+                 results_db=None):
+        self.verbose = verbose   # False suppresses the per-move output
+        # SQLite file (results_db.py) that receives every run, game and move; None keeps results in memory only
+        self.results_db = results_db
+        self.results = None      # RunWriter of the run in progress
+        self.run_id = None
+        self._discarded_games = []  # games of a parallel run played after the SPRT stopped it
+        # optional AgentProfiler wrapped around every get_best_move call, split by agent and phase
+        self.profiler = profiler
+        # move times per agent and phase in constant memory; raw events optionally go to a JSONL file
+        self.move_times = MoveStatsAggregator(events_path)
+        # export_stats() is rewritten here at most every `snapshot_every` seconds while a run is going
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self._last_snapshot = 0.0
+        self.current_game = 0    # number of the game in progress, used in event records
+        self.sprt_result = None  # SPRT.summary() of the last run with early stopping
         self.stats = {
             'total_games': 0,
             'matchup_stats': defaultdict(lambda: {'wins': 0, 'losses': 0, 'draws': 0}),
@@ -21,18 +164,22 @@ class GameAnalyzer:
             'timeouts': defaultdict(int)
         }
 
+    def log(self, *args):
+        if self.verbose:
+            print(*args)
+
     def handle_move(self, game, move):
         """Places the move if valid and returns 'forfeit', True, or False"""
         if not isinstance(move, (list, tuple)) or len(move) < 2:
-            print(f"Invalid move format by Player {'P1' if game.current_player == PLAYER1 else 'P2'}")
+            self.log(f"Invalid move format by Player {'P1' if game.current_player == PLAYER1 else 'P2'}")
             return "forfeit"
 
         if len(move) != 2 and len(move) != 4:
-            print(f"Invalid move format by Player {'P1' if game.current_player == PLAYER1 else 'P2'}")
+            self.log(f"Invalid move format by Player {'P1' if game.current_player == PLAYER1 else 'P2'}")
             return "forfeit"
 
         try:
-            print(move)
+            self.log(move)
             # Convert move elements to integers if they aren't already
             move = [int(x) if isinstance(x, (int, str)) else x for x in move]
 
@@ -40,23 +187,31 @@ class GameAnalyzer:
                 if game.is_valid_placement(move[0], move[1]):
                     game.place_checker(move[0], move[1])
                 else:
-                    print(f"Invalid placement by")
+                    self.log(f"Invalid placement by")
                     return "forfeit"
             else:
                 if game.is_valid_move(move[0], move[1], move[2], move[3]):
                     game.move_checker(move[0], move[1], move[2], move[3])
                 else:
-                    print(f"Invalid move by {game.current_player}")
+                    self.log(f"Invalid move by {game.current_player}")
                     return "forfeit"
             return True
         except Exception as e:
-            print(f"Error handling move: {str(e)}")
+            self.log(f"Error handling move: {str(e)}")
             return False
 
+    def agent_move(self, agent, game):
+        """Asks an agent for its move, under the profiler when one is set"""
+        if self.profiler is None:
+            return agent.get_best_move(game)
+        return self.profiler.call(agent.__class__.__name__, move_phase(self._game_moves), agent.get_best_move, game)
+
     def play_game(self, p1_agent, p2_agent) -> Dict:
         """Play a single game and record data"""
         game = Game()
-        moves = []
+        # moves are streamed into the stats as they happen instead of being kept
+        self._game_moves = 0
+        self._game_agents = {PLAYER1: p1_agent.__class__.__name__, PLAYER2: p2_agent.__class__.__name__}
         max_moves = 100  # Safety limit
         move_count = 0
         
@@ -66,17 +221,17 @@ class GameAnalyzer:
         
         while move_count < max_moves:
             game.turn_count += 1
-            start_time = time.time()
+            start_time = time.perf_counter()
             current_agent = p1_agent if game.current_player == PLAYER1 else p2_agent
             current_random = p1_random if game.current_player == PLAYER1 else p2_random
             
             # First attempt
 
-            print("starting")
+            self.log("starting")
             try:
-                move = current_agent.get_best_move(game)
+                move = self.agent_move(current_agent, game)
 
-                move_time = time.time() - start_time
+                move_time = time.perf_counter() - start_time
                 
                 move_record = {
                     'player': game.current_player,
@@ -87,20 +242,20 @@ class GameAnalyzer:
                 
                 result = self.handle_move(game, move)
                 if result == "forfeit":
-                    moves.append(move_record)
+                    self.record_move(move_record)
                     return {
                         'p1_agent': p1_agent.__class__.__name__,
                         'p2_agent': p2_agent.__class__.__name__,
                         'winner': PLAYER2 if game.current_player == PLAYER1 else PLAYER1,
-                        'moves': moves,
+                        'num_moves': self._game_moves,
                         'total_moves': move_count,
                         'forfeit': True
                     }
                 elif not result:
                     # Second attempt
-                    start_time = time.time()
-                    move = current_agent.get_best_move(game)
-                    move_time = time.time() - start_time
+                    start_time = time.perf_counter()
+                    move = self.agent_move(current_agent, game)
+                    move_time = time.perf_counter() - start_time
                     
                     move_record = {
                         'player': game.current_player,
@@ -127,7 +282,7 @@ class GameAnalyzer:
                                     'p1_agent': p1_agent.__class__.__name__,
                                     'p2_agent': p2_agent.__class__.__name__,
                                     'winner': PLAYER2 if game.current_player == PLAYER1 else PLAYER1,
-                                    'moves': moves,
+                                    'num_moves': self._game_moves,
                                     'total_moves': move_count,
                                     'forfeit': True
                                 }
@@ -137,22 +292,22 @@ class GameAnalyzer:
                                 'p1_agent': p1_agent.__class__.__name__,
                                 'p2_agent': p2_agent.__class__.__name__,
                                 'winner': PLAYER2 if game.current_player == PLAYER1 else PLAYER1,
-                                'moves': moves,
+                                'num_moves': self._game_moves,
                                 'total_moves': move_count,
                                 'forfeit': True
                             }
 
-                moves.append(move_record)
+                self.record_move(move_record)
                 
             except Exception as e:
-                print(f"Error during move: {str(e)}")
+                self.log(f"Error during move: {str(e)}")
                 move_record = {
                     'player': game.current_player,
                     'error': str(e),
-                    'time': time.time() - start_time,
+                    'time': time.perf_counter() - start_time,
                     'type': 'error'
                 }
-                moves.append(move_record)
+                self.record_move(move_record)
                 
                 # Use random move on error if available
                 if current_random > 0:
@@ -168,7 +323,7 @@ class GameAnalyzer:
                             'p1_agent': p1_agent.__class__.__name__,
                             'p2_agent': p2_agent.__class__.__name__,
                             'winner': PLAYER2 if game.current_player == PLAYER1 else PLAYER1,
-                            'moves': moves,
+                            'num_moves': self._game_moves,
                             'total_moves': move_count,
                             'forfeit': True
                         }
@@ -177,19 +332,20 @@ class GameAnalyzer:
                         'p1_agent': p1_agent.__class__.__name__,
                         'p2_agent': p2_agent.__class__.__name__,
                         'winner': PLAYER2 if game.current_player == PLAYER1 else PLAYER1,
-                        'moves': moves,
+                        'num_moves': self._game_moves,
                         'total_moves': move_count,
                         'forfeit': True
                     }
             
             winner = game.check_winner()
             if winner != EMPTY:
-                game.display_board()
+                if self.verbose:
+                    game.display_board()
                 return {
                     'p1_agent': p1_agent.__class__.__name__,
                     'p2_agent': p2_agent.__class__.__name__,
                     'winner': winner,
-                    'moves': moves,
+                    'num_moves': self._game_moves,
                     'total_moves': move_count
                 }
                 
@@ -197,7 +353,7 @@ class GameAnalyzer:
             move_count += 1
             
             # Debug output
-            if move_count % 1 == 0:
+            if self.verbose:
                 print(f"Move {move_count} completed")
                 print(game.board)
                 game.display_board()
@@ -206,7 +362,7 @@ class GameAnalyzer:
             'p1_agent': p1_agent.__class__.__name__,
             'p2_agent': p2_agent.__class__.__name__,
             'winner': EMPTY,  # Draw
-            'moves': moves,
+            'num_moves': self._game_moves,
             'total_moves': move_count
         }
 
@@ -228,7 +384,7 @@ class GameAnalyzer:
             'moveStats': [
                 {
                     'name': phase.capitalize(),
-                    'validMoves': stats['valid'],
+                    'validMoves': stats.get('valid', 0),
                     'timeouts': stats.get('timeout', 0),
                     'invalid': stats.get('invalid', 0)
                 }
@@ -248,22 +404,182 @@ class GameAnalyzer:
                     'games': count
                 }
                 for length, count in sorted(self.stats['game_lengths'].items())
-            ]
+            ],
+            'moveTimes': self.move_times.snapshot(),
+            'sprt': self.sprt_result
         }
-    def run_benchmark(self, num_games: int, agent1, agent2) -> None:
-        """Run benchmark games between agents"""
+    def run_benchmark(self, num_games: int, agent1, agent2, workers: int = 1, seed: int = None,
+                      sprt: SPRT = None) -> None:
+        """
+        Run benchmark games between agents.
+        Agents are instances or "module:Class" specs. With workers > 1 the games are sharded over
+        a process pool, agents are built (or unpickled) once per worker, and the workers' stats
+        are merged into self.stats. A seed makes every game reproducible whatever the worker count.
+        With an SPRT (agent1's Elo hypotheses), num_games is an upper bound: the run stops as
+        soon as the test accepts a hypothesis, and the outcome is kept in self.sprt_result.
+        SPRT runs alternate colours (agent1 plays PLAYER2 in odd-numbered games) and feed the
+        test agent1's results, so the first-move advantage does not count as Elo.
+        """
         print(f"Running {num_games} benchmark games...")
-        
+        self._discarded_games = []
+        if self.results_db:
+            self.start_results_run(num_games, agent1, agent2, workers, seed)
+
+        try:
+            if workers > 1:
+                self._run_parallel(num_games, agent1, agent2, workers, seed, sprt)
+            else:
+                self._run_sequential(num_games, agent1, agent2, seed, sprt)
+        except BaseException:
+            # a failed or interrupted run must not stay in the database as one still running
+            if self.results is not None:
+                self.discard_results_run()
+            raise
+
+        if sprt is not None:
+            self.sprt_result = sprt.summary()
+            sprt.report()
+        if self.results is not None:
+            self.results.close()
+            self.results = None
+            db = ResultsDB(self.results_db)
+            if self._discarded_games:
+                db.delete_games(self.run_id, self._discarded_games)
+            db.finish_run(self.run_id, {'sprt': self.sprt_result} if self.sprt_result else None)
+            db.close()
+
+    def start_results_run(self, num_games, agent1, agent2, workers, seed):
+        """Adds a run to the results database and opens the writer for its games"""
+        specs = agent_spec(agent1), agent_spec(agent2)
+        db = ResultsDB(self.results_db)
+        self.run_id = db.start_run(specs[0].split(':')[-1], specs[1].split(':')[-1], num_games, seed, workers,
+                                   version=code_version(agent1, agent2), params={'agents': specs})
+        db.close()
+        self.results = RunWriter(self.results_db, self.run_id)
+
+    def discard_results_run(self):
+        """Closes the writer and removes the unfinished run, with its games, from the results database"""
+        self.results.close()
+        self.results = None
+        db = ResultsDB(self.results_db)
+        db.delete_run(self.run_id)
+        db.close()
+
+    def _run_sequential(self, num_games, agent1, agent2, seed, sprt):
+        alternate = sprt is not None
+        seatings = _seatings(agent1, agent2, alternate)
         for game_num in range(num_games):
-            print(f"\nGame {game_num + 1}/{num_games}")
-            game_record = self.play_game(agent1, agent2)
+            if seed is not None:
+                seed_game(seed, game_num)
+            self.current_game = game_num
+            self.log(f"\nGame {game_num + 1}/{num_games}")
+            swapped = colours_swapped(game_num, alternate)
+            game_record = self.play_game(*(_seat(seatings[swapped]) if alternate else seatings[swapped]))
             self.analyze_game(game_record)
-            print(f"Game {game_num + 1} complete: {game_record['p1_agent']} vs {game_record['p2_agent']}")
-            print(f"Winner: {game_record['winner']}")
+            self.log(f"Game {game_num + 1} complete: {game_record['p1_agent']} vs {game_record['p2_agent']}")
+            self.log(f"Winner: {game_record['winner']}")
+
+            if sprt is not None:
+                wins, draws, losses = agent1_result(game_record['winner'], swapped)
+                sprt.add(wins=wins, draws=draws, losses=losses)
+                if sprt.status():
+                    break
+        self.move_times.flush()
+        self.maybe_write_snapshot(force=True)
+
+    def _run_parallel(self, num_games, agent1, agent2, workers, seed, sprt):
+        if sprt is None:
+            # a few shards per worker keeps the pool busy when game lengths vary
+            num_shards = min(num_games, workers * 4)
+            shards = [(start, range(start, num_games, num_shards)) for start in range(num_shards)]
+        else:
+            # small batches so the test is checked often and little work is wasted once it stops
+            shards = [(i, range(start, min(start + SPRT_BATCH, num_games)))
+                      for i, start in enumerate(range(0, num_games, SPRT_BATCH))]
+        shards = iter(shards)
+        # workers profile with the same settings and send their profiles back
+        profile = (self.profiler.cpu, self.profiler.memory) if self.profiler is not None else None
+        start_time = time.perf_counter()
+        # workers write their raw events to <events_path>.<shard>
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(agent1, agent2, seed, self.move_times.events_path, profile,
+                                           (self.results_db, self.run_id) if self.results is not None else None,
+                                           sprt is not None)) as pool:
+            # at most two shards per worker in flight
+            pending = set()
+            shard_games = {}  # future -> game numbers of its shard
+            try:
+                while True:
+                    while len(pending) < workers * 2:
+                        shard = next(shards, None)
+                        if shard is None:
+                            break
+                        future = pool.submit(_benchmark_worker, shard)
+                        shard_games[future] = shard[1]
+                        pending.add(future)
+                    if not pending:
+                        break
+
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        shard_stats, shard_times, shard_profile, agent1_record = future.result()
+                        if shard_profile is not None:
+                            self.profiler.merge_state(shard_profile)
+                        merge_stats(self.stats, shard_stats)
+                        self.move_times.merge(shard_times)
+                        for agent in shard_stats['average_move_time']:
+                            self.stats['average_move_time'][agent] = self.move_times.mean_time(agent)
+                        if sprt is not None:
+                            wins, draws, losses = agent1_record
+                            sprt.add(wins=wins, draws=draws, losses=losses)
+                    self.maybe_write_snapshot(force=True)
+                    print(f"{self.stats['total_games']}/{num_games} games finished "
+                          f"({time.perf_counter() - start_time:.1f}s)")
+
+                    if sprt is not None and sprt.status():
+                        for future in pending:
+                            future.cancel()
+                        # shards still running finish after the test stopped; their games are not counted
+                        self._discarded_games = [game_num for future in pending for game_num in shard_games[future]]
+                        break
+            except BaseException:
+                # running shards still finish when the pool shuts down; queued ones are dropped
+                for future in pending:
+                    future.cancel()
+                raise
+
+    def record_move(self, move_data: Dict) -> None:
+        """Adds one move of the game in progress to the stats"""
+        turn = self._game_moves
+        self._game_moves += 1
+        phase = move_phase(turn)
+
+        if move_data['type'] == 'random':
+            self.stats['random_moves_used'][move_data['player']] += 1
+
+        if move_data.get('time', 0) > 0.9:  # Close to timeout
+            self.stats['timeouts'][phase] += 1
+
+        self.stats['move_stats'][phase][move_data['type']] += 1
+        self.move_times.add_move(self._game_agents[move_data['player']], phase, move_data.get('time', 0.0),
+                                 move_data['type'], game=self.current_game, turn=turn, player=move_data['player'])
+        if self.results is not None:
+            self.results.add_move(self.current_game, turn, move_data['player'], self._game_agents[move_data['player']],
+                                  phase, move_data['type'], move_data.get('time', 0.0))
 
     def analyze_game(self, game_record: Dict) -> None:
-        """Analyze a single game record"""
+        """Analyze a single game record; its moves were already streamed in by record_move"""
+        if 'moves' in game_record:
+            # a record built elsewhere with its full move list
+            self._game_moves = 0
+            self._game_agents = {PLAYER1: game_record['p1_agent'], PLAYER2: game_record['p2_agent']}
+            for move_data in game_record['moves']:
+                self.record_move(move_data)
+            game_record = {**game_record, 'num_moves': self._game_moves}
+
         self.stats['total_games'] += 1
+        if self.results is not None:
+            self.results.add_game(self.current_game, game_record)
         
         # Update matchup stats
         winner = game_record['winner']
@@ -276,28 +592,31 @@ class GameAnalyzer:
         else:
             self.stats['matchup_stats'][matchup]['draws'] += 1
 
-        # Analyze moves
-        for turn, move_data in enumerate(game_record['moves']):
-            phase = 'opening' if turn < 8 else 'midgame' if turn < 16 else 'endgame'
-            
-            if move_data['type'] == 'random':
-                self.stats['random_moves_used'][move_data['player']] += 1
-            
-            if move_data.get('time', 0) > 0.9:  # Close to timeout
-                self.stats['timeouts'][phase] += 1
-                
-            self.stats['move_stats'][phase][move_data['type']] += 1
-            
         # Record game length
-        self.stats['game_lengths'][len(game_record['moves'])] += 1
+        self.stats['game_lengths'][game_record['num_moves']] += 1
+        for agent in (game_record['p1_agent'], game_record['p2_agent']):
+            self.stats['average_move_time'][agent] = self.move_times.mean_time(agent)
+        self.maybe_write_snapshot()
+
+    def maybe_write_snapshot(self, force=False) -> None:
+        """Writes export_stats() to snapshot_path so partial results can be read during a run"""
+        now = time.perf_counter()
+        if not self.snapshot_path or (not force and now - self._last_snapshot < self.snapshot_every):
+            return
+        self._last_snapshot = now
+        self.move_times.flush()
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.export_stats(), f, indent=2)
+        os.replace(tmp_path, self.snapshot_path)
 
 def main():
     from random_agent import RandomAgent  # Your random agent
     from minimax_agent import MinimaxAgent  # Your advanced agent
     from smart_agent import SmartAgent
     from DQN_agent import DQNAgent
-    # Run benchmark
-    analyzer = GameAnalyzer()
+    # Run benchmark; every game and move is also kept in the results database
+    analyzer = GameAnalyzer(results_db='benchmark_results.db')
 
     p1 = DQNAgent(PLAYER1)
     p2 = RandomAgent(PLAYER2)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import time
+import traceback
+from results_db import DB_PATH, code_version
+
+'''
+Background benchmark jobs with results cached on disk.
+
+A job is a GameAnalyzer.run_benchmark run in its own process, identified by its agent pair,
+parameters and code version (a hash of the engine, benchmark and agent sources). Finished
+results are kept as <key>.json under CACHE_DIR, so the same request with unchanged code is
+answered from disk. While a job runs, its analyzer rewrites <key>.partial.json every
+SNAPSHOT_EVERY seconds, which is what progress() reads. A failed job leaves <key>.error with
+the traceback. Jobs also record their games and moves in the results database (results_db);
+the run of a failed or cancelled job is removed from it.
+
+    jobs = BenchmarkJobs()
+    key = jobs.submit("smart_agent:SmartAgent", "random_agent:RandomAgent", num_games=25)
+    jobs.status(key)      # 'running', 'done' or 'failed'
+    jobs.progress(key)    # (games finished, games requested, partial export_stats() or None)
+    jobs.result(key)
+'''
+
+CACHE_DIR = 'benchmark_cache'
+LATEST_PATH = 'benchmark_results.json'   # the last finished run, as written by benchmark.py
+SNAPSHOT_EVERY = 1.0
+
+def job_key(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _terminate(signum, frame):
+    raise SystemExit(f"terminated by signal {signum}")
+
+def _run_job(params, paths):
+    """Job process: runs the benchmark, writing partial snapshots and then the result"""
+    from benchmark import GameAnalyzer
+    # cancel() terminates the job; unwind so the run is removed from the results database
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        analyzer = GameAnalyzer(verbose=False, snapshot_path=paths['partial'], snapshot_every=SNAPSHOT_EVERY,
+                                results_db=DB_PATH)
+        analyzer.run_benchmark(params['num_games'], params['agent1'], params['agent2'],
+                               workers=params['workers'], seed=params['seed'])
+        stats = analyzer.export_stats()
+        stats['job'] = params
+        _write_json(paths['result'], stats)
+        _write_json(LATEST_PATH, stats)
+    except Exception:
+        with open(paths['error'], 'w') as f:
+            f.write(traceback.format_exc())
+    finally:
+        if os.path.exists(paths['partial']):
+            os.remove(paths['partial'])
+
+class BenchmarkJobs:
+    """Submits benchmark runs to background processes; one instance per dashboard server"""
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.processes = {}   # key -> multiprocessing.Process of a job started by this instance
+        self.params = {}      # key -> job parameters
+
+    def paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return {'result': f"{base}.json", 'partial': f"{base}.partial.json", 'error': f"{base}.error"}
+
+    def submit(self, agent1, agent2, num_games, seed=None, workers=1, rerun=False):
+        """
+        Starts a job unless the same one is already running or cached, and returns its key.
+        Agents are "module:Class" specs; rerun=True discards a cached result.
+        """
+        params = {'agent1': agent1, 'agent2': agent2, 'num_games': num_games, 'seed': seed,
+                  'workers': workers, 'code_version': code_version(agent1, agent2)}
+        key = job_key(params)
+        self.params[key] = params
+        paths = self.paths(key)
+        if self.status(key) == 'running' or (os.path.exists(paths['result']) and not rerun):
+            return key
+
+        for path in paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+        # not a daemon, so the job can start its own worker pool
+        process = multiprocessing.get_context('spawn').Process(target=_run_job, args=(params, paths))
+        process.start()
+        self.processes[key] = process
+        return key
+
+    def status(self, key):
+        """'running', 'done', 'failed' or None for an unknown job"""
+        process = self.processes.get(key)
+        if process is not None and process.is_alive():
+            return 'running'
+        paths = self.paths(key)
+        if os.path.exists(paths['result']):
+            return 'done'
+        if os.path.exists(paths['error']) or process is not None:
+            return 'failed'
+        return None
+
+    def running(self):
+        return [key for key in self.processes if self.status(key) == 'running']
+
+    def progress(self, key):
+        """(games finished, games requested, latest partial stats or None)"""
+        num_games = self.params[key]['num_games'] if key in self.params else None
+        paths = self.paths(key)
+        # the result is written before the partial snapshot is removed
+        path = paths['result'] if os.path.exists(paths['result']) else paths['partial']
+        try:
+            with open(path) as f:
+                partial = json.load(f)
+        except (OSError, ValueError):
+            return 0, num_games, None
+        return partial['totalGames'], num_games, partial
+
+    def result(self, key):
+        with open(self.paths(key)['result']) as f:
+            return json.load(f)
+
+    def error(self, key):
+        path = self.paths(key)['error']
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read()
+
+    def cancel(self, key):
+        process = self.processes.get(key)
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join()
+            with open(self.paths(key)['error'], 'w') as f:
+                f.write("cancelled\n")
+
+    def cached(self):
+        """Finished results on disk, newest first, as [(key, path, modification time)]"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json') and not name.endswith('.partial.json'):
+                path = os.path.join(self.cache_dir, name)
+                entries.append((name[:-len('.json')], path, os.path.getmtime(path)))
+        return sorted(entries, key=lambda entry: -entry[2])
+
+def main():
+    jobs = BenchmarkJobs()
+    key = jobs.submit("smart_agent:SmartAgent", "random_agent:RandomAgent", num_games=10, seed=0)
+    while jobs.status(key) == 'running':
+        done, total, _ = jobs.progress(key)
+        print(f"{done}/{total} games")
+        time.sleep(1.0)
+    print(f"Job {key}: {jobs.status(key)}")
+    if jobs.status(key) == 'done':
+        print(json.dumps(jobs.result(key)['matchupStats'], indent=2))
+
+if __name__ == "__main__":
+    main()
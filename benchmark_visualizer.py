@@ -71,4 +71,4 @@ ReactDOM.render(
 );
 ''')
 
-print("Visualizer built successfully!")
\ No newline at end of file
+print("Visualizer built successfully! Serve it with: python stats_server.py")
\ No newline at end of file
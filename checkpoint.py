@@ -0,0 +1,99 @@
+import os
+import random
+import threading
+import numpy as np
+import torch
+
+'''
+Resumable training checkpoints written off the training thread.
+
+snapshot_training_state() copies everything needed to continue a run - networks, optimizer,
+replay buffer, RNG states, episode counter and metrics - into CPU memory. AsyncCheckpointer
+then pickles the snapshot to disk in a background thread, so the training loop only pays for
+the in-memory copy. Files are written to a temporary name and renamed, so an interrupted
+write never replaces the last good checkpoint.
+'''
+
+def _to_cpu(obj):
+    """Recursively clones tensors to CPU so the snapshot is independent of later updates"""
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: _to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(v) for v in obj)
+    return obj
+
+def snapshot_training_state(agent, episode, metrics=None):
+    """Returns a CPU snapshot of the agent and loop state for AsyncCheckpointer.save()"""
+    rng = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        rng['cuda'] = torch.cuda.get_rng_state_all()
+
+    return {
+        'layout': agent.layout,
+        'policy_net_state_dict': _to_cpu(agent.policy_net.state_dict()),
+        'target_net_state_dict': _to_cpu(agent.target_net.state_dict()),
+        'optimizer_state_dict': _to_cpu(agent.optimizer.state_dict()),
+        'epsilon': agent.epsilon,
+        'memory': agent.memory.state_dict(),
+        'rng': rng,
+        'episode': episode,
+        'metrics': dict(metrics or {}),
+    }
+
+def restore_training_state(agent, filename):
+    """
+    Loads a checkpoint written by AsyncCheckpointer onto the agent's device.
+    Returns (episode, metrics) so the caller can continue its loop.
+    """
+    # training checkpoints hold NumPy buffers and RNG tuples, so they are not weights-only
+    checkpoint = torch.load(filename, map_location=agent.device, weights_only=False)
+
+    if checkpoint['layout'] != agent.layout:
+        raise ValueError(f"Checkpoint layout {checkpoint['layout']} does not match agent layout {agent.layout}")
+    agent.policy_net.load_state_dict(checkpoint['policy_net_state_dict'])
+    agent.target_net.load_state_dict(checkpoint['target_net_state_dict'])
+    agent.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+    agent.epsilon = checkpoint['epsilon']
+    agent.memory.load_state_dict(checkpoint['memory'])
+
+    rng = checkpoint['rng']
+    random.setstate(rng['python'])
+    np.random.set_state(rng['numpy'])
+    torch.set_rng_state(rng['torch'])
+    if 'cuda' in rng and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(rng['cuda'])
+
+    return checkpoint['episode'], checkpoint['metrics']
+
+class AsyncCheckpointer:
+    """Writes snapshots to disk in a background thread, one write in flight at a time"""
+    def __init__(self):
+        self._thread = None
+        self.error = None
+
+    def save(self, snapshot, filename):
+        # a new save waits for the previous write so files are never written concurrently
+        self.wait()
+        self._thread = threading.Thread(target=self._write, args=(snapshot, filename), daemon=True)
+        self._thread.start()
+
+    def _write(self, snapshot, filename):
+        tmp_filename = f"{filename}.tmp"
+        try:
+            torch.save(snapshot, tmp_filename)
+            os.replace(tmp_filename, filename)
+        except Exception as e:
+            self.error = e
+            print(f"Error writing checkpoint {filename}: {str(e)}")
+
+    def wait(self):
+        """Blocks until the pending write (if any) is on disk"""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
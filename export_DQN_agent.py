@@ -0,0 +1,91 @@
+import time
+import random
+import numpy as np
+import torch
+import torch.nn as nn
+from DQN_agent import DQNAgent, DENSE
+from PushBattle import Game, PLAYER1, PLAYER2, EMPTY, BOARD_SIZE
+from random_agent import RandomAgent
+
+'''
+Exports a trained DQNAgent checkpoint into a CPU inference artifact.
+
+The policy network is (optionally) dynamically quantized to int8 - which applies to the
+Linear(4096, 4096) head of the dense layout, the factored layout has no Linear layers - and
+traced to TorchScript. The artifact carries the action layout in its extra files and holds
+no target network or optimizer state. DQNAgent.load_inference() loads it.
+'''
+
+def export_inference_model(agent, filename='dqn_model_int8.pt', quantize=True):
+    """Traces (and quantizes) agent.policy_net and saves it as a self-contained TorchScript file"""
+    model = agent.policy_net.to("cpu").eval()
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+    example = torch.zeros(1, 3, BOARD_SIZE, BOARD_SIZE)
+    with torch.no_grad():
+        scripted = torch.jit.freeze(torch.jit.trace(model, example))
+
+    torch.jit.save(scripted, filename, _extra_files={'layout': agent.layout})
+    agent.policy_net.to(agent.device)
+    return scripted
+
+def sample_positions(num_positions=200, seed=0):
+    """Plays random games and returns the positions seen before each move"""
+    random.seed(seed)
+    positions = []
+    while len(positions) < num_positions:
+        game = Game()
+        players = {PLAYER1: RandomAgent(PLAYER1), PLAYER2: RandomAgent(PLAYER2)}
+        for _ in range(60):
+            positions.append(Game.from_dict(game.to_dict()))
+            move = players[game.current_player].get_best_move(game)
+            if len(move) == 2:
+                game.place_checker(*move)
+            else:
+                game.move_checker(*move)
+            game.turn_count += 1
+            if game.check_winner() != EMPTY or len(positions) >= num_positions:
+                break
+            game.current_player *= -1
+    return positions
+
+def compare_models(eager_agent, inference_agent, positions):
+    """Reports per-move latency of both agents and how often they pick the same move"""
+    eager_agent.epsilon = 0.0
+    inference_agent.epsilon = 0.0
+    results = {}
+    moves = {}
+    for name, agent in (('eager', eager_agent), ('inference', inference_agent)):
+        agent.get_best_move(positions[0])   # warm-up
+        times = []
+        moves[name] = []
+        for game in positions:
+            agent.player = game.current_player
+            start_time = time.perf_counter()
+            moves[name].append(agent.get_best_move(game))
+            times.append(time.perf_counter() - start_time)
+        times = np.array(times) * 1000
+        results[name] = {'mean_ms': float(times.mean()), 'p50_ms': float(np.percentile(times, 50)),
+                         'p99_ms': float(np.percentile(times, 99))}
+
+    agreement = np.mean([a == b for a, b in zip(moves['eager'], moves['inference'])])
+    results['move_agreement'] = float(agreement)
+    results['speedup'] = results['eager']['mean_ms'] / results['inference']['mean_ms']
+    return results
+
+def main():
+    agent = DQNAgent(PLAYER1, layout=DENSE, device="cpu")
+    agent.load("dqn_model.pth")
+    export_inference_model(agent, "dqn_model_int8.pt")
+
+    inference_agent = DQNAgent(PLAYER1, memory_size=1, device="cpu")
+    inference_agent.load_inference("dqn_model_int8.pt")
+
+    results = compare_models(agent, inference_agent, sample_positions())
+    print(f"Eager:     {results['eager']['mean_ms']:.2f} ms/move (p99 {results['eager']['p99_ms']:.2f})")
+    print(f"Inference: {results['inference']['mean_ms']:.2f} ms/move (p99 {results['inference']['p99_ms']:.2f})")
+    print(f"Speedup: {results['speedup']:.2f}x, Move agreement: {results['move_agreement']:.2%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import glob
+import mmap
+import os
+import struct
+import numpy as np
+from PushBattle import Game, PLAYER1, PLAYER2, EMPTY, BOARD_SIZE, array_to_chess_notation
+
+'''
+Compact append-only storage for finished games.
+
+A game is stored as one record:
+    u16 length | result byte | move bytes ...
+Every move is one byte for a placement and two for a movement:
+    byte 0: bit 7 - movement (a destination byte follows)
+            bit 6 - random fallback (the "r" suffix of a game string)
+            bits 0-5 - cell, row * 8 + col (the placed or moved piece)
+    byte 1: bits 0-5 - destination cell of a movement
+The result byte holds the winner (0 unknown, 1 PLAYER1, 2 PLAYER2, 3 draw) in bits 0-1 and
+a forfeit flag (the trailing "-q") in bit 2.
+
+Records are appended to shard files games-00000.bin, games-00001.bin, ... and the offset of
+every record is appended to a matching .idx file (little-endian u64), so any game can be read
+without scanning the shard. Only one writer may append to a directory at a time.
+'''
+
+MOVEMENT_FLAG = 0x80
+RANDOM_FLAG = 0x40
+CELL_MASK = 0x3f
+FORFEIT_FLAG = 0x04
+RESULT_CODES = {None: 0, PLAYER1: 1, PLAYER2: 2, EMPTY: 3}
+RESULTS = {code: winner for winner, code in RESULT_CODES.items()}
+HEADER = struct.Struct("<H")
+SHARD_BYTES = 64 * 1024 * 1024
+
+# lookup tables between cells and chess notation ("a8" is cell 0)
+CELL_NOTATION = [array_to_chess_notation([cell // BOARD_SIZE, cell % BOARD_SIZE]) for cell in range(BOARD_SIZE * BOARD_SIZE)]
+NOTATION_CELL = {notation: cell for cell, notation in enumerate(CELL_NOTATION)}
+
+def encode_moves(game_str):
+    """Encodes a judge game string ("-a1-b2r-...-q") as (move bytes, forfeit)"""
+    out = bytearray()
+    forfeit = False
+    for token in game_str.split("-")[1:]:
+        if token == "q":
+            forfeit = True
+            break
+        flag = 0
+        if token.endswith("r"):
+            flag = RANDOM_FLAG
+            token = token[:-1]
+        if len(token) == 2:
+            out.append(flag | NOTATION_CELL[token])
+        else:
+            out.append(MOVEMENT_FLAG | flag | NOTATION_CELL[token[:2]])
+            out.append(NOTATION_CELL[token[2:]])
+    return bytes(out), forfeit
+
+def decode_moves(data, forfeit=False):
+    """Inverse of encode_moves: returns the game string"""
+    parts = []
+    i = 0
+    while i < len(data):
+        byte = data[i]
+        token = CELL_NOTATION[byte & CELL_MASK]
+        if byte & MOVEMENT_FLAG:
+            i += 1
+            token += CELL_NOTATION[data[i]]
+        if byte & RANDOM_FLAG:
+            token += "r"
+        parts.append(token)
+        i += 1
+    if forfeit:
+        parts.append("q")
+    return "".join(f"-{part}" for part in parts)
+
+def iter_moves(data):
+    """Yields (move, is_random) for encoded move bytes, with moves as [r, c] or [r0, c0, r1, c1]"""
+    i = 0
+    while i < len(data):
+        byte = data[i]
+        cell = byte & CELL_MASK
+        move = [cell // BOARD_SIZE, cell % BOARD_SIZE]
+        if byte & MOVEMENT_FLAG:
+            i += 1
+            move += [data[i] // BOARD_SIZE, data[i] % BOARD_SIZE]
+        yield move, bool(byte & RANDOM_FLAG)
+        i += 1
+
+def encode_record(game_str, winner=None):
+    """One framed record: length, result byte and moves"""
+    moves, forfeit = encode_moves(game_str)
+    result = RESULT_CODES[winner] | (FORFEIT_FLAG if forfeit else 0)
+    return HEADER.pack(len(moves) + 1) + bytes([result]) + moves
+
+def decode_record(body):
+    """Decodes a record body (without its length prefix) to (game_str, winner)"""
+    result = body[0]
+    return decode_moves(body[1:], bool(result & FORFEIT_FLAG)), RESULTS[result & 0x03]
+
+def _shard_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, "games-*.bin")))
+
+def _index_path(shard_path):
+    return shard_path[:-len(".bin")] + ".idx"
+
+def rebuild_index(shard_path):
+    """Rewrites a shard's .idx by walking its length prefixes, e.g. after an interrupted write"""
+    offsets = []
+    with open(shard_path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        (length,) = HEADER.unpack_from(data, offset)
+        if offset + HEADER.size + length > len(data):
+            break
+        offsets.append(offset)
+        offset += HEADER.size + length
+    np.array(offsets, dtype="<u8").tofile(_index_path(shard_path))
+    return offset
+
+class GameRecordWriter:
+    """Appends games to the shards of `directory`, starting a new shard past `shard_bytes`"""
+    def __init__(self, directory, shard_bytes=SHARD_BYTES):
+        self.directory = directory
+        self.shard_bytes = shard_bytes
+        os.makedirs(directory, exist_ok=True)
+        shards = _shard_paths(directory)
+        self.shard_number = len(shards) - 1 if shards else 0
+        self._open_shard()
+
+    def _open_shard(self):
+        path = os.path.join(self.directory, f"games-{self.shard_number:05d}.bin")
+        if os.path.exists(path):
+            # drops a partly written trailing record and re-syncs the index with the shard
+            end = rebuild_index(path)
+            os.truncate(path, end)
+        self.data_file = open(path, "ab")
+        self.index_file = open(_index_path(path), "ab")
+        self.offset = self.data_file.tell()
+
+    def append(self, game_str, winner=None):
+        """Stores one game"""
+        if self.offset >= self.shard_bytes:
+            self.close()
+            self.shard_number += 1
+            self._open_shard()
+        record = encode_record(game_str, winner)
+        self.data_file.write(record)
+        self.index_file.write(struct.pack("<Q", self.offset))
+        self.offset += len(record)
+
+    def flush(self):
+        self.data_file.flush()
+        self.index_file.flush()
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
+
+class GameRecordStore:
+    """Random access to every stored game through the shard indexes"""
+    def __init__(self, directory):
+        self.shards = []
+        self.offsets = []
+        for path in _shard_paths(directory):
+            offsets = np.fromfile(_index_path(path), dtype="<u8")
+            if not len(offsets):
+                continue
+            with open(path, "rb") as f:
+                self.shards.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            self.offsets.append(offsets)
+        counts = [len(offsets) for offsets in self.offsets]
+        self.starts = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def body(self, i):
+        """Raw record body (result byte + moves) of game i"""
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        shard = int(np.searchsorted(self.starts, i, side="right")) - 1
+        offset = int(self.offsets[shard][i - self.starts[shard]])
+        data = self.shards[shard]
+        (length,) = HEADER.unpack_from(data, offset)
+        return data[offset + HEADER.size:offset + HEADER.size + length]
+
+    def __getitem__(self, i):
+        """(game_str, winner) of game i"""
+        return decode_record(self.body(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def replay(self, i):
+        """
+        Replays game i through the engine, yielding (turn, game, move, is_random) after every
+        move. The same Game object is yielded each time; copy it to keep a position.
+        """
+        game = Game()
+        for move, is_random in iter_moves(self.body(i)[1:]):
+            game.turn_count += 1
+            game.play_move(move)
+            yield game.turn_count, game, move, is_random
+
+    def positions(self, games, turns=None):
+        """
+        Bulk replay for analysis and training: the boards after every move of `games` (an
+        iterable of game indexes), optionally limited to a range of turns.
+        Returns (boards int8 (N, 8, 8), game_ids int64 (N,), turns int16 (N,)).
+        """
+        boards, game_ids, turn_numbers = [], [], []
+        for i in games:
+            for turn, game, _, _ in self.replay(i):
+                if turns is None or turn in turns:
+                    boards.append(game.board.astype(np.int8))
+                    game_ids.append(i)
+                    turn_numbers.append(turn)
+        if not boards:
+            return np.zeros((0, BOARD_SIZE, BOARD_SIZE), dtype=np.int8), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int16)
+        return np.stack(boards), np.array(game_ids, dtype=np.int64), np.array(turn_numbers, dtype=np.int16)
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
@@ -1,12 +1,89 @@
 import numpy as np
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from PushBattle import Game, PLAYER1, PLAYER2, EMPTY, BOARD_SIZE, NUM_PIECES, _torus, chess_notation_to_array, array_to_chess_notation
+from random_agent import RandomAgent
+from protocol import SUPPORTED_PROTOCOLS, DeltaTracker, accepted_protocol
+from stream_transport import StreamClient, resolve_address
+from judge_telemetry import OK, FAILED, ILLEGAL, MoveTelemetry
 
 import random
 
 
 TIMEOUT = 4 # time for each move
+TELEMETRY_PATH = "judge_telemetry.json" # per-move timings and failure counters of the last game
+
+# Transports the judge can use to reach players
+TRANSPORT_HTTP = "http"     # HTTP requests on a keep-alive session
+TRANSPORT_AUTO = "auto"     # the player's advertised stream socket when available, HTTP otherwise
+HTTP_ROUTES = {"hello": ("GET", ""), "start": ("POST", "/start"), "move": ("POST", "/move"), "end": ("POST", "/end")}
+TRANSPORT_ERRORS = (requests.RequestException, OSError, ValueError)
+RANDOM_MOVES = 5 # random fallback moves each player gets per game
+MOVE_ATTEMPTS = (1, 2) # a second attempt only when the first brought no usable reply
+
+# outcomes of a turn, from resolve_turn
+PLAYED = "played"
+RANDOM_FALLBACK = "random"
+FORFEIT = "forfeit"
+
+def is_valid_format(move):
+    """A move must be a list of 2 (placement) or 4 (movement) values"""
+    return isinstance(move, (list, tuple)) and len(move) in (2, 4)
+
+def apply_move(game, move):
+    """
+    Plays a move under the judge's rules: placements up to turn 16, movements afterwards.
+    Returns True if the move was played, or "forfeit" if it is malformed or illegal.
+    """
+    if not is_valid_format(move):
+        return "forfeit"
+
+    try:
+        # Convert move elements to integers if they aren't already
+        move = [int(x) if isinstance(x, (int, str)) else x for x in move]
+
+        if game.turn_count < 17:
+            if not game.is_valid_placement(move[0], move[1]):
+                return "forfeit"
+            game.place_checker(move[0], move[1])
+        else:
+            if not game.is_valid_move(move[0], move[1], move[2], move[3]):
+                return "forfeit"
+            game.move_checker(move[0], move[1], move[2], move[3])
+    except (ValueError, TypeError, IndexError):
+        return "forfeit"
+
+    return True
+
+def resolve_turn(game, result, random_left):
+    """
+    The judge's rules once a player's attempts are over, shared by Judge, AsyncJudge and
+    agent_adapters.referee_game. `result` is the last attempt's: True (the move was played),
+    "forfeit" (malformed or illegal) or False (no usable reply). A failed turn gets a random
+    move while the player has random moves left (counted down in random_left) and forfeits
+    otherwise. Returns (PLAYED, None), (RANDOM_FALLBACK, the random move) or (FORFEIT, None).
+    """
+    if result == "forfeit":
+        return FORFEIT, None
+    if result:
+        return PLAYED, None
+    player = game.current_player
+    if random_left[player] <= 0:
+        return FORFEIT, None
+    move = RandomAgent(player=player).get_best_move(game)
+    apply_move(game, move)
+    random_left[player] -= 1
+    return RANDOM_FALLBACK, move
+
+def make_session():
+    """Keep-alive session with a small connection pool for talking to one player"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 class Agent:
     def __init__(self, participant, agent_name):
@@ -15,47 +92,112 @@ class Agent:
         self.latency = None
 
 class Judge:
-    def __init__(self, p1_url, p2_url):
+    def __init__(self, p1_url, p2_url, transport=TRANSPORT_AUTO):
         self.p1_url = p1_url
         self.p2_url = p2_url
         self.game = Game()
         self.p1_agent = None
         self.p2_agent = None
         self.game_str = ""
+        self.delta = DeltaTracker()
+        self.telemetry = MoveTelemetry(TIMEOUT)
+
+        # one persistent keep-alive session per player, and a pool to contact both at once
+        self.p1_session = make_session()
+        self.p2_session = make_session()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+        # persistent stream connections, opened in check_latency when the player offers one
+        self.transport = transport
+        self.streams = {PLAYER1: None, PLAYER2: None}
+
+    def current_agent(self):
+        """Agent record of the player to move"""
+        return self.p1_agent if self.game.current_player == PLAYER1 else self.p2_agent
+
+    def close(self):
+        """Closes the player sessions, stream connections and the worker pool"""
+        self.p1_session.close()
+        self.p2_session.close()
+        for stream in self.streams.values():
+            if stream is not None:
+                stream.close()
+        self.executor.shutdown(wait=False)
+
+    def _timed_request(self, player, message_type, data=None):
+        """
+        Sends a message to a player over its stream, or over HTTP when it has none.
+        Returns (response, latency); latency uses a monotonic clock.
+        A failing stream is dropped so later requests fall back to HTTP.
+        """
+        stream = self.streams[player]
+        start_time = time.perf_counter()
+        if stream is not None:
+            try:
+                response = stream.request(message_type, data)
+                return response, time.perf_counter() - start_time
+            except TRANSPORT_ERRORS:
+                stream.close()
+                self.streams[player] = None
+                raise
+
+        session, url = (self.p1_session, self.p1_url) if player == PLAYER1 else (self.p2_session, self.p2_url)
+        method, path = HTTP_ROUTES[message_type]
+        response = session.request(method, f"{url}{path}", timeout=TIMEOUT, json=data)
+        return response, time.perf_counter() - start_time
+
+    def _both(self, message_type, p1_data=None, p2_data=None):
+        """
+        Sends a message to both players in parallel.
+        Returns [(response, latency) or exception] for P1 and P2.
+        """
+        futures = [
+            self.executor.submit(self._timed_request, player, message_type, data)
+            for player, data in ((PLAYER1, p1_data), (PLAYER2, p2_data))
+        ]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except TRANSPORT_ERRORS as e:
+                results.append(e)
+        return results
+
+    def _open_stream(self, player, reply):
+        """Connects to the stream socket a player advertised in its hello reply, if any"""
+        url = self.p1_url if player == PLAYER1 else self.p2_url
+        address = reply.get("stream") if isinstance(reply, dict) else None
+        if self.transport == TRANSPORT_HTTP or not address:
+            return
+        try:
+            self.streams[player] = StreamClient(resolve_address(address, url), TIMEOUT)
+            print(f"Using stream transport {address} for {url}")
+        except TRANSPORT_ERRORS:
+            print(f"Stream transport {address} unavailable for {url}, using HTTP")
 
     def check_latency(self):
         """Check latency for both players and create their agents"""
-        # Check P1
-        try:
-            start_time = time.time()
-            response = requests.get(self.p1_url, timeout=TIMEOUT)
-            end_time = time.time()
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.p1_agent = Agent("Participant1", "Agent1")
-                self.p1_agent.latency = (end_time - start_time)
-            else:
-                return False
-                
-        except (requests.RequestException, requests.Timeout):
-            return False
+        # This also opens the keep-alive connections, so connection setup is not billed to the first move
+        p1_result, p2_result = self._both("hello")
 
-        # Check P2
-        try:
-            start_time = time.time()
-            response = requests.get(self.p2_url, timeout=TIMEOUT)
-            end_time = time.time()
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.p2_agent = Agent("Participant2", "Agent2")
-                self.p2_agent.latency = (end_time - start_time)
-            else:
+        for result, player, participant, agent_name in ((p1_result, PLAYER1, "Participant1", "Agent1"),
+                                                        (p2_result, PLAYER2, "Participant2", "Agent2")):
+            if isinstance(result, Exception):
                 return False
-                
-        except (requests.RequestException, requests.Timeout):
-            return False
+            response, latency = result
+            if response.status_code != 200:
+                return False
+            agent = Agent(participant, agent_name)
+            agent.latency = latency
+            if participant == "Participant1":
+                self.p1_agent = agent
+            else:
+                self.p2_agent = agent
+
+            try:
+                self._open_stream(player, response.json())
+            except ValueError:
+                pass
 
         return True
 
@@ -65,64 +207,78 @@ class Judge:
             "game": self.game.to_dict(),
             "board": self.game.board.tolist(),
             "max_latency": TIMEOUT,
+            "protocols": SUPPORTED_PROTOCOLS,
         }
-        # Start p1
-        try:
-            starting_data['first_turn'] = True
-            response = requests.post(f"{self.p1_url}/start", json=starting_data, timeout=TIMEOUT)
-
-        except (requests.RequestException, requests.Timeout):
+        # Start p1 and p2 at the same time
+        results = self._both("start", {**starting_data, "first_turn": True}, {**starting_data, "first_turn": False})
+        if any(isinstance(result, Exception) for result in results):
             return False
 
-        # Start p2
-        try:
-            starting_data['first_turn'] = False
-            response = requests.post(f"{self.p2_url}/start", json=starting_data, timeout=TIMEOUT)
-            return True
-
-        except (requests.RequestException, requests.Timeout):
-            return False
+        # players that answer with "delta" get compact move requests
+        for player, (response, _) in zip((PLAYER1, PLAYER2), results):
+            try:
+                self.delta.protocols[player] = accepted_protocol(response.json())
+            except ValueError:
+                pass
+        return True
 
     def receive_move(self, attempt_number, p1_random, p2_random):
         """ Receive moves from each player """
+        player = self.game.current_player
+        if player == PLAYER1:
+            agent, random_attempts = self.p1_agent, p1_random
+        else:
+            agent, random_attempts = self.p2_agent, p2_random
+
         move_data = {
+                    "player": player,
                     "game": self.game.to_dict(),
                     "board": self.game.board.tolist(),
                     "turn_count": self.game.turn_count,
                     "attempt_number": attempt_number,
+                    "random_attempts": random_attempts,
                 }
+        latency = compute_time = None
+        result = False
         try:
-            if self.game.current_player == PLAYER1:
-                move_data["random_attempts"] = p1_random
-                start_time = time.time()
-                response = requests.post(f"{self.p1_url}/move", json=move_data, timeout=TIMEOUT)
-                end_time = time.time()
-                self.p1_agent.latency = (end_time-start_time)
+            if self.delta.uses_delta(player):
+                delta_data = self.delta.move_request(self.game)
+                # lets a server that hosts both sides (agent_server.py) tell them apart
+                delta_data["player"] = player
+                delta_data["attempt_number"] = attempt_number
+                delta_data["random_attempts"] = random_attempts
+                response, agent.latency = self._timed_request(player, "move", delta_data)
+
+                # the agent's copy diverged: resend the full state for the same attempt
+                reply = response.json() if response.status_code == 200 else None
+                if isinstance(reply, dict) and reply.get("resync"):
+                    response, latency = self._timed_request(player, "move", move_data)
+                    agent.latency += latency
             else:
-                move_data["random_attempts"] = p2_random
-                start_time = time.time()
-                response = requests.post(f"{self.p2_url}/move", json=move_data, timeout=TIMEOUT)
-                end_time = time.time()
-                self.p2_agent.latency = (end_time-start_time)
+                response, agent.latency = self._timed_request(player, "move", move_data)
+            latency = agent.latency
+            self.delta.mark_seen(player)
 
             # receiving the move
             if response.status_code == 200:
                 move = response.json()
-                handled_move = self.handle_move(self.game, move['move'])
-
-                # if self.handle_move(self.game, move['move']):
-                if handled_move == "forfeit":
-                    return "forfeit"
-                elif handled_move:
-                    return True
-                else:
-                    return False
-
-                # return True
-            else:
-                return False 
-        except (requests.RequestException, requests.Timeout):
-            return False
+                if isinstance(move, dict):
+                    compute_time = move.get('compute_time')
+                # a list or scalar reply is not a move; 'in' would raise on a scalar
+                if isinstance(move, dict) and 'move' in move:
+                    handled_move = self.handle_move(self.game, move['move'])
+
+                    # if self.handle_move(self.game, move['move']):
+                    if handled_move == "forfeit":
+                        result = "forfeit"
+                    elif handled_move:
+                        result = True
+        except TRANSPORT_ERRORS:
+            pass
+
+        outcome = OK if result is True else ILLEGAL if result == "forfeit" else FAILED
+        self.telemetry.record_attempt(agent.agent_name, self.game.turn_count, attempt_number, latency, compute_time, outcome)
+        return result
 
     def end_game(self, winner):
         """ End the game for both players """
@@ -132,22 +288,15 @@ class Judge:
                     "turn_count": self.game.turn_count,
                     "winner": int(winner)
                 }
-        try:
-            response = requests.post(f"{self.p1_url}/end", json=end_data, timeout=TIMEOUT)
-            response = requests.post(f"{self.p2_url}/end", json=end_data, timeout=TIMEOUT)
-            print(f"Winner: {'PLAYER1' if winner == PLAYER1 else 'PLAYER2'}")
-        except (requests.RequestException, requests.Timeout):
+        results = self._both("end", {**end_data, "player": PLAYER1}, {**end_data, "player": PLAYER2})
+        if any(isinstance(result, Exception) for result in results):
             return False
+        print(f"Winner: {'PLAYER1' if winner == PLAYER1 else 'PLAYER2'}")
 
     def handle_move(self, game, move):
         """ Places the move if valid and returns True or False """
 
-        if not isinstance(move, (list, tuple)) or len(move) < 2:
-                print(f"Invalid move format by Player {'P1' if game.current_player == PLAYER1 else 'P2'}")
-                # return False
-                return "forfeit"
-
-        if len(move) != 2 and len(move) != 4:
+        if not is_valid_format(move):
             print(f"Invalid move format by Player {'P1' if game.current_player == PLAYER1 else 'P2'}")
             # return False
             return "forfeit"
@@ -155,30 +304,17 @@ class Judge:
         chess_move = array_to_chess_notation(move)
         print(f"{game.current_player}'s move is: {move} or {chess_move}")
 
-        try:
-            # Convert move elements to integers if they aren't already
-            move = [int(x) if isinstance(x, (int, str)) else x for x in move]
-
-            if game.turn_count < 17:
-                if game.is_valid_placement(move[0], move[1]):
-                    game.place_checker(move[0], move[1])
-                else:
-                    print(f"Invalid placement by {game.current_player}")
-                    # return False
-                    return "forfeit"
-            else:
-                if game.is_valid_move(move[0], move[1], move[2], move[3]):
-                    game.move_checker(move[0], move[1], move[2], move[3])
-                else:
-                    print(f"Invalid move by {game.current_player}")
-                    # return False
-                    return "forfeit"
-
-            player = 1 if self.game.current_player == 1 else 2
-            self.game_str += f"-{chess_move}"
-            return True
-        except (requests.RequestException, requests.Timeout):
-            return False
+        if apply_move(game, move) == "forfeit":
+            print(f"Invalid {'placement' if game.turn_count < 17 else 'move'} by {game.current_player}")
+            return "forfeit"
+
+        self.record_move(move)
+        return True
+
+    def record_move(self, move, suffix=""):
+        """Adds a played move to the game string and the delta protocol's history"""
+        self.game_str += f"-{array_to_chess_notation(move)}{suffix}"
+        self.delta.record(move)
             
 
 def main():
@@ -190,6 +326,7 @@ def main():
     # creating game link
     if not judge.check_latency():
         print("Failed to connect to one or both players")
+        judge.close()
         return
         
     print(f"Player 1: {judge.p1_agent.agent_name} ({judge.p1_agent.participant})")
@@ -200,90 +337,49 @@ def main():
     print("Starting game...")
     if not judge.start_game():
         print("Failed to start game")
+        judge.close()
         return
 
     # random moves left for p1 and p2
-    p1_random = 5
-    p2_random = 5
-        
+    random_left = {PLAYER1: RANDOM_MOVES, PLAYER2: RANDOM_MOVES}
+
     # game loop
     while True:
         judge.game.turn_count += 1
         print(f"Turn {judge.game.turn_count}")
 
         # movement
-        print("Sending move to:", judge.game.current_player)
-
-        # first move attempt
-        print("First move attempt")
-        first_attempt = judge.receive_move(1, p1_random, p2_random)
-
-        # checks if the first attempt was a forfeit
-        if first_attempt == "forfeit":
-            player = 1 if judge.game.current_player == 1 else 2
-
-            judge.game_str += f"-q"
-
-            winner = 1 if player == 2 else -1
+        player = judge.game.current_player
+        print("Sending move to:", player)
+
+        # first and second move attempts
+        result = False
+        for attempt in MOVE_ATTEMPTS:
+            print("First move attempt" if attempt == 1 else "Second move attempt")
+            result = judge.receive_move(attempt, random_left[PLAYER1], random_left[PLAYER2])
+            if result is not False:
+                break
 
-            judge.end_game(winner)
+        if result is False:
+            print(f"Player {'PLAYER1' if player == PLAYER1 else 'PLAYER2'} failed to make a valid move.")
+        outcome, move = resolve_turn(judge.game, result, random_left)
+
+        if outcome == RANDOM_FALLBACK:
+            # tag that it was random
+            judge.record_move(move, "r")
+            judge.telemetry.record_event(judge.current_agent().agent_name, 'random_fallbacks')
+            print(f"{'P1' if player == PLAYER1 else 'P2'} has {random_left[player]} random moves left")
+        elif outcome == FORFEIT:
+            if result is False:
+                print(f"Player {player} has no random moves left. Forfeiting.")
+            # indicates forfeit
+            judge.game_str += "-q"
+            judge.telemetry.record_event(judge.current_agent().agent_name, 'forfeits')
+
+            judge.end_game(-player)
             print("Game String:", judge.game_str)
             break
 
-        # if not judge.send_move(1, p1_random, p2_random):
-        if not first_attempt:
-            print("Second move attempt")
-
-            second_attempt = judge.receive_move(2, p1_random, p2_random)
-            if second_attempt == "forfeit":
-                player = 1 if judge.game.current_player == 1 else 2
-                # indicates forfeit
-                judge.game_str += f"-q"
-
-                winner = 1 if player == 2 else -1
-
-                judge.end_game(winner)
-                print("Game String:", judge.game_str)
-                break
-
-            # second move attempt
-            if not second_attempt:
-                # plays a random move
-                print(f"Player {'PLAYER1' if judge.game.current_player == PLAYER1 else 'PLAYER2'} failed to make a valid move.")
-
-                current_random_moves = p1_random if judge.game.current_player == PLAYER1 else p2_random
-                
-                if current_random_moves > 0:
-                    random = RandomAgent(player=judge.game.current_player)
-                    move = random.get_best_move(judge.game)
-                    # judge.handle_move(judge.game, move)
-
-                    move = array_to_chess_notation(move)
-                    judge.handle_move(judge.game, move)
-                    # tag that it was random
-                    judge.game_str += 'r'
-
-                    if judge.game.current_player == PLAYER1:
-                        p1_random -= 1
-                        print(f"P1 has {p1_random} random moves left")
-                    else:
-                        p2_random -= 1
-                        print(f"P2 has {p2_random} random moves left")
-                else:
-                    # current player forfeits
-                    print(f"Player {judge.game.current_player} has no random moves left. Forfeiting.")
-                    if judge.game.current_player == PLAYER1:
-                        judge.end_game(PLAYER2)
-                    else:
-                        judge.end_game(PLAYER1)
-
-                    player = 1 if judge.game.current_player == 1 else 2
-                    # indicates forfeit
-                    judge.game_str += f"-q"
-                    
-                    print("Game String:", judge.game_str)
-                    break
-
         judge.game.display_board()
             
         # check for a winner
@@ -304,6 +400,10 @@ def main():
         #     judge.end_game(EMPTY)
         #     break
 
+    judge.telemetry.report()
+    judge.telemetry.export(TELEMETRY_PATH)
+    judge.close()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,114 @@
+import json
+from collections import defaultdict
+import numpy as np
+
+'''
+Per-move timing records and failure counters for the judge and the referee.
+
+Every move attempt is one row: agent, turn, attempt number, phase, the latency the judge
+measured, the compute time the agent reported in its reply ("compute_time", seconds) and the
+outcome. The difference between the two is transport overhead (network, serialization and
+queuing). Counters track first-attempt failures, second attempts, timeouts, random fallbacks
+and forfeits per agent.
+
+summary() reduces the rows to p50/p95/p99 and a latency histogram per agent and game phase;
+to_dict()/merge() carry the raw rows between games, workers and tournament reports.
+'''
+
+PLACEMENT = "placement"
+MOVEMENT = "movement"
+
+# attempt outcomes
+OK = "ok"               # a legal move was played
+FAILED = "failed"       # no usable reply: error, timeout or missing move
+ILLEGAL = "illegal"     # malformed or illegal move, the player forfeits
+
+# upper edges (seconds) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 4.0]
+COLUMNS = ["agent", "turn", "attempt", "phase", "latency", "compute_time", "outcome"]
+
+def game_phase(turn_count):
+    """Placements up to turn 16, movements afterwards (the judge's rule)"""
+    return PLACEMENT if turn_count < 17 else MOVEMENT
+
+def _percentiles(values):
+    if not len(values):
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(np.max(values)),
+            'mean': float(np.mean(values))}
+
+class MoveTelemetry:
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.rows = []
+        self.counters = defaultdict(lambda: defaultdict(int))
+
+    def record_attempt(self, agent, turn, attempt, latency, compute_time=None, outcome=OK):
+        """Records one move request; latency is None when no reply arrived at all"""
+        self.rows.append([agent, turn, attempt, game_phase(turn), latency, compute_time, outcome])
+        counters = self.counters[agent]
+        counters['attempts'] += 1
+        if attempt == 1 and outcome == FAILED:
+            counters['first_attempt_failures'] += 1
+        if attempt == 2:
+            counters['second_attempts'] += 1
+        if latency is None or latency > self.timeout:
+            counters['timeouts'] += 1
+
+    def record_event(self, agent, name):
+        """Counts a game event such as 'random_fallbacks' or 'forfeits'"""
+        self.counters[agent][name] += 1
+
+    def to_dict(self):
+        return {'columns': COLUMNS, 'rows': self.rows,
+                'counters': {agent: dict(counters) for agent, counters in self.counters.items()}}
+
+    def merge(self, data):
+        """Adds the rows and counters of another telemetry's to_dict()"""
+        self.rows.extend(data['rows'])
+        for agent, counters in data['counters'].items():
+            for name, n in counters.items():
+                self.counters[agent][name] += n
+
+    def summary(self):
+        """{agent: {'counters': {...}, phase: {latency, compute, transport percentiles, histogram}}}"""
+        groups = defaultdict(list)
+        for row in self.rows:
+            groups[(row[0], row[3])].append(row)
+
+        summary = {agent: {'counters': dict(counters)} for agent, counters in self.counters.items()}
+        for (agent, phase), rows in groups.items():
+            latency = np.array([row[4] for row in rows if row[4] is not None])
+            compute = np.array([row[5] for row in rows if row[5] is not None])
+            transport = np.array([row[4] - row[5] for row in rows if row[4] is not None and row[5] is not None])
+            histogram = np.bincount(np.searchsorted(LATENCY_BUCKETS, latency), minlength=len(LATENCY_BUCKETS) + 1)
+            summary.setdefault(agent, {})[phase] = {
+                'attempts': len(rows),
+                'latency': _percentiles(latency),
+                'compute': _percentiles(compute),
+                'transport': _percentiles(transport),
+                # share of replies that used more than half of the time budget
+                'near_timeout': float(np.mean(latency > self.timeout / 2)) if len(latency) else 0.0,
+                'histogram': {'buckets': LATENCY_BUCKETS, 'counts': histogram.tolist()},
+            }
+        return summary
+
+    def export(self, path):
+        """Writes the raw rows, counters and summary as one JSON document"""
+        with open(path, 'w') as f:
+            json.dump({**self.to_dict(), 'summary': self.summary()}, f, indent=2)
+
+    def report(self):
+        """One printed line per agent and phase"""
+        for agent, phases in self.summary().items():
+            counters = phases['counters']
+            print(f"{agent}: {counters.get('attempts', 0)} attempts, "
+                  f"{counters.get('first_attempt_failures', 0)} first-attempt failures, "
+                  f"{counters.get('timeouts', 0)} timeouts, {counters.get('random_fallbacks', 0)} random, "
+                  f"{counters.get('forfeits', 0)} forfeits")
+            for phase in (PLACEMENT, MOVEMENT):
+                latency = phases.get(phase, {}).get('latency')
+                if latency:
+                    print(f"  {phase:>9}  p50 {1000 * latency['p50']:7.2f}ms  p95 {1000 * latency['p95']:7.2f}ms  "
+                          f"p99 {1000 * latency['p99']:7.2f}ms  max {1000 * latency['max']:7.2f}ms")
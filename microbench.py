@@ -0,0 +1,255 @@
+import argparse
+import hashlib
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import numpy as np
+from PushBattle import Game, PLAYER1, EMPTY, BOARD_SIZE, NUM_PIECES
+from random_agent import RandomAgent
+from smart_agent import SmartAgent
+
+'''
+Micro-benchmarks for the engine and agent hot paths.
+
+Every benchmark runs over a fixed corpus of positions from seeded random games, split into
+placement (turns 4-12), transition (turns 15-18) and movement (turns 20+) phases. Each one is
+timed `repeat` times and reported as ops/sec with its standard deviation across repeats.
+
+    python microbench.py --save microbench_baseline.json      # record a baseline
+    python microbench.py --compare microbench_baseline.json   # flag regressions
+    python microbench.py --filter engine.                     # run a subset
+
+Compare mode exits with status 1 when any benchmark is slower than the baseline by more than
+--threshold (a fraction, 0.10 by default) and by more than twice the combined run-to-run
+noise, so it can gate a change.
+'''
+
+CORPUS_SEED = 1234
+CORPUS_GAMES = 40
+PHASES = {'placement': range(4, 13), 'transition': range(15, 19), 'movement': range(20, 200)}
+
+def build_corpus(seed=CORPUS_SEED, num_games=CORPUS_GAMES):
+    """{phase: [Game]} positions from seeded random self-play, the same on every run"""
+    rng_state = random.getstate()
+    random.seed(seed)
+    corpus = {phase: [] for phase in PHASES}
+    for _ in range(num_games):
+        game = Game()
+        while game.turn_count < 60:
+            game.turn_count += 1
+            move = RandomAgent(player=game.current_player).get_best_move(game)
+            if len(move) == 2:
+                game.place_checker(*move)
+            else:
+                game.move_checker(*move)
+            if game.check_winner() != EMPTY:
+                break
+            game.current_player *= -1
+            for phase, turns in PHASES.items():
+                if game.turn_count in turns:
+                    corpus[phase].append(Game.from_dict(game.to_dict()))
+    random.setstate(rng_state)
+    return corpus
+
+def corpus_hash(corpus):
+    """Fingerprint of the corpus, stored with a baseline so comparisons use the same positions"""
+    digest = hashlib.sha256()
+    for phase in PHASES:
+        for game in corpus[phase]:
+            digest.update(json.dumps(game.to_dict()).encode())
+    return digest.hexdigest()[:16]
+
+def copy_game(game):
+    return Game.from_dict(game.to_dict())
+
+def legal_move(game):
+    """A deterministic legal move for the player to move"""
+    moves = RandomAgent(player=game.current_player).get_possible_moves(game)
+    return moves[len(moves) // 2]
+
+class Bench:
+    """
+    One benchmark: `setup()` returns the list of arguments for one timed pass (so mutating
+    operations get fresh copies outside the timed region) and `op(arg)` is the timed call.
+    """
+    def __init__(self, name, op, setup):
+        self.name = name
+        self.op = op
+        self.setup = setup
+
+    def run(self, repeat=5, min_time=0.2):
+        size = len(self.setup())
+        if not size:
+            return None
+        # calibrates the number of passes so one repeat takes about min_time
+        passes = 1
+        while True:
+            elapsed = self._time(passes)
+            if elapsed >= min_time or passes >= 1 << 20:
+                break
+            passes *= 2
+
+        rates = []
+        for _ in range(repeat):
+            elapsed = self._time(passes)
+            rates.append(size * passes / elapsed)
+        return {
+            'ops_per_sec': statistics.mean(rates),
+            'std': statistics.stdev(rates) if len(rates) > 1 else 0.0,
+            'min': min(rates),
+            'max': max(rates),
+            'ops': size * passes,
+            'repeat': repeat,
+        }
+
+    def _time(self, passes):
+        op = self.op
+        total = 0.0
+        for _ in range(passes):
+            # fresh arguments for every pass, made outside the timed loop
+            batch = self.setup()
+            start_time = time.perf_counter()
+            for arg in batch:
+                op(arg)
+            total += time.perf_counter() - start_time
+        return total
+
+def engine_benches(corpus):
+    benches = []
+    for phase, games in corpus.items():
+        placements = [g for g in games if (g.p1_pieces if g.current_player == PLAYER1 else g.p2_pieces) < NUM_PIECES]
+        movements = [g for g in games if (g.p1_pieces if g.current_player == PLAYER1 else g.p2_pieces) >= NUM_PIECES]
+        placement_moves = [(g, legal_move(g)) for g in placements]
+        movement_moves = [(g, legal_move(g)) for g in movements]
+
+        benches += [
+            Bench(f"engine.place_checker[{phase}]", lambda a: a[0].place_checker(*a[1]),
+                  lambda pm=placement_moves: [(copy_game(g), m) for g, m in pm]),
+            Bench(f"engine.move_checker[{phase}]", lambda a: a[0].move_checker(*a[1]),
+                  lambda mm=movement_moves: [(copy_game(g), m) for g, m in mm]),
+            Bench(f"engine.push_neighbors[{phase}]", lambda a: a[0].push_neighbors(a[1], a[2]),
+                  lambda gs=games: [(copy_game(g), i % BOARD_SIZE, (3 * i) % BOARD_SIZE) for i, g in enumerate(gs)]),
+            Bench(f"engine.check_winner[{phase}]", lambda g: g.check_winner(), lambda gs=games: gs),
+            Bench(f"engine.to_dict[{phase}]", lambda g: g.to_dict(), lambda gs=games: gs),
+            Bench(f"engine.from_dict[{phase}]", Game.from_dict, lambda gs=games: [g.to_dict() for g in gs]),
+        ]
+    return benches
+
+def agent_benches(corpus, include_dqn=True):
+    agents = {
+        'RandomAgent': RandomAgent(),
+        'SmartAgent': SmartAgent(),
+    }
+    dqn_agents = {}
+    if include_dqn:
+        try:
+            from DQN_agent import DQNAgent, DENSE, FACTORED
+            for layout in (DENSE, FACTORED):
+                agent = DQNAgent(layout=layout, memory_size=1, device='cpu')
+                agent.epsilon = 0.0
+                dqn_agents[f"DQNAgent[{layout}]"] = agent
+        except ImportError as e:
+            print(f"Skipping DQNAgent benchmarks: {str(e)}")
+
+    benches = []
+    for phase, games in corpus.items():
+        for name, agent in agents.items():
+            benches.append(Bench(f"agent.{name}.get_possible_moves[{phase}]", agent.get_possible_moves,
+                                 lambda gs=games: gs))
+        smart = agents['SmartAgent']
+        evaluations = [(g, legal_move(g)) for g in games]
+        benches.append(Bench(f"agent.SmartAgent.evaluate_move[{phase}]", lambda a, s=smart: s.evaluate_move(*a),
+                             lambda ev=evaluations: ev))
+        for name, agent in dqn_agents.items():
+            benches.append(Bench(f"agent.{name}.get_best_move[{phase}]", agent.get_best_move,
+                                 lambda gs=games: gs[:20]))
+    return benches
+
+def run_suite(name_filter=None, repeat=5, min_time=0.2, include_dqn=True):
+    corpus = build_corpus()
+    benches = engine_benches(corpus) + agent_benches(corpus, include_dqn)
+    if name_filter:
+        benches = [bench for bench in benches if name_filter in bench.name]
+
+    results = {}
+    for bench in benches:
+        result = bench.run(repeat=repeat, min_time=min_time)
+        if result is None:
+            continue
+        results[bench.name] = result
+        print(f"{bench.name:<55} {result['ops_per_sec']:>14,.0f} ops/s  +/- {100 * result['std'] / result['ops_per_sec']:4.1f}%")
+
+    versions = {'python': platform.python_version(), 'numpy': np.__version__}
+    try:
+        import torch
+        versions['torch'] = torch.__version__
+    except ImportError:
+        pass
+    return {
+        'meta': {
+            'time': time.time(),
+            'platform': platform.platform(),
+            'versions': versions,
+            'corpus_hash': corpus_hash(corpus),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+def compare(current, baseline, threshold=0.10):
+    """Prints the change of every benchmark against the baseline; returns the regressed names"""
+    if current['meta']['corpus_hash'] != baseline['meta']['corpus_hash']:
+        print("Warning: the position corpus differs from the baseline's")
+
+    regressions = []
+    print(f"\n{'benchmark':<55} {'baseline':>14} {'current':>14} {'change':>8}")
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['ops_per_sec']
+        after = result['ops_per_sec']
+        change = after / before - 1
+        # a change only counts when it is also larger than twice the combined run-to-run noise
+        noise = 2 * ((baseline['results'][name]['std'] / before) ** 2 + (result['std'] / after) ** 2) ** 0.5
+        flag = ""
+        if change < -max(threshold, noise):
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change > max(threshold, noise):
+            flag = "  faster"
+        elif abs(change) > threshold:
+            flag = "  (within noise)"
+        print(f"{name:<55} {before:>14,.0f} {after:>14,.0f} {100 * change:>+7.1f}%{flag}")
+
+    print(f"\n{len(regressions)} regression(s) beyond {100 * threshold:.0f}%")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for engine and agent hot paths")
+    parser.add_argument('--save', help="write the results to this JSON baseline")
+    parser.add_argument('--compare', help="compare against this JSON baseline")
+    parser.add_argument('--threshold', type=float, default=0.10, help="slowdown fraction that counts as a regression")
+    parser.add_argument('--filter', help="only run benchmarks whose name contains this")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds per repeat")
+    parser.add_argument('--no-dqn', action='store_true', help="skip the DQNAgent benchmarks")
+    args = parser.parse_args()
+
+    results = run_suite(args.filter, args.repeat, args.min_time, include_dqn=not args.no_dqn)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,11 @@
+import gc
+import time
 from flask import Flask, request, jsonify
+from werkzeug.serving import WSGIRequestHandler, is_running_from_reloader
 from PushBattle import Game, PLAYER1, PLAYER2, EMPTY, BOARD_SIZE, NUM_PIECES, _torus
+from protocol import PROTOCOL_DELTA, DeltaGame, negotiate
+from stream_transport import start_stream_server
+from agent_warmup import warm_up
 
 # This simulates player 2 always playing random moves - you may modify to test locally
 
@@ -9,10 +15,28 @@ from smart_agent import SmartAgent
 from minimax_agent import MinimaxAgent
 app = Flask(__name__)
 
-agent = None
+# Persistent socket the judge can use instead of HTTP ("tcp://0.0.0.0:6009", "unix:///tmp/player.sock" or None)
+STREAM_ADDRESS = "tcp://0.0.0.0:6009"
 
-@app.route('/start', methods=['POST'])
-def start_game():
+agent = None                # built and warmed up once, when the server starts
+delta_game = DeltaGame()    # this server's copy of the game, kept in step with the judge
+
+def load_agent():
+    """
+    Builds the agent when the server starts, before the judge connects.
+    Load models, opening books and anything else expensive here, not in start_game:
+    the server then warms the agent up with a few dummy moves so the first move of a
+    game is as fast as the rest.
+    """
+
+    ##### MODIFY BELOW #####
+
+    # e.g. agent = DQNAgent(player=PLAYER2); agent.load("dqn_model.pth"); return agent
+    return MinimaxAgent(player=PLAYER2)
+
+    ###################
+
+def start_game(data):
     """
     This function is sent before the game begins.
     Used to potentially configure your agent based on latency constraints or if you have the first turn
@@ -25,26 +49,30 @@ def start_game():
     """
 
     ##### DO NOT MODIFY #####
-    global agent
-    data = request.get_json()
+    if agent is None:
+        boot()
+    # collect garbage between games rather than during a move
+    gc.collect()
     game_data = data.get('game')
-    game = Game.from_dict(game_data)
+    game = delta_game.reset(game_data)
     board = data.get('board')
     first_turn = data.get('first_turn')
     max_latency = data.get('max_latency')
 
     ##### MODIFY BELOW #####
 
-    agent = MinimaxAgent(player=PLAYER2)
+    # The agent is already loaded; only reset what belongs to a single game here
+    if hasattr(agent, 'reset'):
+        agent.reset()
 
     ###################
     
-    return jsonify({
-        "message": "Game started successfully"
-    })
+    return {
+        "message": "Game started successfully",
+        "protocol": negotiate(data.get('protocols'))
+    }
 
-@app.route('/move', methods=['POST'])
-def make_move():
+def make_move(data):
     """
     This is the primary function that is being sent during the game to make your move.
     I recommend using some kind of function in your class to evaluate what your agent thinks is the best move
@@ -67,10 +95,15 @@ def make_move():
     r1 - row value of the piece to place
     c1 - column value of the piece to place
     """
-    data = request.get_json()
-    game_data = data.get('game')
-    game = Game.from_dict(game_data)
-    board = data.get('board')
+    if data.get('protocol') == PROTOCOL_DELTA:
+        # compact request: replay the new moves on our own game
+        game = delta_game.sync(data)
+        if game is None:
+            return {"resync": True}
+    else:
+        # full request: load the state into the same persistent game
+        game = delta_game.reset(data.get('game'))
+    board = game.board.tolist()
     turn_count = data.get('turn_count')
     attempt_number = data.get('attempt_number')
     
@@ -83,31 +116,70 @@ def make_move():
 
     ###################
     
-    return jsonify({
+    return {
         "move": move  # Return your chosen move
-    })
+    }
 
 # ====================================
 # DO NOT MODIFY BELOW THIS LINE
 # ====================================
 
-@app.route('/', methods=['GET'])
-def hello():
+def boot():
+    """Builds and warms up the agent once per server process"""
+    global agent
+    agent = load_agent()
+    warm_up(agent)
+
+def hello(data=None):
     """Connects to the judge"""
-    return jsonify({
+    return {
         "message": "Successfully Connected",
-    })
+        "stream": STREAM_ADDRESS,
+    }
 
-@app.route('/end', methods=['POST'])
-def end_game():
+def timed_move(data):
+    """Reports the agent's own compute time so the judge can separate it from transport time"""
+    start_time = time.perf_counter()
+    reply = make_move(data)
+    reply["compute_time"] = time.perf_counter() - start_time
+    return reply
+
+def end_game(data):
     """Handle game end notification"""
-    data = request.get_json()
     # Extract end game data
     print(data)
     
-    return jsonify({
+    return {
         "message": "Game ended successfully"
-    })
+    }
+
+# The same handlers serve HTTP routes and the stream transport
+HANDLERS = {"hello": hello, "start": start_game, "move": timed_move, "end": end_game}
+
+@app.route('/', methods=['GET'])
+def hello_route():
+    return jsonify(hello())
+
+@app.route('/start', methods=['POST'])
+def start_route():
+    return jsonify(start_game(request.get_json()))
+
+@app.route('/move', methods=['POST'])
+def move_route():
+    return jsonify(timed_move(request.get_json()))
+
+@app.route('/end', methods=['POST'])
+def end_route():
+    return jsonify(end_game(request.get_json()))
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5009, debug=True)
\ No newline at end of file
+    debug = True
+    # HTTP/1.1 keeps the judge's connection open between requests
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    # the debug reloader runs this block in two processes; only the serving one loads the agent
+    # and opens the stream
+    if not debug or is_running_from_reloader():
+        boot()
+        if STREAM_ADDRESS:
+            start_stream_server(STREAM_ADDRESS, HANDLERS)
+    app.run(host='0.0.0.0', port=5009, debug=debug)
\ No newline at end of file
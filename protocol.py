@@ -0,0 +1,93 @@
+from PushBattle import Game, PLAYER1, PLAYER2
+
+'''
+Negotiated judge <-> agent move protocols.
+
+"full"  - every /move carries the whole game (game.to_dict() plus the board list).
+"delta" - every /move carries only the moves played since the agent's previous request and a
+          state hash. The agent replays them on its own persistent Game and compares hashes;
+          on a mismatch it answers {"resync": true} and the judge resends the full state for
+          the same attempt.
+
+The judge offers {"protocols": SUPPORTED_PROTOCOLS} in /start and the agent answers with the
+one it picked in the "protocol" field of its reply. Agents that ignore the field get "full".
+'''
+
+PROTOCOL_FULL = "full"
+PROTOCOL_DELTA = "delta"
+SUPPORTED_PROTOCOLS = [PROTOCOL_DELTA, PROTOCOL_FULL]
+
+def negotiate(offered):
+    """Agent side: picks the protocol to use from the judge's offer"""
+    return PROTOCOL_DELTA if PROTOCOL_DELTA in (offered or []) else PROTOCOL_FULL
+
+def wire_move(move):
+    """Agent side: a move as JSON integers, or None (a null move, which the judge forfeits) if it is not one"""
+    try:
+        return [int(x) for x in move]
+    except (TypeError, ValueError):
+        return None
+
+def accepted_protocol(reply):
+    """Judge side: reads the agent's choice from its /start reply"""
+    if isinstance(reply, dict) and reply.get("protocol") == PROTOCOL_DELTA:
+        return PROTOCOL_DELTA
+    return PROTOCOL_FULL
+
+class DeltaTracker:
+    """Judge side: the moves of one game and how much of them each player has seen"""
+    def __init__(self):
+        self.history = []
+        self.seen = {PLAYER1: 0, PLAYER2: 0}
+        self.protocols = {PLAYER1: PROTOCOL_FULL, PLAYER2: PROTOCOL_FULL}
+
+    def record(self, move):
+        """Adds a move that was played on the judge's game"""
+        self.history.append([int(x) for x in move])
+
+    def uses_delta(self, player):
+        return self.protocols[player] == PROTOCOL_DELTA
+
+    def move_request(self, game):
+        """Compact /move payload for the player to move"""
+        return {
+            "protocol": PROTOCOL_DELTA,
+            "moves": self.history[self.seen[game.current_player]:],
+            "state_hash": game.state_hash(),
+            "turn_count": game.turn_count,
+        }
+
+    def mark_seen(self, player):
+        """Call once the player has received the current state (by delta or in full)"""
+        self.seen[player] = len(self.history)
+
+class DeltaGame:
+    """
+    Agent side: a persistent Game kept in step with the judge. The Game object is never
+    replaced, so an agent can keep a reference to it across moves and games.
+    """
+    def __init__(self, game=None):
+        self.game = game or Game()
+
+    def reset(self, game_data=None):
+        """Loads the judge's full state (a new game when None) into the local game in place"""
+        game = self.game
+        if game_data is None:
+            game.board[:] = 0
+            game.current_player, game.turn_count, game.p1_pieces, game.p2_pieces = PLAYER1, 0, 0, 0
+        else:
+            game.board[:] = game_data["board"]
+            game.current_player = game_data["current_player"]
+            game.turn_count = game_data["turn_count"]
+            game.p1_pieces = game_data["p1_pieces"]
+            game.p2_pieces = game_data["p2_pieces"]
+        return game
+
+    def sync(self, data):
+        """Applies a delta request; returns the updated game, or None if a resync is needed"""
+        for move in data.get("moves", []):
+            self.game.play_move(move)
+        self.game.turn_count = data["turn_count"]
+        if self.game.state_hash() != data["state_hash"]:
+            return None
+        return self.game
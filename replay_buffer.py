@@ -0,0 +1,240 @@
+import multiprocessing as mp
+import numpy as np
+from multiprocessing import shared_memory
+from PushBattle import BOARD_SIZE
+
+class SumTree:
+    """
+    Array-backed binary sum tree over `capacity` leaf priorities.
+    Node i has children 2i and 2i+1, the root is node 1 and leaves start at `size`.
+    """
+    def __init__(self, capacity):
+        self.size = 1
+        while self.size < capacity:
+            self.size *= 2
+        self.tree = np.zeros(2 * self.size, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    def update(self, indices, priorities):
+        """Sets leaf priorities and recomputes their ancestors level by level"""
+        nodes = np.asarray(indices, dtype=np.int64) + self.size
+        self.tree[nodes] = priorities
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values):
+        """Returns the leaf index holding each prefix-sum value (vectorized over a batch)"""
+        nodes = np.ones(len(values), dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+        while nodes[0] < self.size:
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = values > left_sum
+            values -= np.where(go_right, left_sum, 0.0)
+            nodes = np.where(go_right, left + 1, left)
+        return nodes - self.size
+
+class ReplayBuffer:
+    """
+    Ring-buffer replay memory built on preallocated NumPy columns.
+
+    Boards are stored as int8 arrays from the agent's point of view (1 own, -1 opponent,
+    0 empty), so one transition costs about 140 bytes and millions fit in RAM. Batches are
+    gathered by index with no per-sample Python objects. With `prioritized=True` sampling
+    is proportional to priority**alpha via a sum tree and importance weights are returned.
+    """
+    def __init__(self, capacity=10000, prioritized=False, alpha=0.6, beta=0.4, eps=1e-3):
+        self.capacity = capacity
+        self.states = np.zeros((capacity, BOARD_SIZE, BOARD_SIZE), dtype=np.int8)
+        self.next_states = np.zeros((capacity, BOARD_SIZE, BOARD_SIZE), dtype=np.int8)
+        self.actions = np.zeros(capacity, dtype=np.int16)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.bool_)
+        self.pos = 0
+        self.count = 0
+
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+        self.tree = SumTree(capacity) if prioritized else None
+        self.max_priority = 1.0
+
+    def __len__(self):
+        return self.count
+
+    def push(self, state, action, reward, next_state, done):
+        """Stores a single transition"""
+        self.push_batch(np.asarray(state)[None], [action], [reward], np.asarray(next_state)[None], [done])
+
+    def push_batch(self, states, actions, rewards, next_states, dones):
+        """Stores a batch of transitions, overwriting the oldest entries when full"""
+        n = len(actions)
+        if n == 0:
+            return
+        idx = (self.pos + np.arange(n)) % self.capacity
+        self.states[idx] = states
+        self.next_states[idx] = next_states
+        self.actions[idx] = actions
+        self.rewards[idx] = rewards
+        self.dones[idx] = dones
+
+        if self.prioritized:
+            # new transitions get the current max priority so they are seen at least once
+            self.tree.update(idx, np.full(n, self.max_priority))
+
+        self.pos = (self.pos + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def sample(self, batch_size):
+        """
+        Samples a batch of transitions.
+        Returns (indices, states, actions, rewards, next_states, dones, weights).
+        """
+        if self.prioritized:
+            total = self.tree.total()
+            segment = total / batch_size
+            values = (np.arange(batch_size) + np.random.random(batch_size)) * segment
+            indices = np.minimum(self.tree.find(values), self.count - 1)
+            probs = self.tree.tree[indices + self.tree.size] / total
+            weights = (self.count * probs) ** -self.beta
+            weights = (weights / weights.max()).astype(np.float32)
+        else:
+            indices = np.random.randint(0, self.count, size=batch_size)
+            weights = np.ones(batch_size, dtype=np.float32)
+
+        return (indices, self.states[indices], self.actions[indices], self.rewards[indices],
+                self.next_states[indices], self.dones[indices], weights)
+
+    def state_dict(self):
+        """Copies the filled part of the buffer (plus priorities) for checkpointing"""
+        count = self.count
+        state = {
+            'capacity': self.capacity,
+            'pos': self.pos,
+            'count': count,
+            'states': self.states[:count].copy(),
+            'next_states': self.next_states[:count].copy(),
+            'actions': self.actions[:count].copy(),
+            'rewards': self.rewards[:count].copy(),
+            'dones': self.dones[:count].copy(),
+        }
+        if self.prioritized:
+            state['priorities'] = self.tree.tree[self.tree.size:self.tree.size + count].copy()
+            state['max_priority'] = self.max_priority
+        return state
+
+    def load_state_dict(self, state):
+        """Restores a buffer saved by state_dict(); entries beyond the current capacity are dropped"""
+        count = min(state['count'], self.capacity)
+        self.states[:count] = state['states'][:count]
+        self.next_states[:count] = state['next_states'][:count]
+        self.actions[:count] = state['actions'][:count]
+        self.rewards[:count] = state['rewards'][:count]
+        self.dones[:count] = state['dones'][:count]
+        self.count = count
+        self.pos = state['pos'] % self.capacity if count == self.capacity else count
+        if self.prioritized and count:
+            priorities = state.get('priorities', np.ones(count))[:count]
+            self.tree.update(np.arange(count), priorities)
+            self.max_priority = state.get('max_priority', 1.0)
+
+    def update_priorities(self, indices, td_errors):
+        """Updates sampling priorities from the absolute TD errors of a trained batch"""
+        if self.prioritized:
+            priorities = (np.abs(td_errors) + self.eps) ** self.alpha
+            self.tree.update(indices, priorities)
+            self.max_priority = max(self.max_priority, float(priorities.max()))
+
+class SharedReplayBuffer(ReplayBuffer):
+    """
+    Uniform ReplayBuffer whose columns live in a multiprocessing shared memory block.
+
+    The buffer can be passed to child processes (fork or spawn): they re-attach to the same
+    block by name, so actors can push while a learner samples. Writes and reads are guarded
+    by a process-shared lock; both only copy a few array slices so contention is low.
+    Pass the multiprocessing context used to start the workers as `ctx`.
+    Call unlink() from the creating process once all users are done.
+    """
+    def __init__(self, capacity=10000, ctx=None):
+        self.capacity = capacity
+        self.lock = (ctx or mp).Lock()
+        self._shm = shared_memory.SharedMemory(create=True, size=self._layout_size(capacity))
+        self._attach()
+
+        self.prioritized = False
+        self.tree = None
+        self.pos = 0
+        self.count = 0
+
+    @staticmethod
+    def _layout_size(capacity):
+        board_bytes = capacity * BOARD_SIZE * BOARD_SIZE
+        # states, next_states, actions (int16), rewards (float32), dones, pos/count header
+        return 2 * board_bytes + capacity * (2 + 4 + 1) + 16
+
+    def _attach(self):
+        """Creates the NumPy column views over the shared block"""
+        buf = self._shm.buf
+        board_shape = (self.capacity, BOARD_SIZE, BOARD_SIZE)
+        board_bytes = self.capacity * BOARD_SIZE * BOARD_SIZE
+        offset = 0
+        self._header = np.ndarray(2, dtype=np.int64, buffer=buf, offset=offset)
+        offset += 16
+        self.states = np.ndarray(board_shape, dtype=np.int8, buffer=buf, offset=offset)
+        offset += board_bytes
+        self.next_states = np.ndarray(board_shape, dtype=np.int8, buffer=buf, offset=offset)
+        offset += board_bytes
+        self.rewards = np.ndarray(self.capacity, dtype=np.float32, buffer=buf, offset=offset)
+        offset += 4 * self.capacity
+        self.actions = np.ndarray(self.capacity, dtype=np.int16, buffer=buf, offset=offset)
+        offset += 2 * self.capacity
+        self.dones = np.ndarray(self.capacity, dtype=np.bool_, buffer=buf, offset=offset)
+
+    @property
+    def pos(self):
+        return int(self._header[0])
+
+    @pos.setter
+    def pos(self, value):
+        self._header[0] = value
+
+    @property
+    def count(self):
+        return int(self._header[1])
+
+    @count.setter
+    def count(self, value):
+        self._header[1] = value
+
+    def __getstate__(self):
+        return {'capacity': self.capacity, 'lock': self.lock, 'name': self._shm.name}
+
+    def __setstate__(self, state):
+        self.capacity = state['capacity']
+        self.lock = state['lock']
+        self._shm = shared_memory.SharedMemory(name=state['name'])
+        self._attach()
+        self.prioritized = False
+        self.tree = None
+
+    def push_batch(self, states, actions, rewards, next_states, dones):
+        with self.lock:
+            super().push_batch(states, actions, rewards, next_states, dones)
+
+    def sample(self, batch_size):
+        with self.lock:
+            return super().sample(batch_size)
+
+    def close(self):
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.close()
+        self._shm.unlink()
@@ -0,0 +1,402 @@
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import sqlite3
+import time
+from collections import defaultdict
+
+'''
+SQLite store of benchmark results: every run, game and move, queryable over time.
+
+    runs           one benchmark run: agent pair, parameters, code version, start/finish times
+    games          (run_id, game_num): agents, winner, length, forfeit, when it finished
+    moves          (run_id, game_num, turn): player, agent, phase, move type and time
+    agents         agent names
+    code_versions  hashes of the engine, benchmark and agent sources a run used
+
+GameAnalyzer writes rows through a RunWriter, which buffers them and inserts them in one
+transaction every FLUSH_GAMES games; worker processes of a parallel run each use their own
+writer on the same database (WAL mode lets them take turns without blocking readers).
+The query methods aggregate in SQL, so dashboards read a few rows however many games are stored,
+and export_stats() returns the same structure as GameAnalyzer.export_stats() for any set of runs.
+'''
+
+DB_PATH = 'benchmark_results.db'
+FLUSH_GAMES = 100
+SLOW_MOVE = 0.9  # seconds; moves this slow count as timeouts, as in GameAnalyzer
+RANDOM_MOVES = 5
+# sources every benchmark depends on, besides the agents' own modules; relative to this file
+CODE_FILES = ['PushBattle.py', 'benchmark.py', 'stream_stats.py']
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS agents (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS code_versions (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE,
+    first_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    agent1_id INTEGER NOT NULL REFERENCES agents(id),
+    agent2_id INTEGER NOT NULL REFERENCES agents(id),
+    code_version_id INTEGER REFERENCES code_versions(id),
+    num_games INTEGER NOT NULL,
+    seed INTEGER,
+    workers INTEGER,
+    started REAL NOT NULL,
+    finished REAL,
+    params TEXT
+);
+CREATE TABLE IF NOT EXISTS games (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    game_num INTEGER NOT NULL,
+    p1_agent_id INTEGER NOT NULL REFERENCES agents(id),
+    p2_agent_id INTEGER NOT NULL REFERENCES agents(id),
+    winner INTEGER NOT NULL,
+    num_moves INTEGER NOT NULL,
+    forfeit INTEGER NOT NULL DEFAULT 0,
+    played REAL NOT NULL,
+    PRIMARY KEY (run_id, game_num)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS moves (
+    run_id INTEGER NOT NULL,
+    game_num INTEGER NOT NULL,
+    turn INTEGER NOT NULL,
+    player INTEGER NOT NULL,
+    agent_id INTEGER NOT NULL REFERENCES agents(id),
+    phase TEXT NOT NULL,
+    type TEXT NOT NULL,
+    time REAL NOT NULL,
+    PRIMARY KEY (run_id, game_num, turn)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS runs_matchup ON runs (agent1_id, agent2_id, started);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+CREATE INDEX IF NOT EXISTS games_matchup ON games (p1_agent_id, p2_agent_id, played);
+CREATE INDEX IF NOT EXISTS games_played ON games (played);
+CREATE INDEX IF NOT EXISTS moves_agent_phase ON moves (agent_id, phase);
+'''
+
+UNKNOWN_VERSION = 'unknown'
+
+def module_path(spec):
+    """Source file of the module of a "module:Class" agent spec, or None if it cannot be found"""
+    try:
+        module_spec = importlib.util.find_spec(spec.split(':')[0])
+    except (ImportError, ValueError):
+        # __main__ and notebook modules have no spec
+        return None
+    if module_spec is None or module_spec.origin is None or not os.path.isfile(module_spec.origin):
+        return None
+    return module_spec.origin
+
+def agent_source(agent):
+    """Source of an agent (instance or spec): its module file, else its class's own source; None if unknown"""
+    path = module_path(agent_spec(agent))
+    if path is not None:
+        with open(path, 'rb') as f:
+            return f.read()
+    if not isinstance(agent, str):
+        try:
+            return inspect.getsource(type(agent)).encode()
+        except (OSError, TypeError):
+            pass
+    return None
+
+def code_version(*agents):
+    """
+    Short hash of the sources a benchmark between these agents (instances or "module:Class"
+    specs) runs, or UNKNOWN_VERSION when an agent's source cannot be found
+    """
+    digest = hashlib.sha256()
+    for name in CODE_FILES:
+        # a missing source would silently drop out of the hash and keep stale cached results valid
+        with open(os.path.join(CODE_DIR, name), 'rb') as f:
+            digest.update(f.read())
+    for agent in agents:
+        source = agent_source(agent)
+        if source is None:
+            return UNKNOWN_VERSION
+        digest.update(source)
+    return digest.hexdigest()[:12]
+
+def agent_spec(agent):
+    """"module:Class" of an agent instance, or the spec itself"""
+    if isinstance(agent, str):
+        return agent
+    return f"{type(agent).__module__}:{type(agent).__name__}"
+
+def connect(path=DB_PATH):
+    conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+def _filters(run_ids=None, since=None, agent=None, alias='g'):
+    """WHERE clause and parameters selecting games by run, finish time and agent"""
+    clauses, params = [], []
+    if run_ids is not None:
+        clauses.append(f"{alias}.run_id IN ({', '.join('?' * len(run_ids))})")
+        params += list(run_ids)
+    if since is not None:
+        clauses.append(f"{alias}.played >= ?")
+        params.append(since)
+    if agent is not None:
+        clauses.append("(p1.name = ? OR p2.name = ?)")
+        params += [agent, agent]
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+# agent1's colour in a game: runs that alternate colours (SPRT) seat agent1 as player 2 in half of them
+AGENT1_COLOUR = "CASE WHEN g.p1_agent_id = r.agent1_id THEN 1 ELSE -1 END"
+RUN_COUNTS = f''', COUNT(g.game_num) AS games, COALESCE(SUM(g.winner = {AGENT1_COLOUR}), 0) AS wins,
+    COALESCE(SUM(g.winner = 0), 0) AS draws, COALESCE(SUM(g.winner = -{AGENT1_COLOUR}), 0) AS losses'''
+PHASE_ORDER = "CASE m.phase WHEN 'opening' THEN 0 WHEN 'midgame' THEN 1 ELSE 2 END"
+GAMES_FROM = '''FROM games g JOIN agents p1 ON p1.id = g.p1_agent_id JOIN agents p2 ON p2.id = g.p2_agent_id'''
+
+MATCHUP_SUMS = ('wins', 'losses', 'draws', 'games')
+MOVE_SUMS = ('count', 'valid', 'random', 'error', 'invalid', 'timeouts', 'time', 'time_sq')
+PHASES = ('opening', 'midgame', 'endgame')
+
+def merge_aggregates(total, other):
+    """Adds the aggregates() of other games (another run, say) into total"""
+    for matchup, counts in other['games'].items():
+        target = total['games'].setdefault(matchup, dict.fromkeys(MATCHUP_SUMS, 0))
+        for key in MATCHUP_SUMS:
+            target[key] += counts[key]
+    for length, games in other['lengths'].items():
+        total['lengths'][length] += games
+    for key, sums in other['moves'].items():
+        target = total['moves'].get(key)
+        if target is None:
+            total['moves'][key] = dict(sums)
+            continue
+        for name in MOVE_SUMS:
+            target[name] += sums[name]
+        target['min'] = min(target['min'], sums['min'])
+        target['max'] = max(target['max'], sums['max'])
+    return total
+
+def empty_aggregates():
+    return {'games': {}, 'lengths': defaultdict(int), 'moves': {}}
+
+def stats_from_aggregates(aggregates):
+    """GameAnalyzer.export_stats() structure from aggregates()"""
+    phases = {phase: defaultdict(int) for phase in PHASES}
+    random_used = defaultdict(int)
+    for (agent, phase), sums in aggregates['moves'].items():
+        for key in ('valid', 'timeouts', 'invalid'):
+            phases[phase][key] += sums[key]
+        random_used[agent] += sums['random']
+    # random fallback allowance per agent and game; a self-play game counts twice
+    player_games = defaultdict(int)
+    for (p1, p2), counts in aggregates['games'].items():
+        player_games[p1] += counts['games']
+        player_games[p2] += counts['games']
+
+    def move_times(agent, phase, sums):
+        mean = sums['time'] / sums['count']
+        return {'agent': agent, 'phase': phase, 'count': sums['count'], 'mean': mean,
+                'std': max(sums['time_sq'] / sums['count'] - mean ** 2, 0.0) ** 0.5, 'min': sums['min'],
+                'max': sums['max'], 'types': {t: sums[t] for t in ('valid', 'random', 'error', 'invalid') if sums[t]}}
+
+    return {
+        'totalGames': sum(counts['games'] for counts in aggregates['games'].values()),
+        'matchupStats': [{'name': f"{p1} vs {p2}", 'wins': counts['wins'], 'losses': counts['losses'],
+                          'draws': counts['draws']}
+                         for (p1, p2), counts in sorted(aggregates['games'].items())],
+        'moveStats': [{'name': phase.capitalize(), 'validMoves': counts['valid'], 'timeouts': counts['timeouts'],
+                       'invalid': counts['invalid']}
+                      for phase, counts in phases.items() if counts],
+        'randomMovesUsed': [{'name': agent, 'used': random_used[agent],
+                             'remaining': RANDOM_MOVES * player_games[agent] - random_used[agent]}
+                            for agent in sorted(random_used)],
+        'gameLength': [{'length': f"{length}-{length + 4}", 'games': games}
+                       for length, games in sorted(aggregates['lengths'].items())],
+        'moveTimes': [move_times(agent, phase, sums)
+                      for (agent, phase), sums in sorted(aggregates['moves'].items(),
+                                                         key=lambda item: (PHASES.index(item[0][1]), item[0][0]))],
+    }
+
+class ResultsDB:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.conn = connect(path)
+        self._agent_ids = {}
+
+    def close(self):
+        self.conn.close()
+
+    def agent_id(self, name):
+        if name not in self._agent_ids:
+            with self.conn:
+                self.conn.execute("INSERT OR IGNORE INTO agents (name) VALUES (?)", (name,))
+            self._agent_ids[name] = self.conn.execute("SELECT id FROM agents WHERE name = ?", (name,)).fetchone()[0]
+        return self._agent_ids[name]
+
+    def start_run(self, agent1, agent2, num_games, seed=None, workers=1, version=None, params=None):
+        """Creates a run row and returns its id; agent1/agent2 are agent names"""
+        agent1_id, agent2_id = self.agent_id(agent1), self.agent_id(agent2)
+        with self.conn:
+            version_id = None
+            if version is not None:
+                self.conn.execute("INSERT OR IGNORE INTO code_versions (hash, first_seen) VALUES (?, ?)",
+                                  (version, time.time()))
+                version_id = self.conn.execute("SELECT id FROM code_versions WHERE hash = ?", (version,)).fetchone()[0]
+            cursor = self.conn.execute(
+                "INSERT INTO runs (agent1_id, agent2_id, code_version_id, num_games, seed, workers, started, params) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (agent1_id, agent2_id, version_id, num_games, seed, workers, time.time(),
+                 json.dumps(params) if params is not None else None))
+        return cursor.lastrowid
+
+    def finish_run(self, run_id, params=None):
+        with self.conn:
+            if params is not None:
+                self.conn.execute("UPDATE runs SET params = ? WHERE id = ?", (json.dumps(params), run_id))
+            self.conn.execute("UPDATE runs SET finished = ? WHERE id = ?", (time.time(), run_id))
+
+    def insert(self, games, moves):
+        """Bulk insert of game and move rows in one transaction"""
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?)", games)
+            self.conn.executemany("INSERT OR REPLACE INTO moves VALUES (?, ?, ?, ?, ?, ?, ?, ?)", moves)
+
+    def delete_games(self, run_id, game_nums):
+        """Removes games (and their moves) of a run that should not count towards it"""
+        rows = [(run_id, game_num) for game_num in game_nums]
+        with self.conn:
+            self.conn.executemany("DELETE FROM moves WHERE run_id = ? AND game_num = ?", rows)
+            self.conn.executemany("DELETE FROM games WHERE run_id = ? AND game_num = ?", rows)
+
+    def delete_run(self, run_id):
+        """Removes a run with all its games and moves"""
+        with self.conn:
+            self.conn.execute("DELETE FROM moves WHERE run_id = ?", (run_id,))
+            self.conn.execute("DELETE FROM games WHERE run_id = ?", (run_id,))
+            self.conn.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+
+    def runs(self, agent=None, since=None, limit=None, counts=True):
+        """
+        Runs, newest first, each with its game count and results from agent1's side;
+        counts=False skips the game counts, which read the games table
+        """
+        where, params = [], []
+        if agent is not None:
+            where.append("(a1.name = ? OR a2.name = ?)")
+            params += [agent, agent]
+        if since is not None:
+            where.append("r.started >= ?")
+            params.append(since)
+        query = f'''
+            SELECT r.id, a1.name AS agent1, a2.name AS agent2, r.num_games, r.seed, r.workers, r.started,
+                   r.finished, c.hash AS code_version{RUN_COUNTS if counts else ""}
+            FROM runs r
+            JOIN agents a1 ON a1.id = r.agent1_id JOIN agents a2 ON a2.id = r.agent2_id
+            LEFT JOIN code_versions c ON c.id = r.code_version_id
+            {"LEFT JOIN games g ON g.run_id = r.id" if counts else ""}
+            {(" WHERE " + " AND ".join(where)) if where else ""}
+            GROUP BY r.id ORDER BY r.started DESC
+            {"LIMIT ?" if limit else ""}'''
+        return [dict(row) for row in self.conn.execute(query, params + ([limit] if limit else []))]
+
+    def move_stats(self, run_ids=None, since=None, agent=None, by_agent=False):
+        """
+        Per phase (and per moving agent with by_agent): move counts by type, slow moves and
+        move time summaries
+        """
+        where, params = _filters(run_ids, since, agent)
+        group = f"{PHASE_ORDER}, a.name" if by_agent else PHASE_ORDER
+        query = f'''
+            SELECT m.phase AS phase, {"a.name" if by_agent else "NULL"} AS agent, COUNT(*) AS moves,
+                   SUM(m.type = 'valid') AS valid, SUM(m.type = 'random') AS random,
+                   SUM(m.type = 'error') AS error, SUM(m.type = 'invalid') AS invalid,
+                   SUM(m.time > {SLOW_MOVE}) AS timeouts,
+                   AVG(m.time) AS mean, MIN(m.time) AS min, MAX(m.time) AS max, AVG(m.time * m.time) AS mean_sq
+            FROM moves m JOIN agents a ON a.id = m.agent_id
+            JOIN games g ON g.run_id = m.run_id AND g.game_num = m.game_num
+            JOIN agents p1 ON p1.id = g.p1_agent_id JOIN agents p2 ON p2.id = g.p2_agent_id
+            {where} GROUP BY {group} ORDER BY {group}'''
+        rows = []
+        for row in self.conn.execute(query, params):
+            row = dict(row)
+            row['std'] = max(row.pop('mean_sq') - row['mean'] ** 2, 0.0) ** 0.5
+            rows.append(row)
+        return rows
+
+    def aggregates(self, run_ids=None, since=None, agent=None):
+        """
+        Mergeable sums behind export_stats():
+        {'games': {(p1, p2): counts}, 'lengths': {num_moves: games}, 'moves': {(agent, phase): sums}}
+        """
+        where, params = _filters(run_ids, since, agent)
+        aggregates = empty_aggregates()
+        query = f'''
+            SELECT p1.name AS p1, p2.name AS p2, g.num_moves AS length, SUM(g.winner = 1) AS wins,
+                   SUM(g.winner = -1) AS losses, SUM(g.winner = 0) AS draws, COUNT(*) AS games
+            {GAMES_FROM}{where} GROUP BY g.p1_agent_id, g.p2_agent_id, g.num_moves'''
+        for row in self.conn.execute(query, params):
+            merge_aggregates(aggregates, {'games': {(row['p1'], row['p2']): {key: row[key] for key in MATCHUP_SUMS}},
+                                          'lengths': {row['length']: row['games']}, 'moves': {}})
+        query = f'''
+            SELECT a.name AS agent, m.phase AS phase, COUNT(*) AS count,
+                   SUM(m.type = 'valid') AS valid, SUM(m.type = 'random') AS random,
+                   SUM(m.type = 'error') AS error, SUM(m.type = 'invalid') AS invalid,
+                   SUM(m.time > {SLOW_MOVE}) AS timeouts, SUM(m.time) AS time, SUM(m.time * m.time) AS time_sq,
+                   MIN(m.time) AS min, MAX(m.time) AS max
+            FROM moves m JOIN agents a ON a.id = m.agent_id
+            JOIN games g ON g.run_id = m.run_id AND g.game_num = m.game_num
+            JOIN agents p1 ON p1.id = g.p1_agent_id JOIN agents p2 ON p2.id = g.p2_agent_id
+            {where} GROUP BY m.agent_id, m.phase'''
+        for row in self.conn.execute(query, params):
+            aggregates['moves'][(row['agent'], row['phase'])] = {key: row[key] for key in MOVE_SUMS + ('min', 'max')}
+        return aggregates
+
+    def export_stats(self, run_ids=None, since=None, agent=None):
+        """GameAnalyzer.export_stats() structure computed over the selected games"""
+        return stats_from_aggregates(self.aggregates(run_ids, since, agent))
+
+class RunWriter:
+    """Buffers the games and moves of one run and inserts them in bulk"""
+    def __init__(self, path, run_id, flush_games=FLUSH_GAMES):
+        self.db = ResultsDB(path)
+        self.run_id = run_id
+        self.flush_games = flush_games
+        self.games = []
+        self.moves = []
+
+    def add_move(self, game_num, turn, player, agent, phase, move_type, move_time):
+        self.moves.append((self.run_id, game_num, turn, player, self.db.agent_id(agent), phase, move_type, move_time))
+
+    def add_game(self, game_num, record):
+        self.games.append((self.run_id, game_num, self.db.agent_id(record['p1_agent']),
+                           self.db.agent_id(record['p2_agent']), int(record['winner']), record['num_moves'],
+                           int(record.get('forfeit', False)), time.time()))
+        if len(self.games) >= self.flush_games:
+            self.flush()
+
+    def flush(self):
+        if self.games or self.moves:
+            self.db.insert(self.games, self.moves)
+            self.games, self.moves = [], []
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+def main():
+    db = ResultsDB()
+    for run in db.runs(limit=20):
+        started = time.strftime('%Y-%m-%d %H:%M', time.localtime(run['started']))
+        print(f"run {run['id']:>4}  {started}  {run['agent1']} vs {run['agent2']}: {run['games']} games "
+              f"+{run['wins']} ={run['draws']} -{run['losses']}  code {run['code_version']}")
+    print(json.dumps(db.export_stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
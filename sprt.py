@@ -0,0 +1,100 @@
+import math
+
+'''
+Sequential probability ratio test for agent matchups.
+
+H0: the agent's Elo advantage is elo0, H1: it is elo1. After every game the log-likelihood
+ratio of the win/draw/loss record is compared with the bounds from alpha (false H1) and beta
+(false H0); the test stops as soon as one is crossed. The LLR uses the usual normal
+approximation of the generalized SPRT on the game score, so draws are handled through the
+score variance.
+'''
+
+def elo_to_score(elo):
+    """Expected score for an Elo difference"""
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def score_to_elo(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+class SPRT:
+    def __init__(self, elo0=0.0, elo1=20.0, alpha=0.05, beta=0.05):
+        if elo1 <= elo0:
+            raise ValueError("elo1 must be greater than elo0")
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.alpha = alpha
+        self.beta = beta
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def add(self, wins=0, draws=0, losses=0):
+        """Adds results from the tested agent's point of view"""
+        self.wins += wins
+        self.draws += draws
+        self.losses += losses
+
+    def _score_variance(self):
+        n = self.games
+        score = (self.wins + 0.5 * self.draws) / n
+        variance = (self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 + self.losses * score ** 2) / n
+        return score, variance
+
+    def llr(self):
+        """Log-likelihood ratio of H1 against H0; 0 until the record has some variance"""
+        if not self.games:
+            return 0.0
+        score, variance = self._score_variance()
+        if variance <= 0:
+            # all wins, draws or losses so far: assume the largest possible per-game variance
+            variance = 0.25
+        s0, s1 = elo_to_score(self.elo0), elo_to_score(self.elo1)
+        return self.games * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+
+    def status(self):
+        """'H1' (accept elo1), 'H0' (accept elo0) or None while undecided"""
+        llr = self.llr()
+        if llr >= self.upper:
+            return 'H1'
+        if llr <= self.lower:
+            return 'H0'
+        return None
+
+    def elo(self):
+        """Elo estimate with a 95% interval, as (elo, low, high)"""
+        if not self.games:
+            return 0.0, -math.inf, math.inf
+        score, variance = self._score_variance()
+        error = 1.96 * math.sqrt(variance / self.games)
+        return score_to_elo(score), score_to_elo(score - error), score_to_elo(score + error)
+
+    def summary(self):
+        elo, low, high = self.elo()
+        return {
+            'games': self.games,
+            'wins': self.wins,
+            'draws': self.draws,
+            'losses': self.losses,
+            'llr': self.llr(),
+            'bounds': [self.lower, self.upper],
+            'hypotheses': [self.elo0, self.elo1],
+            'result': self.status(),
+            'elo': elo,
+            'elo_95': [low, high],
+        }
+
+    def report(self):
+        s = self.summary()
+        result = {'H1': f"H1 accepted (Elo >= {self.elo1:g})", 'H0': f"H0 accepted (Elo <= {self.elo0:g})"}.get(
+            s['result'], "inconclusive")
+        print(f"SPRT [{self.elo0:g}, {self.elo1:g}]: {result} after {s['games']} games "
+              f"(+{s['wins']} ={s['draws']} -{s['losses']}), LLR {s['llr']:.2f} "
+              f"[{self.lower:.2f}, {self.upper:.2f}], Elo {s['elo']:.1f} [{s['elo_95'][0]:.1f}, {s['elo_95'][1]:.1f}]")
@@ -0,0 +1,198 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from flask import Flask, Response, jsonify, request
+from results_db import DB_PATH, ResultsDB, empty_aggregates, merge_aggregates, stats_from_aggregates
+
+'''
+HTTP server for the benchmark dashboard (static/visualizer.js, built by benchmark_visualizer.py).
+
+    GET /               page that loads the visualizer
+    GET /api/stats      export_stats() over every run in the results database;
+                        ?run=<id> (repeatable) and ?agent=<name> narrow it down
+    GET /api/runs       the runs, newest first
+
+Aggregates are kept per run and only the runs that changed since the last refresh are queried
+again: a finished run is read once, a run still being written is re-read when the database
+changes (PRAGMA data_version). Responses are serialized and gzipped once per data version and
+carry an ETag, so unchanged data costs a 304 and no work. Without a database the server falls
+back to benchmark_results.json.
+'''
+
+REFRESH_INTERVAL = 1.0   # seconds between checks of the database for new results
+MIN_GZIP_SIZE = 1024     # smaller bodies are sent uncompressed
+RESPONSE_CACHE_SIZE = 64
+STATIC_DIR = 'static'
+RESULTS_PATH = 'benchmark_results.json'
+
+INDEX_HTML = '''<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>Push Battle Performance Analysis</title>
+    <script src="https://unpkg.com/react@17/umd/react.production.min.js"></script>
+    <script src="https://unpkg.com/react-dom@17/umd/react-dom.production.min.js"></script>
+    <script src="https://unpkg.com/prop-types@15/prop-types.min.js"></script>
+    <script src="https://unpkg.com/recharts@2/umd/Recharts.js"></script>
+    <script src="https://cdn.tailwindcss.com"></script>
+</head>
+<body class="bg-gray-100">
+    <div id="root"></div>
+    <script src="/static/visualizer.js"></script>
+</body>
+</html>
+'''
+
+def run_counts(run, aggregates):
+    """
+    Game counts of a run from agent1's side, whichever colour it played: runs that alternate
+    colours (SPRT) hold games under both (agent1, agent2) and (agent2, agent1)
+    """
+    games = aggregates['games']
+    same = games.get((run['agent1'], run['agent2']), {})
+    swapped = games.get((run['agent2'], run['agent1']), {}) if run['agent1'] != run['agent2'] else {}
+    return {
+        'games': same.get('games', 0) + swapped.get('games', 0),
+        'wins': same.get('wins', 0) + swapped.get('losses', 0),
+        'draws': same.get('draws', 0) + swapped.get('draws', 0),
+        'losses': same.get('losses', 0) + swapped.get('wins', 0),
+    }
+
+class StatsCache:
+    """Per-run aggregates of the results database, refreshed incrementally"""
+    def __init__(self, path=DB_PATH, refresh_interval=REFRESH_INTERVAL):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.db = None
+        self.lock = threading.Lock()
+        self.data_version = None
+        self.version = 0            # bumped whenever any aggregate changes; part of every ETag
+        self.runs = []              # ResultsDB.runs() rows
+        self.run_aggregates = {}    # run id -> (finished, aggregates)
+        self.responses = {}         # (version, request key) -> (etag, body, gzipped body)
+        self._last_check = 0.0
+
+    def refresh(self, force=False):
+        """Re-reads the runs that changed since the last refresh; returns the current version"""
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self._last_check < self.refresh_interval:
+                return self.version
+            self._last_check = now
+            if self.db is None:
+                if not os.path.exists(self.path):
+                    return self.version
+                self.db = ResultsDB(self.path)
+
+            # changes whenever another connection commits to the database
+            data_version = self.db.conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self.data_version and not force:
+                return self.version
+            self.data_version = data_version
+
+            runs = self.db.runs(counts=False)
+            changed = False
+            for run in runs:
+                cached = self.run_aggregates.get(run['id'])
+                # a finished run never changes again; one still running is re-read
+                if cached is None or cached[0] is None or cached[0] != run['finished']:
+                    self.run_aggregates[run['id']] = (run['finished'], self.db.aggregates(run_ids=[run['id']]))
+                    changed = True
+                # game counts from the run's aggregates rather than a scan of the games table
+                run.update(run_counts(run, self.run_aggregates[run['id']][1]))
+            live = {run['id'] for run in runs}
+            for run_id in [run_id for run_id in self.run_aggregates if run_id not in live]:
+                del self.run_aggregates[run_id]
+                changed = True
+            if changed or runs != self.runs:
+                self.runs = runs
+                self.version += 1
+                self.responses.clear()
+            return self.version
+
+    def stats(self, run_ids=None, agent=None):
+        """export_stats() over the cached runs; runs have a fixed agent pair, so the agent filter picks runs"""
+        total = empty_aggregates()
+        for run in self.runs:
+            if run_ids is not None and run['id'] not in run_ids:
+                continue
+            if agent is not None and agent not in (run['agent1'], run['agent2']):
+                continue
+            merge_aggregates(total, self.run_aggregates[run['id']][1])
+        return stats_from_aggregates(total)
+
+    def response(self, key, build):
+        """(etag, body, gzipped body) of a request, built at most once per version"""
+        with self.lock:
+            return self._response(key, build)
+
+    def _response(self, key, build):
+        version = self.version
+        cached = self.responses.get((version, key))
+        if cached is None:
+            body = json.dumps(build(), separators=(',', ':')).encode()
+            etag = hashlib.sha1(body).hexdigest()[:20]
+            compressed = gzip.compress(body, compresslevel=6) if len(body) >= MIN_GZIP_SIZE else None
+            cached = (etag, body, compressed)
+            if len(self.responses) >= RESPONSE_CACHE_SIZE:
+                self.responses.pop(next(iter(self.responses)))
+            self.responses[(version, key)] = cached
+        return cached
+
+def json_response(etag, body, compressed):
+    """JSON with ETag revalidation and gzip when the client accepts it"""
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    if compressed is not None and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        headers['Content-Encoding'] = 'gzip'
+        body = compressed
+    return Response(body, mimetype='application/json', headers=headers)
+
+def file_stats():
+    """benchmark_results.json when there is no results database yet"""
+    if not os.path.exists(RESULTS_PATH):
+        return None
+    with open(RESULTS_PATH) as f:
+        return json.load(f)
+
+def create_app(db_path=DB_PATH):
+    app = Flask(__name__, static_folder=STATIC_DIR)
+    cache = StatsCache(db_path)
+
+    @app.route('/', methods=['GET'])
+    def index():
+        return Response(INDEX_HTML, mimetype='text/html')
+
+    @app.route('/api/stats', methods=['GET'])
+    def stats():
+        cache.refresh()
+        run_ids = request.args.getlist('run', type=int) or None
+        agent = request.args.get('agent')
+        if cache.db is None:
+            mtime = os.path.getmtime(RESULTS_PATH) if os.path.exists(RESULTS_PATH) else None
+            if mtime is None:
+                return jsonify({'error': 'No benchmark results'}), 404
+            return json_response(*cache.response(('file', mtime), file_stats))
+        key = ('stats', tuple(sorted(run_ids)) if run_ids else None, agent)
+        return json_response(*cache.response(key, lambda: cache.stats(set(run_ids) if run_ids else None, agent)))
+
+    @app.route('/api/runs', methods=['GET'])
+    def runs():
+        cache.refresh()
+        return json_response(*cache.response(('runs',), lambda: cache.runs))
+
+    app.stats_cache = cache
+    return app
+
+def main():
+    app = create_app()
+    app.stats_cache.refresh(force=True)
+    print(f"Serving {len(app.stats_cache.runs)} runs from {DB_PATH} on http://localhost:5050")
+    app.run(host='0.0.0.0', port=5050, threaded=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import json
+import math
+from collections import defaultdict
+
+'''
+Constant-memory statistics for benchmark runs.
+
+RunningStats keeps count, mean, variance (Welford), min and max. QuantileSketch is a
+log-bucketed histogram with a fixed relative error (the DDSketch construction), so quantiles of
+millions of move times fit in a few hundred counters. Both merge exactly, which is how worker
+processes combine their results. MoveStatsAggregator consumes move events one at a time and
+can also append every raw event to a JSONL file instead of keeping it.
+'''
+
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def merge(self, other):
+        """Chan et al. parallel combination of two running summaries"""
+        if not other.count:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def to_dict(self):
+        if not self.count:
+            return {'count': 0}
+        return {'count': self.count, 'mean': self.mean, 'std': math.sqrt(self.variance),
+                'min': self.min, 'max': self.max}
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative accuracy `accuracy` for positive values.
+    Values at or below `min_value` share one bucket.
+    """
+    def __init__(self, accuracy=0.01, min_value=1e-9):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.buckets = defaultdict(int)
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, x):
+        self.count += 1
+        if x <= self.min_value:
+            self.zero_count += 1
+        else:
+            self.buckets[math.ceil(math.log(x) / self.log_gamma)] += 1
+
+    def merge(self, other):
+        if other.accuracy != self.accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for index, n in other.buckets.items():
+            self.buckets[index] += n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """Value at quantile q (0..1), within the relative accuracy; None if empty"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+class MoveStatsAggregator:
+    """
+    Per agent and phase: move time summaries and quantiles plus counts of move types.
+    events_path - optional JSONL file that receives every raw move event
+    """
+    def __init__(self, events_path=None, quantiles=(0.5, 0.9, 0.99)):
+        self.quantiles = quantiles
+        self.times = defaultdict(RunningStats)
+        self.sketches = defaultdict(QuantileSketch)
+        self.types = defaultdict(lambda: defaultdict(int))
+        self.events_path = events_path
+        self._events_file = None
+
+    def add_move(self, agent, phase, move_time, move_type, **event):
+        key = (agent, phase)
+        self.times[key].add(move_time)
+        self.sketches[key].add(move_time)
+        self.types[key][move_type] += 1
+        if self.events_path:
+            if self._events_file is None:
+                self._events_file = open(self.events_path, 'a')
+            self._events_file.write(json.dumps({'agent': agent, 'phase': phase, 'time': move_time,
+                                                'type': move_type, **event}) + '\n')
+
+    def mean_time(self, agent):
+        """Average move time of an agent over all phases"""
+        total = RunningStats()
+        for (name, _), stats in self.times.items():
+            if name == agent:
+                total.merge(stats)
+        return total.mean
+
+    def merge(self, other):
+        for key, stats in other.times.items():
+            self.times[key].merge(stats)
+        for key, sketch in other.sketches.items():
+            self.sketches[key].merge(sketch)
+        for key, counts in other.types.items():
+            for move_type, n in counts.items():
+                self.types[key][move_type] += n
+        return self
+
+    def snapshot(self):
+        """Readable summary at any point of a run: [{agent, phase, time stats, quantiles, types}]"""
+        rows = []
+        for key in sorted(self.times, key=str):
+            agent, phase = key
+            rows.append({
+                'agent': agent,
+                'phase': phase,
+                **self.times[key].to_dict(),
+                **{f"p{round(100 * q)}": self.sketches[key].quantile(q) for q in self.quantiles},
+                'types': dict(self.types[key]),
+            })
+        return rows
+
+    def flush(self):
+        if self._events_file is not None:
+            self._events_file.flush()
+
+    def close(self):
+        if self._events_file is not None:
+            self._events_file.close()
+            self._events_file = None
+
+    def __getstate__(self):
+        # plain dicts so aggregators can be returned from worker processes
+        state = self.__dict__.copy()
+        state['types'] = {key: dict(counts) for key, counts in self.types.items()}
+        state['_events_file'] = None
+        return state
+
+    def __setstate__(self, state):
+        types = defaultdict(lambda: defaultdict(int))
+        for key, counts in state['types'].items():
+            types[key].update(counts)
+        state['types'] = types
+        self.__dict__.update(state)
@@ -0,0 +1,114 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+from urllib.parse import urlparse
+
+'''
+Persistent line-delimited JSON transport between the judge and a player server.
+
+Every message is one JSON object on one line with a "type" of "hello", "start", "move" or
+"end"; the rest of the object is the same payload the HTTP routes receive. Every request
+gets exactly one JSON line back. One connection stays open for the whole game, so a turn
+costs a single write and read on a socket instead of an HTTP request.
+
+Addresses are "tcp://host:port" or "unix:///path/to/socket". A player server advertises its
+address in the reply to GET /; an empty or 0.0.0.0 host means "the host of the HTTP URL".
+'''
+
+def parse_address(address):
+    """Returns (family, target) for a tcp:// or unix:// address"""
+    parsed = urlparse(address)
+    if parsed.scheme == "unix":
+        return socket.AF_UNIX, parsed.path
+    if parsed.scheme == "tcp":
+        return socket.AF_INET, (parsed.hostname or "", parsed.port)
+    raise ValueError(f"Unsupported stream address: {address}")
+
+def resolve_address(address, http_url):
+    """Fills in the host of an advertised tcp address from the player's HTTP URL"""
+    family, target = parse_address(address)
+    if family == socket.AF_INET and target[0] in ("", "0.0.0.0"):
+        return f"tcp://{urlparse(http_url).hostname}:{target[1]}"
+    return address
+
+class StreamResponse:
+    """Mirrors the parts of requests.Response the judge reads"""
+    status_code = 200
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+class StreamClient:
+    """Judge side: one persistent connection to a player server"""
+    def __init__(self, address, timeout):
+        family, target = parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.connect(target)
+        self.reader = self.sock.makefile("rb")
+
+    def request(self, message_type, data=None):
+        """Sends one message and waits for its reply; raises OSError or ValueError on failure"""
+        self.sock.sendall(json.dumps({"type": message_type, **(data or {})}).encode() + b"\n")
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("stream closed by player")
+        reply = json.loads(line)
+        if isinstance(reply, dict) and "error" in reply and len(reply) == 1:
+            raise ValueError(reply["error"])
+        return StreamResponse(reply)
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+class _StreamHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        if self.connection.family == socket.AF_INET:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        handlers = self.server.handlers
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+                handler = handlers[message.pop("type")]
+                reply = handler(message)
+            except Exception as e:
+                reply = {"error": str(e)}
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+            self.wfile.flush()
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def start_stream_server(address, handlers):
+    """
+    Serves `handlers` ({"start": fn, "move": fn, ...}, each taking and returning a dict) on
+    `address` from a background thread and returns the server.
+    """
+    family, target = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(target):
+            os.remove(target)
+        server = _UnixServer(target, _StreamHandler)
+    else:
+        server = _TCPServer(target, _StreamHandler)
+    server.handlers = handlers
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,59 @@
+import pytest
+from PushBattle import EMPTY, PLAYER1, PLAYER2
+from agent_server import AgentServer, create_app
+from judge_engine import Agent, Judge
+from protocol import PROTOCOL_DELTA
+
+'''
+Self-play through judge_engine.Judge with both sides hosted by one agent_server: Judge sends no
+game_id, so the server has to tell the two sides of its delta requests apart.
+'''
+
+class ReplyResponse:
+    """The parts of a requests.Response that Judge reads"""
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self._json = response.get_json()
+
+    def json(self):
+        return self._json
+
+@pytest.fixture(scope="module")
+def server():
+    server = AgentServer("random_agent:RandomAgent", workers=1)
+    server.boot()
+    yield server
+    server.close()
+
+def make_judge(client, strip_player=False):
+    """A Judge whose requests to both players go to the same test client"""
+    judge = Judge("http://p1", "http://p2")
+    judge.p1_agent, judge.p2_agent = Agent("Participant1", "Agent1"), Agent("Participant2", "Agent2")
+
+    def timed_request(player, message_type, data=None):
+        if strip_player and data is not None:
+            data = {key: value for key, value in data.items() if key != "player"}
+        path = {"start": "/start", "move": "/move", "end": "/end"}[message_type]
+        return ReplyResponse(client.post(path, json=data)), 0.0
+
+    judge._timed_request = timed_request
+    return judge
+
+@pytest.mark.parametrize("strip_player", [False, True])
+def test_judge_self_play_on_one_server(server, strip_player):
+    client = create_app(server).test_client()
+    judge = make_judge(client, strip_player)
+    assert judge.start_game()
+    assert judge.delta.protocols == {PLAYER1: PROTOCOL_DELTA, PLAYER2: PROTOCOL_DELTA}
+
+    winner = EMPTY
+    while winner == EMPTY and judge.game.turn_count < 40:
+        judge.game.turn_count += 1
+        assert judge.receive_move(1, 5, 5) is True
+        winner = judge.game.check_winner()
+        judge.game.current_player *= -1
+    judge.end_game(winner)
+    judge.close()
+
+    assert server.status()['errors'] == 0
+    assert server.status()['games'] == 0
@@ -0,0 +1,366 @@
+import csv
+import hashlib
+import json
+import math
+import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+from PushBattle import PLAYER1, PLAYER2
+from agent_adapters import make_adapter, referee_game
+from game_records import GameRecordWriter
+from judge_engine import TIMEOUT
+from judge_telemetry import MoveTelemetry
+
+'''
+Round-robin / Swiss tournaments between many agents with Elo and Bradley-Terry ratings.
+
+A roster entry is a dict:
+    {'name': 'smart', 'agent': 'smart_agent:SmartAgent'}                # in-process class
+    {'name': 'dqn', 'agent': 'DQN_agent:DQNAgent', 'checkpoint': 'dqn_model.pth'}
+    {'name': 'remote', 'agent': 'http://127.0.0.1:5008'}                # player server
+    {'name': 'hosted', 'agent': 'http://127.0.0.1:5010', 'multi_game': True}  # agent_server.py
+    {'name': 'piped', 'agent': 'pipe:python agent_adapters.py smart_agent:SmartAgent'}  # subprocess
+Optional 'kwargs' are passed to the class constructor.
+
+Games run on a process pool. A player server plays one game at a time, as the player templates
+keep one global game, so games against the same URL never overlap unless the entry is marked
+'multi_game' (game-scoped servers such as agent_server.py). A game that fails (a player that
+does not start, say) is logged to `<output>/errors.jsonl` and the tournament goes on; it is
+played again when the tournament resumes. Every finished game is appended to
+`<output>/results.jsonl`, which is also how an interrupted tournament resumes: games already in
+the file are skipped.
+The moves of every game are also archived in the binary record store `<output>/games`, and
+per-move timings go to `<output>/telemetry.jsonl` with their percentiles in telemetry.json.
+Elo ratings update incrementally as results arrive; Bradley-Terry ratings with 95% confidence
+intervals and a crosstable are written with every report.
+'''
+
+ELO_SCALE = 400 / math.log(10)
+
+def build_agent(entry, player):
+    """Creates the agent adapter described by a roster entry for the given colour"""
+    return make_adapter(entry['agent'], player, kwargs=entry.get('kwargs'), checkpoint=entry.get('checkpoint'),
+                        name=entry['name'])
+
+def play_game(p1_agent, p2_agent, max_turns=200, telemetry=None):
+    """
+    Referees one game between two agent adapters with the judge's rules (see agent_adapters).
+    Returns (winner, game_str, turns).
+    """
+    result = referee_game(p1_agent, p2_agent, max_turns=max_turns, telemetry=telemetry)
+    if 'error' in result:
+        raise RuntimeError(result['error'])
+    return result['winner'], result['game_str'], result['turns']
+
+def exclusive_endpoints(task):
+    """Player server URLs of a game that must not serve another game at the same time"""
+    return {entry['agent'] for entry in (task['white'], task['black'])
+            if entry['agent'].startswith(("http://", "https://")) and not entry.get('multi_game')}
+
+# agents built in this worker process, keyed by (name, colour)
+_worker_agents = {}
+
+def _run_game(task):
+    """Process pool entry point: plays one scheduled game and returns its result record"""
+    white, black = task['white'], task['black']
+    random.seed(task['seed'])
+    np.random.seed(task['seed'] % (2 ** 32))
+
+    players = []
+    for entry, player in ((white, PLAYER1), (black, PLAYER2)):
+        key = (entry['name'], player)
+        if key not in _worker_agents:
+            _worker_agents[key] = build_agent(entry, player)
+        players.append(_worker_agents[key])
+
+    telemetry = MoveTelemetry(TIMEOUT)
+    start_time = time.perf_counter()
+    try:
+        winner, game_str, turns = play_game(*players, telemetry=telemetry)
+    except Exception:
+        # the adapters may be left mid-game (a dead subprocess, say); build fresh ones next time
+        for entry, player in ((white, PLAYER1), (black, PLAYER2)):
+            adapter = _worker_agents.pop((entry['name'], player), None)
+            if adapter is not None:
+                adapter.close()
+        raise
+    return {
+        'key': task['key'],
+        'round': task['round'],
+        'white': white['name'],
+        'black': black['name'],
+        'winner': winner,
+        'score': 1.0 if winner == PLAYER1 else 0.0 if winner == PLAYER2 else 0.5,
+        'game_str': game_str,
+        'turns': turns,
+        'duration': time.perf_counter() - start_time,
+        'telemetry': telemetry.to_dict(),
+    }
+
+class Ratings:
+    """Incremental Elo plus Bradley-Terry maximum likelihood ratings over all results"""
+    def __init__(self, names, k=16.0, initial=1500.0):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.k = k
+        self.initial = initial
+        self.elo = {name: initial for name in self.names}
+        n = len(self.names)
+        self.games = np.zeros((n, n))     # games[i][j] - games between i and j
+        self.points = np.zeros((n, n))    # points[i][j] - points i scored against j
+
+    def update(self, white, black, score):
+        """Adds one result; score is 1, 0.5 or 0 from white's point of view"""
+        expected = 1 / (1 + 10 ** ((self.elo[black] - self.elo[white]) / 400))
+        self.elo[white] += self.k * (score - expected)
+        self.elo[black] -= self.k * (score - expected)
+
+        i, j = self.index[white], self.index[black]
+        self.games[i][j] += 1
+        self.games[j][i] += 1
+        self.points[i][j] += score
+        self.points[j][i] += 1 - score
+
+    def bradley_terry(self, iterations=50, prior=2.0):
+        """
+        Newton iterations on the Bradley-Terry log-likelihood (draws count as half a win each).
+        `prior` virtual draws against an average opponent keep ratings finite for perfect scores.
+        Returns {name: (rating, ci95)} in Elo units centred on `initial`.
+        """
+        n = len(self.names)
+        r = np.zeros(n)
+        for _ in range(iterations):
+            p = 1 / (1 + np.exp(r[None, :] - r[:, None]))      # p[i][j] - chance i beats j
+            p_avg = 1 / (1 + np.exp(-r))                        # chance to beat the virtual opponent
+            gradient = (self.points - self.games * p).sum(axis=1) + prior * (0.5 - p_avg)
+            curvature = self.games * p * (1 - p)
+            hessian = curvature - np.diag(curvature.sum(axis=1) + prior * p_avg * (1 - p_avg))
+            step = np.linalg.solve(hessian, gradient)
+            r -= step
+            if np.abs(step).max() < 1e-9:
+                break
+
+        covariance = np.linalg.inv(-hessian)
+        errors = np.sqrt(np.clip(np.diag(covariance), 0, None))
+        r -= r.mean()
+        return {name: (float(self.initial + ELO_SCALE * r[i]), float(1.96 * ELO_SCALE * errors[i]))
+                for i, name in enumerate(self.names)}
+
+def round_robin_schedule(names, games_per_pairing=2):
+    """Every pair plays `games_per_pairing` games, alternating colours"""
+    schedule = []
+    for a in range(len(names)):
+        for b in range(a + 1, len(names)):
+            for k in range(games_per_pairing):
+                white, black = (names[a], names[b]) if k % 2 == 0 else (names[b], names[a])
+                schedule.append((0, white, black, k))
+    return schedule
+
+def swiss_pairings(names, results, round_number, games_per_pairing=2):
+    """
+    Pairs players with equal or close scores who have not met yet, using the results of the
+    earlier rounds. With an odd field the lowest-ranked player without a bye sits out.
+    """
+    scores = defaultdict(float)
+    met = defaultdict(set)
+    played = defaultdict(set)     # round -> players with a game in that round
+    for result in results:
+        if result['round'] >= round_number:
+            continue
+        scores[result['white']] += result['score']
+        scores[result['black']] += 1 - result['score']
+        met[result['white']].add(result['black'])
+        met[result['black']].add(result['white'])
+        played[result['round']].update((result['white'], result['black']))
+
+    # a bye scores as winning every game of the round
+    byes = set()
+    for previous in range(round_number):
+        for name in set(names) - played[previous]:
+            byes.add(name)
+            scores[name] += games_per_pairing
+
+    # deterministic order so a resumed tournament regenerates the same pairings
+    standings = sorted(names, key=lambda name: (-scores[name], name))
+    if len(standings) % 2 == 1:
+        bye = next((name for name in reversed(standings) if name not in byes), standings[-1])
+        standings.remove(bye)
+
+    schedule = []
+    unpaired = list(standings)
+    while unpaired:
+        first = unpaired.pop(0)
+        opponent = next((name for name in unpaired if name not in met[first]), unpaired[0])
+        unpaired.remove(opponent)
+        for k in range(games_per_pairing):
+            white, black = (first, opponent) if k % 2 == 0 else (opponent, first)
+            schedule.append((round_number, white, black, k))
+    return schedule
+
+class Tournament:
+    def __init__(self, roster, output='tournament', mode='round_robin', games_per_pairing=2,
+                 rounds=5, workers=None, seed=0):
+        if mode not in ('round_robin', 'swiss'):
+            raise ValueError(f"Unknown tournament mode: {mode}")
+        self.roster = {entry['name']: entry for entry in roster}
+        self.names = [entry['name'] for entry in roster]
+        self.output = output
+        self.mode = mode
+        self.games_per_pairing = games_per_pairing
+        self.rounds = rounds
+        self.workers = workers or os.cpu_count()
+        self.seed = seed
+        self.results = []
+        self.ratings = Ratings(self.names)
+        self.telemetry = MoveTelemetry(TIMEOUT)
+        os.makedirs(output, exist_ok=True)
+        self.results_path = os.path.join(output, 'results.jsonl')
+        self.errors_path = os.path.join(output, 'errors.jsonl')
+        self.errors = 0
+        self.telemetry_path = os.path.join(output, 'telemetry.jsonl')
+
+    def _load_results(self):
+        """Reloads finished games so an interrupted tournament resumes where it stopped"""
+        if not os.path.exists(self.results_path):
+            return
+        with open(self.results_path) as f:
+            for line in f:
+                if line.strip():
+                    self._add_result(json.loads(line))
+        print(f"Resuming with {len(self.results)} finished games")
+
+        if os.path.exists(self.telemetry_path):
+            with open(self.telemetry_path) as f:
+                for line in f:
+                    if line.strip():
+                        self.telemetry.merge(json.loads(line)['telemetry'])
+
+    def _add_result(self, result):
+        self.results.append(result)
+        self.ratings.update(result['white'], result['black'], result['score'])
+
+    def _task(self, round_number, white, black, k):
+        key = f"{round_number}:{white}:{black}:{k}"
+        seed = int(hashlib.sha256(f"{self.seed}:{key}".encode()).hexdigest()[:16], 16)
+        return {'key': key, 'round': round_number, 'seed': seed,
+                'white': self.roster[white], 'black': self.roster[black]}
+
+    def _play(self, pool, schedule):
+        """Runs the scheduled games that are not finished yet and records results as they arrive"""
+        done = {result['key'] for result in self.results}
+        tasks = [self._task(*entry) for entry in schedule]
+        tasks = [task for task in tasks if task['key'] not in done]
+        total = len(tasks)
+
+        records = GameRecordWriter(os.path.join(self.output, 'games'))
+        busy = set()      # player servers in a running game
+        running = {}      # future -> task
+        finished = 0
+        with open(self.results_path, 'a') as f, open(self.telemetry_path, 'a') as telemetry_file, \
+                open(self.errors_path, 'a') as errors_file:
+            while tasks or running:
+                # start games in schedule order while their player servers are free
+                waiting = []
+                for task in tasks:
+                    endpoints = exclusive_endpoints(task)
+                    if len(running) >= self.workers * 2 or endpoints & busy:
+                        waiting.append(task)
+                        continue
+                    busy |= endpoints
+                    running[pool.submit(_run_game, task)] = task
+                tasks = waiting
+
+                completed, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    task = running.pop(future)
+                    busy -= exclusive_endpoints(task)
+                    finished += 1
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # one broken game must not cost the rest of the tournament
+                        self.errors += 1
+                        print(f"Game {task['key']} failed: {e!r}")
+                        errors_file.write(json.dumps({'key': task['key'], 'error': repr(e)}) + '\n')
+                        errors_file.flush()
+                        continue
+                    telemetry = result.pop('telemetry')
+                    self.telemetry.merge(telemetry)
+                    telemetry_file.write(json.dumps({'key': result['key'], 'telemetry': telemetry}) + '\n')
+                    records.append(result['game_str'], result['winner'])
+                    f.write(json.dumps(result) + '\n')
+                    f.flush()
+                    self._add_result(result)
+                    if finished % 50 == 0:
+                        print(f"{finished}/{total} games finished")
+                        records.flush()
+                        self.write_reports()
+        records.close()
+
+    def run(self):
+        self._load_results()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            if self.mode == 'round_robin':
+                self._play(pool, round_robin_schedule(self.names, self.games_per_pairing))
+            else:
+                for round_number in range(self.rounds):
+                    schedule = swiss_pairings(self.names, self.results, round_number, self.games_per_pairing)
+                    self._play(pool, schedule)
+                    print(f"Round {round_number + 1}/{self.rounds} complete")
+        self.write_reports()
+        if self.errors:
+            print(f"{self.errors} games failed; see {self.errors_path}")
+        return self.standings()
+
+    def standings(self):
+        """Rows sorted by Bradley-Terry rating"""
+        bt = self.ratings.bradley_terry()
+        rows = []
+        for name in self.names:
+            i = self.ratings.index[name]
+            rows.append({
+                'name': name,
+                'games': int(self.ratings.games[i].sum()),
+                'points': float(self.ratings.points[i].sum()),
+                'elo': round(self.ratings.elo[name], 1),
+                'bt': round(bt[name][0], 1),
+                'bt_ci95': round(bt[name][1], 1),
+            })
+        return sorted(rows, key=lambda row: -row['bt'])
+
+    def write_reports(self):
+        """Writes ratings.json and crosstable.csv (points of the row player against the column)"""
+        standings = self.standings()
+        with open(os.path.join(self.output, 'ratings.json'), 'w') as f:
+            json.dump(standings, f, indent=2)
+        with open(os.path.join(self.output, 'telemetry.json'), 'w') as f:
+            json.dump(self.telemetry.summary(), f, indent=2)
+
+        order = [row['name'] for row in standings]
+        with open(os.path.join(self.output, 'crosstable.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([''] + order + ['total'])
+            for name in order:
+                i = self.ratings.index[name]
+                cells = []
+                for other in order:
+                    j = self.ratings.index[other]
+                    games = self.ratings.games[i][j]
+                    cells.append('' if name == other or not games else f"{self.ratings.points[i][j]:g}/{games:g}")
+                writer.writerow([name] + cells + [f"{self.ratings.points[i].sum():g}"])
+
+def main():
+    roster = [
+        {'name': 'random', 'agent': 'random_agent:RandomAgent'},
+        {'name': 'smart', 'agent': 'smart_agent:SmartAgent'},
+    ]
+    tournament = Tournament(roster, output='tournament', games_per_pairing=20)
+    for row in tournament.run():
+        print(f"{row['name']:>12}  BT {row['bt']:7.1f} +/- {row['bt_ci95']:5.1f}  "
+              f"Elo {row['elo']:7.1f}  {row['points']:g}/{row['games']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,83 @@
-
+import os
+import time
+import numpy as np
+from checkpoint import AsyncCheckpointer, snapshot_training_state, restore_training_state
 from DQN_agent import DQNAgent
 from PushBattle import Game, PLAYER1, PLAYER2, EMPTY, NUM_PIECES, BOARD_SIZE
 from smart_agent import SmartAgent
+from training_metrics import TrainingMetrics, StepProfiler, timed
 
-def train_dqn(episodes=1000):
+def train_dqn(episodes=1000, checkpoint_path=None, checkpoint_every=50, resume=False,
+              metrics_path=None, profile=None, profile_steps=200):
+    """
+    Trains against SmartAgent. With a `checkpoint_path`, a resumable checkpoint is written every
+    `checkpoint_every` episodes; with `resume` as well, an existing checkpoint there is loaded
+    and training continues from it.
+    metrics_path - JSONL file for per-stage timings and throughput (see TrainingMetrics)
+    profile - 'torch' or 'cprofile' to profile `profile_steps` moves (see StepProfiler)
+    """
     agent = DQNAgent(PLAYER1)
     opponent = SmartAgent(PLAYER2)  # Use RandomAgent as opponent for reliable training
+    checkpointer = AsyncCheckpointer()
+    metrics = TrainingMetrics(metrics_path) if metrics_path else None
+    profiler = StepProfiler(profile, profile_steps) if profile else None
     
     # Training metrics
     wins = 0
     draws = 0
     losses = 0
+    start_episode = 0
+
+    if resume and checkpoint_path and os.path.exists(checkpoint_path):
+        start_episode, counts = restore_training_state(agent, checkpoint_path)
+        wins, losses, draws = counts['wins'], counts['losses'], counts['draws']
+        print(f"Resumed from {checkpoint_path} at episode {start_episode}")
     
-    for episode in range(episodes):
+    for episode in range(start_episode, episodes):
         game = Game()
         total_reward = 0
         moves_made = 0
         
         while moves_made < 100:  # Prevent infinite games
             current_agent = agent if game.current_player == PLAYER1 else opponent
+            if profiler:
+                profiler.step()
             
             # Get state before move
-            state = agent.board_to_tensor(game) if current_agent == agent else None
+            state = game.board.copy() if current_agent == agent else None
             
             # Get and apply move
-            move = current_agent.get_best_move(game)
+            with timed(metrics, 'agent_move' if current_agent == agent else 'opponent_move'):
+                move = current_agent.get_best_move(game)
             if move is None:
                 break
             
             # Apply move
             try:
-                if len(move) == 2:
-                    if game.is_valid_placement(move[0], move[1]):
-                        game.place_checker(*move)
-                    else:
-                        continue
-                else:
-                    if game.is_valid_move(move[0], move[1], move[2], move[3]):
-                        game.move_checker(*move)
+                with timed(metrics, 'engine'):
+                    if len(move) == 2:
+                        if game.is_valid_placement(move[0], move[1]):
+                            game.place_checker(*move)
+                        else:
+                            continue
                     else:
-                        continue
+                        if game.is_valid_move(move[0], move[1], move[2], move[3]):
+                            game.move_checker(*move)
+                        else:
+                            continue
                         
             except Exception as e:
                 continue
             
             moves_made += 1
+            if metrics:
+                metrics.count('env_steps')
             
             # Only process rewards and training for main agent
             if current_agent == agent:
-                next_state = agent.board_to_tensor(game)
-                winner = game.check_winner()
+                next_state = game.board.copy()
+                with timed(metrics, 'engine'):
+                    winner = game.check_winner()
                 done = winner != EMPTY
                 
                 # Simple reward structure
@@ -61,8 +89,12 @@ def train_dqn(episodes=1000):
                         reward = -1
                 
                 # Store experience and train
-                agent.store_experience(state, move, reward, next_state, done)
-                agent.train_step()
+                with timed(metrics, 'store'):
+                    agent.store_experience(state, move, reward, next_state, done)
+                with timed(metrics, 'train_step'):
+                    loss = agent.train_step()
+                if metrics and loss is not None:
+                    metrics.record_update(loss, agent.last_sample_time)
                 total_reward += reward
                 
                 if done:
@@ -92,7 +124,199 @@ def train_dqn(episodes=1000):
             # Save if performance is good
             if win_rate > 0.6:
                 agent.save(f'dqn_model_winrate_{win_rate:.2f}.pth')
-    
+
+        if checkpoint_path and (episode + 1) % checkpoint_every == 0:
+            counts = {'wins': wins, 'losses': losses, 'draws': draws}
+            checkpointer.save(snapshot_training_state(agent, episode + 1, counts), checkpoint_path)
+
+        if metrics:
+            metrics.count('episodes')
+            metrics.maybe_flush()
+
+    checkpointer.wait()
+    if metrics:
+        metrics.close()
+    if profiler:
+        profiler.stop()
+    return agent
+
+class SelfPlayEnvs:
+    """
+    `num_envs` self-play games stepped in lockstep by a single DQNAgent.
+
+    Every step encodes the side-to-move board of all games in one batch and picks all
+    actions with one forward pass over a legal-move mask. A transition for a player is
+    closed when that player is to move again (or the game ends), so next_state is the
+    position the player actually has to answer. Finished games reset automatically.
+    """
+    def __init__(self, num_envs=16, max_moves=100):
+        self.num_envs = num_envs
+        self.max_moves = max_moves
+        self.games = [Game() for _ in range(num_envs)]
+        self.moves_made = np.zeros(num_envs, dtype=np.int64)
+
+        # pending (relative board, action index) per env, per player (index 0 = PLAYER1)
+        self.pending = [[None, None] for _ in range(num_envs)]
+
+        self.env_steps = 0
+        self.finished = 0
+        self.p1_wins = 0
+        self.p2_wins = 0
+        self.draws = 0
+
+    def step(self, agent, epsilon=None, metrics=None):
+        """
+        Plays one move in every game.
+        Returns the closed transitions as (states, actions, rewards, next_states, dones) lists.
+        """
+        games = self.games
+        with timed(metrics, 'encode'):
+            movers = np.array([game.current_player for game in games])
+            boards = (np.stack([game.board for game in games]) * movers[:, None, None]).astype(np.int8)
+            placing = np.array([(game.p1_pieces if game.current_player == PLAYER1 else game.p2_pieces) < NUM_PIECES
+                                for game in games])
+
+        with timed(metrics, 'select_actions'):
+            actions = agent.select_actions(boards, placing, epsilon)
+
+        with timed(metrics, 'engine'):
+            return self._apply(agent, boards, movers, placing, actions)
+
+    def _apply(self, agent, boards, movers, placing, actions):
+        """Plays the chosen actions in every game and closes the finished transitions"""
+        games = self.games
+
+        batch = ([], [], [], [], [])
+
+        for i, game in enumerate(games):
+            slot = 0 if movers[i] == PLAYER1 else 1
+
+            # the previous move of this player is answered by the current position
+            if self.pending[i][slot] is not None:
+                self._close(batch, i, slot, boards[i], 0.0, False)
+
+            move = agent.index_to_move(int(actions[i]), placing[i])
+            if placing[i]:
+                game.place_checker(*move)
+            else:
+                game.move_checker(*move)
+            game.turn_count += 1
+            self.moves_made[i] += 1
+            self.env_steps += 1
+            self.pending[i][slot] = (boards[i], int(actions[i]))
+
+            winner = game.check_winner()
+            if winner == EMPTY and self.moves_made[i] < self.max_moves:
+                game.current_player *= -1
+                continue
+
+            # game over: settle both players' open transitions from their own point of view
+            for other_slot, player in ((0, PLAYER1), (1, PLAYER2)):
+                if self.pending[i][other_slot] is not None:
+                    reward = 0.0 if winner == EMPTY else (1.0 if winner == player else -1.0)
+                    self._close(batch, i, other_slot, (game.board * player).astype(np.int8), reward, True)
+
+            self.finished += 1
+            if winner == PLAYER1:
+                self.p1_wins += 1
+            elif winner == PLAYER2:
+                self.p2_wins += 1
+            else:
+                self.draws += 1
+
+            # auto-reset
+            games[i] = Game()
+            self.moves_made[i] = 0
+
+        return batch
+
+    def _close(self, batch, i, slot, next_board, reward, done):
+        state, action = self.pending[i][slot]
+        for column, value in zip(batch, (state, action, reward, next_board, done)):
+            column.append(value)
+        self.pending[i][slot] = None
+
+def train_dqn_vectorized(episodes=1000, num_envs=16, updates_per_step=0.25, target_update=500,
+                         max_moves=100, layout='dense', agent=None, report_every=100,
+                         checkpoint_path=None, checkpoint_every=500, resume=True,
+                         metrics_path=None, profile=None, profile_steps=200):
+    """
+    Self-play training over `num_envs` games stepped in lockstep (see SelfPlayEnvs).
+    Closed transitions are pushed to the replay buffer in bulk after every step.
+    updates_per_step - gradient steps per stored transition (update-to-data ratio)
+    target_update - gradient steps between target network syncs
+    checkpoint_path - resumable checkpoint written every `checkpoint_every` finished games;
+                      games in progress at checkpoint time are not saved
+    metrics_path - JSONL file for per-stage timings and throughput (see TrainingMetrics)
+    profile - 'torch' or 'cprofile' to profile `profile_steps` lockstep steps (see StepProfiler)
+    """
+    agent = agent or DQNAgent(PLAYER1, layout=layout)
+    envs = SelfPlayEnvs(num_envs, max_moves)
+    checkpointer = AsyncCheckpointer()
+    metrics = TrainingMetrics(metrics_path) if metrics_path else None
+    profiler = StepProfiler(profile, profile_steps) if profile else None
+
+    # Training metrics
+    updates = 0
+    update_credit = 0.0
+
+    if resume and checkpoint_path and os.path.exists(checkpoint_path):
+        envs.finished, counts = restore_training_state(agent, checkpoint_path)
+        envs.p1_wins, envs.p2_wins, envs.draws = counts['p1_wins'], counts['p2_wins'], counts['draws']
+        updates = counts['updates']
+        print(f"Resumed from {checkpoint_path} at episode {envs.finished}")
+
+    next_report = envs.finished + report_every
+    next_checkpoint = envs.finished + checkpoint_every
+    start_time = time.time()
+    start_steps = envs.env_steps
+    start_updates = updates
+
+    while envs.finished < episodes:
+        if profiler:
+            profiler.step()
+        finished = envs.finished
+        states, actions, rewards, next_states, dones = envs.step(agent, metrics=metrics)
+        with timed(metrics, 'replay_push'):
+            if states:
+                agent.memory.push_batch(np.stack(states), actions, rewards, np.stack(next_states), dones)
+
+        update_credit += updates_per_step * len(states)
+        while update_credit >= 1:
+            update_credit -= 1
+            with timed(metrics, 'train_step'):
+                loss = agent.train_step()
+            if loss is not None:
+                updates += 1
+                if metrics:
+                    metrics.record_update(loss, agent.last_sample_time)
+                if updates % target_update == 0:
+                    agent.update_target_network()
+
+        if metrics:
+            metrics.count('env_steps', envs.num_envs)
+            metrics.count('episodes', envs.finished - finished)
+            metrics.maybe_flush()
+
+        if envs.finished >= next_report:
+            next_report += report_every
+            elapsed = time.time() - start_time
+            print(f"Episodes {envs.finished}")
+            print(f"P1 Wins: {envs.p1_wins}, P2 Wins: {envs.p2_wins}, Draws: {envs.draws}")
+            print(f"Env steps/s: {(envs.env_steps - start_steps) / elapsed:.0f}, "
+                  f"Updates: {updates} ({(updates - start_updates) / elapsed:.1f}/s)")
+            print("-" * 40)
+
+        if checkpoint_path and envs.finished >= next_checkpoint:
+            next_checkpoint += checkpoint_every
+            counts = {'p1_wins': envs.p1_wins, 'p2_wins': envs.p2_wins, 'draws': envs.draws, 'updates': updates}
+            checkpointer.save(snapshot_training_state(agent, envs.finished, counts), checkpoint_path)
+
+    checkpointer.wait()
+    if metrics:
+        metrics.close()
+    if profiler:
+        profiler.stop()
     return agent
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+import cProfile
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+'''
+Throughput instrumentation for the DQN training loops.
+
+TrainingMetrics accumulates per-stage wall time, counters (env steps, updates, episodes),
+losses and replay sampling latency, and appends one JSON line per reporting window.
+StepProfiler wraps a window of N loop steps in torch.profiler or cProfile and dumps the trace.
+'''
+
+def timed(metrics, name):
+    """Stage timer that is a no-op when metrics are disabled"""
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+class TrainingMetrics:
+    def __init__(self, path='training_metrics.jsonl', log_every=10.0):
+        self.path = path
+        self.log_every = log_every
+        self.start_time = time.perf_counter()
+        self.totals = defaultdict(int)
+        self._reset_window()
+
+    def _reset_window(self):
+        self.window_start = time.perf_counter()
+        self.stage_times = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.losses = []
+        self.sample_times = []
+
+    @contextmanager
+    def stage(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_times[name] += time.perf_counter() - start_time
+
+    def count(self, name, n=1):
+        self.counts[name] += n
+        self.totals[name] += n
+
+    def record_update(self, loss, sample_time):
+        """Records one gradient step with its loss and replay sampling latency (seconds)"""
+        self.count('updates')
+        self.losses.append(loss)
+        self.sample_times.append(sample_time)
+
+    def maybe_flush(self, force=False):
+        """Writes the current window as one JSON line once `log_every` seconds have passed"""
+        now = time.perf_counter()
+        elapsed = now - self.window_start
+        if not force and elapsed < self.log_every:
+            return None
+
+        row = {
+            'time': time.time(),
+            'elapsed': now - self.start_time,
+            'window': elapsed,
+            'env_steps_per_s': self.counts['env_steps'] / elapsed if elapsed else 0.0,
+            'updates_per_s': self.counts['updates'] / elapsed if elapsed else 0.0,
+            'episodes': self.totals['episodes'],
+            'env_steps': self.totals['env_steps'],
+            'updates': self.totals['updates'],
+            'loss': sum(self.losses) / len(self.losses) if self.losses else None,
+            'sample_us': 1e6 * sum(self.sample_times) / len(self.sample_times) if self.sample_times else None,
+            'stages': {name: round(seconds, 6) for name, seconds in self.stage_times.items()},
+        }
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(row) + '\n')
+        self._reset_window()
+        return row
+
+    def close(self):
+        if self.counts:
+            self.maybe_flush(force=True)
+
+class StepProfiler:
+    """
+    Profiles loop steps [start, start + num_steps) and writes the result to `output`.
+    mode - 'torch' for a chrome trace from torch.profiler, 'cprofile' for a pstats dump
+    """
+    def __init__(self, mode='cprofile', num_steps=200, start=10, output=None):
+        if mode not in ('torch', 'cprofile'):
+            raise ValueError(f"Unknown profiler mode: {mode}")
+        self.mode = mode
+        self.num_steps = num_steps
+        self.start = start
+        self.output = output or ('train_trace.json' if mode == 'torch' else 'train_profile.prof')
+        self.steps = 0
+        self._profiler = None
+
+    def step(self):
+        """Call once per loop iteration"""
+        if self.steps == self.start:
+            self._begin()
+        elif self.steps == self.start + self.num_steps:
+            self.stop()
+        self.steps += 1
+
+    def _begin(self):
+        if self.mode == 'torch':
+            import torch.profiler
+            self._profiler = torch.profiler.profile(record_shapes=True)
+            self._profiler.__enter__()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self):
+        if self._profiler is None:
+            return
+        if self.mode == 'torch':
+            self._profiler.__exit__(None, None, None)
+            self._profiler.export_chrome_trace(self.output)
+        else:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.output)
+        print(f"Profile of {self.num_steps} steps written to {self.output}")
+        self._profiler = None